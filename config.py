@@ -101,6 +101,144 @@ CAMERA_HEIGHT = 1080
 # Good balance between quality and bandwidth
 JPEG_QUALITY = 85
 
+# Adaptive quality: when encoding takes too long, the stream uses more than
+# ADAPTIVE_TARGET_KBPS, or viewers fall behind, step the JPEG quality down
+# (to ADAPTIVE_QUALITY_MIN), then the output size (ADAPTIVE_SCALES); step
+# back up towards JPEG_QUALITY at full size once there is room again.
+# Decisions are made every ADAPTIVE_WINDOW_SECONDS; going up needs
+# ADAPTIVE_UP_WINDOWS good windows in a row (down needs two) so it
+# does not oscillate.
+ENABLE_ADAPTIVE_QUALITY = False
+ADAPTIVE_QUALITY_MIN = 50
+ADAPTIVE_QUALITY_STEP = 10
+ADAPTIVE_SCALES = (1.0, 0.75, 0.5)
+# Stream bitrate limit in kilobits per second (None = no limit)
+ADAPTIVE_TARGET_KBPS = None
+# Encoding may use at most this share of the frame interval (0.5 = half)
+ADAPTIVE_ENCODE_BUDGET = 0.5
+# Worst allowed viewer lag (seconds behind the camera) before stepping down
+ADAPTIVE_MAX_LAG_SECONDS = 1.0
+ADAPTIVE_WINDOW_SECONDS = 2.0
+ADAPTIVE_UP_WINDOWS = 3
+
+# USB camera pixel format (FOURCC). "MJPG" lets most USB webcams deliver 1080p
+# at full frame rate; "" leaves the driver default (often slow YUYV).
+USB_CAMERA_FOURCC = ""
+# MJPEG pass-through: read the camera's own JPEG frames and send them to
+# clients without decoding and re-encoding (requests "MJPG" if
+# USB_CAMERA_FOURCC is ""). Only used while no pixel-modifying stage is
+# active: color LUT is neutral, no rotation, the label is not showing and
+# DAY_NIGHT_BADGE is False. With the default settings (RGB_LED_GAMMA and
+# the badge) pass-through is never used: turn those off to benefit.
+# Frames are decoded at 1/4 scale for analysis.
+ENABLE_MJPEG_PASSTHROUGH = False
+
+# Pipelined capture: run capture, processing (color/overlay/rotation) and
+# JPEG encoding on separate threads so the stages overlap across CPU cores.
+# False = one thread does everything in sequence (simplest, lowest memory)
+ENABLE_PIPELINED_CAPTURE = False
+# Frames allowed to wait between stages; when full the OLDEST frame is dropped
+PIPELINE_QUEUE_SIZE = 2
+
+# JPEG encoder threads. At 1080p one cv2.imencode() can take longer than a
+# frame interval on a Pi; with 2-4 workers consecutive frames are encoded in
+# parallel on different CPU cores (OpenCV releases the GIL while encoding)
+# and still published in capture order. 1 = encode inline, no pool.
+JPEG_ENCODER_WORKERS = 1
+
+# Buffer pool mode: reuse preallocated frame buffers for camera reads,
+# rotation and color correction instead of allocating new arrays every frame
+# (less memory churn on small Pis). Costs a few extra frames of memory.
+ENABLE_BUFFER_POOL = False
+
+# USB cameras keep a few frames queued in the driver. When we capture slower
+# than the camera runs, the next read would return the OLDEST queued frame,
+# so up to this many stale frames are discarded (grab() without decoding)
+# before the one we use. Only frames that are known to have a newer one
+# behind them (from the camera's frame rate) are discarded, so a camera
+# running at our own rate never loses frames. 0 = read the next frame as-is.
+# tools/check_capture_drain.py checks frame rate and jitter.
+CAPTURE_DRAIN_MAX_GRABS = 4
+
+# Low-latency mode: ask the camera driver to queue only ONE frame
+# (CAP_PROP_BUFFERSIZE=1; some drivers ignore it), and when the frame we got
+# is more than one camera frame old, wait for the next one (up to
+# CAPTURE_DRAIN_MAX_GRABS times). Helps when the camera runs faster than
+# the stream, at the cost of up to one camera frame of timing jitter; at
+# matched rates it changes nothing. Every stream part carries X-Frame-Seq
+# and X-Capture-Timestamp headers either way; tools/stream_latency.py
+# measures capture-to-viewer latency from them.
+ENABLE_LOW_LATENCY = False
+
+# Web server type. False = one thread per connected viewer (classic
+# ThreadingMixIn server). True = one asyncio event loop thread serves every
+# viewer, which scales to hundreds of viewers with far less memory and
+# thread switching.
+ENABLE_ASYNC_SERVER = False
+
+# Slow viewer protection (e.g. a phone on weak Wi-Fi). A viewer is dropped
+# if sending ONE frame takes longer than STREAM_SEND_TIMEOUT seconds, or if
+# the frames it receives are more than STREAM_MAX_LAG_SECONDS old by the
+# time they are sent. STREAM_SEND_BUFFER_BYTES caps how much data the
+# kernel may queue for each viewer (None = system default). The async
+# server also closes connections that don't finish sending their request
+# headers within STREAM_SEND_TIMEOUT.
+STREAM_SEND_TIMEOUT = 5.0
+STREAM_MAX_LAG_SECONDS = 3.0
+STREAM_SEND_BUFFER_BYTES = 256 * 1024
+
+# /snapshot.jpg reuses the latest streamed JPEG if it is at most this many
+# seconds old; otherwise it asks the camera pipeline for a fresh frame
+SNAPSHOT_MAX_AGE_SECONDS = 1.0
+
+# Time-shift replay: keep recently encoded JPEGs in memory so
+# /replay.mjpg?from=-60s and /frames/<time>.jpg can look back. The buffer is
+# capped in bytes and held in RAM, so it is off by default (0 = disabled).
+# Cost per minute of history = JPEG size x FPS x 60: about 50 MB at
+# 1080p, 5 FPS (150-200 kB frames) and about 10 MB at 640x480, 5 FPS.
+# Example: 64 * 1024 * 1024 keeps a little over a minute at 1080p.
+FRAME_HISTORY_BYTES = 0
+# Frames are only encoded while someone is watching. True keeps the camera
+# encoding all the time so the history never has gaps (uses more CPU).
+FRAME_HISTORY_ALWAYS_RECORD = False
+
+# Several cameras on one Pi: one entry per camera, served as /stream0.mjpg,
+# /stream1.mjpg, ... (plus /snapshot{n}.jpg and /wb/{n}/...). Each camera
+# runs its own capture thread. Keys an entry leaves out use the settings
+# above: index (device number), backend ("auto", "v4l2" or "libcamera"),
+# width, height, fps, rotation (0/90/180/270), overlay (label on/off), name.
+# None = one camera, auto-detected (the classic single-pod setup).
+CAMERAS = None
+# CAMERAS = [
+#     {"name": "Pod A", "index": 0, "backend": "v4l2", "overlay": True},
+#     {"name": "Pod B", "index": 2, "backend": "v4l2", "width": 1280, "height": 720, "rotation": 180},
+# ]
+
+# Process per camera: run each camera's capture/color/overlay/encode
+# pipeline in its own process (with its own Python GIL) so several cameras
+# use several CPU cores. Encoded frames reach the web server through shared
+# memory. Costs one Python process (~40 MB) per camera.
+ENABLE_CAMERA_PROCESSES = False
+# Shared-memory ring per camera. The web server copies each frame out as
+# soon as it arrives, so a few slots are enough; a frame the worker
+# overwrites during that copy is dropped.
+CAMERA_WORKER_RING_SLOTS = 4
+# Largest JPEG one slot can hold (None = width * height / 2 bytes, plenty
+# for JPEG_QUALITY 85). Bigger frames are dropped and counted.
+CAMERA_WORKER_SLOT_BYTES = None
+
+# Per-stage timing (read, analyze, color, overlay, rotate, badge, encode,
+# publish) for /metrics and /debug/profile?format=stages. Costs about a
+# microsecond per stage; False leaves the stage methods completely untouched.
+ENABLE_STAGE_TIMING = True
+# /debug/profile?seconds=5 samples what every thread is doing (capture,
+# pipeline and HTTP threads) and returns a flamegraph-ready stack dump.
+# Only costs CPU while a profile is running, but it has no password: anyone
+# who can reach the camera sees the server's code paths, and each request
+# holds a server thread for the whole profile. Turn it on while debugging.
+ENABLE_PROFILE_ENDPOINT = False
+PROFILE_MAX_SECONDS = 10
+
 # Skip camera detection if you know your camera index (faster startup)
 # Set to 0, 1, 2, etc. if you know your camera index, or None to auto-detect
 KNOWN_CAMERA_INDEX = 0
@@ -109,6 +247,9 @@ KNOWN_CAMERA_INDEX = 0
 # Enable automatic day/night switching based on frame brightness
 # Set True to enable day/night label display
 ENABLE_DAY_NIGHT = True
+# Draw the DAY/NIGHT badge in the corner of the stream. False keeps the
+# day/night switching but leaves the pixels alone (see MJPEG pass-through)
+DAY_NIGHT_BADGE = True
 # Hysteresis thresholds on normalized luma (0.0-1.0). Use NIGHT < DAY.
 # Lower values = darker threshold. Tune based on your lighting:
 #   - If showing NIGHT during daylight → lower DAY_LUMA_THRESHOLD (try 0.30-0.40)
@@ -159,6 +300,10 @@ WB_GAIN_MAX = 2.0
 WB_EXCLUDE_DARK = 25  # grayscale below this (0-255) is ignored
 WB_EXCLUDE_BRIGHT = 235  # grayscale above this is ignored
 
+# Width (pixels) of the small thumbnail that brightness (day/night) and WB
+# analysis share; built at most once per analysis tick
+ANALYSIS_THUMB_WIDTH = 320
+
 # Persisted calibration file for "neutral-card" lock
 WB_CALIBRATION_FILE = "wb_calibration.json"
 
@@ -205,10 +205,13 @@ class LibcameraCapture:
             logger.warning(f"Failed to set night mode: {e}")
             return False
 
-    def read(self):
+    def read(self, image=None):
         """
         Read a frame from the camera (mimics cv2.VideoCapture.read).
         
+        Args:
+            image: Optional preallocated BGR array to fill (reused if the size matches)
+        
         Returns:
             Tuple of (success, frame) where frame is a numpy array in BGR format
         """
@@ -225,7 +228,10 @@ class LibcameraCapture:
                 
                 # Convert RGB to BGR (OpenCV format)
                 import cv2
-                frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+                if image is not None and image.shape == frame_rgb.shape:
+                    frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR, dst=image)
+                else:
+                    frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
                 
                 return True, frame_bgr
         except Exception as e:
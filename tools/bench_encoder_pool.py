@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Filename: bench_encoder_pool.py
+Description: Frames per second the JPEG encoder can deliver with 1, 2, 3 and
+4 encoder workers (JPEG_ENCODER_WORKERS) at 720p and 1080p.
+
+Frames come from the synthetic camera, so JPEG sizes and encode times are
+realistic and no camera is needed. Each run pushes frames through an
+OrderedEncoderPool as fast as it accepts them and checks that they come
+out in the order they went in. "1 worker" is the same work done inline on
+one thread, i.e. the classic single-encoder ceiling.
+
+The speed-up can't exceed the number of CPU cores; on a single-core
+machine every row will show about the same FPS.
+
+Usage:
+    python3 tools/bench_encoder_pool.py
+    python3 tools/bench_encoder_pool.py --workers 1,2,4 --frames 120 --json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+# Add parent directory (config, web_stream_pipeline) and this directory to path
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+from config import JPEG_QUALITY  # noqa: E402
+from synthetic_camera import SyntheticCapture  # noqa: E402
+from web_stream_pipeline import OrderedEncoderPool  # noqa: E402
+
+RESOLUTIONS = [(1280, 720), (1920, 1080)]
+
+
+def encode_inline(frames, params):
+    """Baseline: encode every frame on this thread."""
+    start = time.perf_counter()
+    for frame in frames:
+        cv2.imencode(".jpg", frame, params)
+    return time.perf_counter() - start, True
+
+
+def encode_pooled(frames, params, workers):
+    """Encode through the pool; returns (seconds, frames came out in order)."""
+    published = []
+
+    def encode(frame):
+        return cv2.imencode(".jpg", frame, params)[1]
+
+    def publish(frame, jpeg, timestamp):
+        published.append(timestamp)
+
+    pool = OrderedEncoderPool(workers, encode, publish, name="bench")
+    start = time.perf_counter()
+    for number, frame in enumerate(frames):
+        pool.submit(frame, None, number)  # Frame number stands in for the timestamp
+    pool.close()  # Waits for the last frames
+    elapsed = time.perf_counter() - start
+    return elapsed, published == list(range(len(frames)))
+
+
+def run(worker_counts, frame_count, quality):
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality]
+    results = []
+    for width, height in RESOLUTIONS:
+        camera = SyntheticCapture(width, height)
+        frames = [camera.read()[1] for _ in range(frame_count)]
+        encode_inline(frames[:5], params)  # Warm up the encoder
+        baseline = None
+        for workers in worker_counts:
+            if workers <= 1:
+                seconds, in_order = encode_inline(frames, params)
+            else:
+                seconds, in_order = encode_pooled(frames, params, workers)
+            fps = frame_count / seconds
+            baseline = baseline or fps
+            results.append({
+                "resolution": f"{width}x{height}",
+                "workers": workers,
+                "fps": round(fps, 1),
+                "ms_per_frame": round(1000.0 * seconds / frame_count, 2),
+                "speedup": round(fps / baseline, 2),
+                "in_order": in_order,
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JPEG encode FPS versus encoder workers")
+    parser.add_argument("--workers", default="1,2,3,4", help="comma-separated worker counts")
+    parser.add_argument("--frames", type=int, default=60, help="frames per run")
+    parser.add_argument("--quality", type=int, default=JPEG_QUALITY)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    worker_counts = [int(w) for w in args.workers.split(",") if w.strip()]
+    results = run(worker_counts, max(1, args.frames), args.quality)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"JPEG encode throughput, quality {args.quality}, {os.cpu_count()} CPU core(s)")
+    print(f"{'resolution':>10} | {'workers':>7} | {'fps':>7} {'ms/frame':>9} {'speedup':>8} | order")
+    for r in results:
+        print(f"{r['resolution']:>10} | {r['workers']:>7} | {r['fps']:>7} {r['ms_per_frame']:>9} "
+              f"{r['speedup']:>8} | {'ok' if r['in_order'] else 'WRONG'}")
+
+
+if __name__ == "__main__":
+    main()
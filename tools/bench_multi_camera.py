@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Filename: bench_multi_camera.py
+Description: Measure how the capture pipeline scales when one Pi serves
+several cameras (config.CAMERAS). Each camera is a MediaRelay with its own
+capture thread, fed by a synthetic camera and kept encoding by one
+"stream" consumer, exactly like a camera with one viewer.
+
+For 1, 2, ... N cameras it reports the frame rate each camera reached, how
+many frames missed their deadline, and the CPU used (this process plus any
+camera worker processes). When the CPU runs out, the per-camera frame rate
+drops below the target.
+
+--processes runs every camera in its own worker process
+(ENABLE_CAMERA_PROCESSES) so they no longer share one GIL; compare both
+modes on a multi-core Pi.
+
+Usage:
+    python3 tools/bench_multi_camera.py
+    python3 tools/bench_multi_camera.py --cameras 1,2,4 --width 1920 --height 1080 --fps 5
+    python3 tools/bench_multi_camera.py --processes --fps 30
+    python3 tools/bench_multi_camera.py --json
+"""
+
+import argparse
+import functools
+import json
+import logging
+import os
+import sys
+import time
+
+# Add parent directory (web_stream) and this directory (synthetic_camera) to path
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import web_stream  # noqa: E402
+from synthetic_camera import SyntheticCapture  # noqa: E402
+
+
+def process_cpu_seconds(pid):
+    """CPU time (user + system) used so far by another process (Linux /proc), or 0."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return 0.0
+
+
+def total_cpu_seconds(relays):
+    """CPU used by this process plus every camera worker process."""
+    cpu = time.process_time()
+    for relay in relays:
+        process = getattr(relay, "_process", None)
+        if process is not None:
+            cpu += process_cpu_seconds(process.pid)
+    return cpu
+
+
+def run(count, width, height, fps, seconds, warmup, processes=False):
+    """Run `count` synthetic cameras at once; return per-camera and process stats."""
+    relays = []
+    for number in range(count):
+        settings = dict(
+            enable_overlay=number == 0, width=width, height=height, frame_rate=fps,
+            name=f"Camera {number}",
+        )
+        # Different seeds so the cameras don't encode identical images
+        camera = functools.partial(SyntheticCapture, width, height, fps=fps * 2, seed=number)
+        if processes:
+            relay = web_stream.CameraWorkerRelay(capture_factory=camera, **settings)
+            relay.start_capture(camera_index=number)
+        else:
+            relay = web_stream.MediaRelay(**settings)
+            relay.cap = camera()
+            relay.start_threads()
+        relay.add_consumer("stream")
+        relays.append(relay)
+
+    time.sleep(warmup)
+    start_frames = [relay.frame_seq for relay in relays]
+    start_late = [relay.pipeline_stats()["pacing"]["late"] for relay in relays]
+    wall_start = time.perf_counter()
+    cpu_start = total_cpu_seconds(relays)
+    time.sleep(seconds)
+    wall = time.perf_counter() - wall_start
+    cpu = total_cpu_seconds(relays) - cpu_start
+    per_camera = []
+    for relay, frames0, late0 in zip(relays, start_frames, start_late):
+        frames = relay.frame_seq - frames0
+        pacing = relay.pipeline_stats()["pacing"]
+        per_camera.append({
+            "camera": relay.name,
+            "fps": round(frames / wall, 2),
+            "late": pacing["late"] - late0,
+            "jitter_p95_ms": pacing["jitter_ms"]["p95"],
+        })
+    for relay in relays:
+        relay.stop()
+
+    rates = [cam["fps"] for cam in per_camera]
+    return {
+        "cameras": count,
+        "mode": "processes" if processes else "threads",
+        "resolution": f"{width}x{height}",
+        "target_fps": fps,
+        "min_fps": min(rates),
+        "total_fps": round(sum(rates), 2),
+        # 100% = one CPU core fully busy
+        "cpu_percent": round(100.0 * cpu / wall, 1),
+        "cpu_ms_per_frame": round(1000.0 * cpu / max(1, sum(rates) * wall), 2),
+        "cpu_cores": os.cpu_count(),
+        "per_camera": per_camera,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-camera capture pipeline scaling")
+    parser.add_argument("--cameras", default="1,2,3,4", help="comma-separated camera counts to try")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=5.0)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--processes", action="store_true", help="one worker process per camera")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    # Keep the console readable: only warnings from web_stream
+    web_stream.logger.setLevel(logging.WARNING)
+
+    results = []
+    for count in [int(c) for c in args.cameras.split(",") if c.strip()]:
+        results.append(
+            run(count, args.width, args.height, args.fps, args.seconds, args.warmup, args.processes)
+        )
+        if not args.json:
+            r = results[-1]
+            if len(results) == 1:
+                print(f"{args.width}x{args.height} @ {args.fps} FPS per camera, "
+                      f"{r['mode']}, {r['cpu_cores']} CPU core(s)")
+                print(f"{'cameras':>7} | {'min fps':>7} {'total fps':>9} | {'cpu %':>6} {'cpu ms/frame':>12}")
+            print(f"{r['cameras']:>7} | {r['min_fps']:>7} {r['total_fps']:>9} | "
+                  f"{r['cpu_percent']:>6} {r['cpu_ms_per_frame']:>12}")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Filename: bench_pipeline.py
+Description: Hardware-free throughput benchmark for the MediaRelay capture
+pipeline. Runs the real capture thread (_capture_frames) on a synthetic
+camera at 640x480, 1280x720 and 1920x1080 with every optional stage on,
+with each stage turned off in turn, and with all of them off.
+
+For each run it reports frames per second, milliseconds per frame spent in
+each stage (from the @timed_stage histograms, ENABLE_STAGE_TIMING) and the
+average JPEG size. The camera delivers frames as fast as they are asked
+for and the frame rate limit is lifted, so FPS is what the CPU can do.
+
+Save the JSON output and compare it between commits to spot regressions:
+    python3 tools/bench_pipeline.py --json > before.json
+
+Stages that can be toggled:
+    rgb       RGB LED correction + gamma (color LUT)
+    wb        software white balance (auto gray-world analysis)
+    daynight  day/night brightness analysis and DAY/NIGHT badge
+    overlay   the label overlay (forced visible for the run)
+    rotation  90 degree rotation
+    encode    full-size JPEG encode (off = frames rendered, never encoded)
+
+Usage:
+    python3 tools/bench_pipeline.py
+    python3 tools/bench_pipeline.py --resolutions 1280x720 --configs all,-encode --seconds 5
+    python3 tools/bench_pipeline.py --analysis-every-frame --json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+# Add parent directory (web_stream) and this directory (synthetic_camera) to path
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import web_stream  # noqa: E402
+from synthetic_camera import SyntheticCapture  # noqa: E402
+from web_stream_metrics import ENABLE_STAGE_TIMING  # noqa: E402
+from web_stream_profiler import stage_deltas  # noqa: E402
+
+RESOLUTIONS = ["640x480", "1280x720", "1920x1080"]
+OPTIONAL_STAGES = ["rgb", "wb", "daynight", "overlay", "rotation", "encode"]
+# "all" = every stage on, "-wb" = all but white balance, "none" = all off
+DEFAULT_CONFIGS = ["all"] + [f"-{stage}" for stage in OPTIONAL_STAGES] + ["none"]
+
+
+def stages_for(config):
+    """Set of optional stages that are on for a config name."""
+    if config == "all":
+        return set(OPTIONAL_STAGES)
+    if config == "none":
+        return set()
+    if config.startswith("-") and config[1:] in OPTIONAL_STAGES:
+        return set(OPTIONAL_STAGES) - {config[1:]}
+    if config.startswith("+") and config[1:] in OPTIONAL_STAGES:
+        return {config[1:]}
+    raise ValueError(f"unknown config {config!r} (all, none, -stage or +stage)")
+
+
+def make_relay(width, height, enabled):
+    """A MediaRelay on a synthetic camera with only the `enabled` stages on."""
+    # The RGB correction switch is read from config at frame time
+    web_stream.ENABLE_RGB_LED_CORRECTION = "rgb" in enabled
+    relay = web_stream.MediaRelay(
+        enable_overlay="overlay" in enabled,
+        rotation_angle=90 if "rotation" in enabled else 0,
+        width=width,
+        height=height,
+        frame_rate=1000.0,  # No frame rate limit: measure what the CPU can do
+        name="bench",
+    )
+    relay.history = None  # Not part of the pipeline being measured
+    relay.enable_overlay = "overlay" in enabled  # Even if ENABLE_LABEL_OVERLAY is off
+    relay.label_start_time = time.time()  # Label visible for the whole run
+    relay.enable_day_night = "daynight" in enabled
+    relay.wb_mode = "auto_grayworld" if "wb" in enabled else "off"
+    relay._wb_gains = [1.0, 1.0, 1.0]
+    relay.cap = SyntheticCapture(width, height)
+    # A stream viewer wants full-size JPEGs; a rendition viewer only pixels
+    relay.add_consumer("stream" if "encode" in enabled else "rendition")
+    return relay
+
+
+def run_one(resolution, config, seconds, warmup):
+    width, height = (int(v) for v in resolution.split("x"))
+    enabled = stages_for(config)
+    relay = make_relay(width, height, enabled)
+    relay.start_threads()
+    time.sleep(warmup)  # LUT compiled, overlay patches cached, caches warm
+
+    before = relay.metrics.snapshot()
+    frames_before = relay.pacer.frame_count
+    started = time.perf_counter()
+    time.sleep(seconds)
+    elapsed = time.perf_counter() - started
+    after = relay.metrics.snapshot()
+    frames = relay.pacer.frame_count - frames_before
+    relay.stop()
+
+    stages = stage_deltas(before["stages"], after["stages"], elapsed)
+    jpegs = after["jpeg_bytes"]["count"] - before["jpeg_bytes"]["count"]
+    jpeg_bytes = after["jpeg_bytes"]["sum"] - before["jpeg_bytes"]["sum"]
+    return {
+        "resolution": resolution,
+        "config": config,
+        "stages_on": sorted(enabled, key=OPTIONAL_STAGES.index),
+        "frames": frames,
+        "fps": round(frames / elapsed, 2),
+        "ms_per_frame": round(1000.0 * elapsed / max(1, frames), 3),
+        # Time per frame in each stage (over every frame, so rarely-run
+        # analysis stages show their average cost)
+        "stage_ms": {
+            stage: round(data["total_ms"] / max(1, frames), 3)
+            for stage, data in stages.items()
+        },
+        "bytes_per_frame": int(jpeg_bytes / jpegs) if jpegs else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MediaRelay pipeline throughput per stage")
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS), help="e.g. 640x480,1920x1080")
+    parser.add_argument("--configs", default=",".join(DEFAULT_CONFIGS),
+                        help="all, none, -stage (all but one) or +stage (only one)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="measured time per run")
+    parser.add_argument("--warmup", type=float, default=0.5)
+    parser.add_argument("--analysis-every-frame", action="store_true",
+                        help="run WB and day/night analysis on every frame (worst case)")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    # Keep the console readable: only warnings from web_stream
+    web_stream.logger.setLevel(logging.WARNING)
+    if args.analysis_every_frame:
+        web_stream.WB_UPDATE_EVERY_SEC = 0.0
+        web_stream.LUMA_SAMPLE_EVERY_SEC = 0.0
+    if not ENABLE_STAGE_TIMING:
+        print("Note: ENABLE_STAGE_TIMING is off, stage times will read 0", file=sys.stderr)
+
+    resolutions = [r.strip() for r in args.resolutions.split(",") if r.strip()]
+    configs = [c.strip() for c in args.configs.split(",") if c.strip()]
+    for config in configs:
+        stages_for(config)  # Fail before running anything
+
+    results = []
+    for resolution in resolutions:
+        for config in configs:
+            results.append(run_one(resolution, config, args.seconds, args.warmup))
+            if not args.json:
+                r = results[-1]
+                if len(results) == 1:
+                    header = " ".join(f"{s:>8}" for s in r["stage_ms"])
+                    print(f"{os.cpu_count()} CPU core(s), {args.seconds}s per run, stage times in ms/frame")
+                    print(f"{'resolution':>10} {'config':>9} | {'fps':>7} | {header} | {'bytes/frame':>11}")
+                cells = " ".join(f"{ms:>8}" for ms in r["stage_ms"].values())
+                print(f"{r['resolution']:>10} {r['config']:>9} | {r['fps']:>7} | {cells} | "
+                      f"{r['bytes_per_frame']:>11}")
+    if args.json:
+        print(json.dumps({
+            "cpu_cores": os.cpu_count(),
+            "seconds": args.seconds,
+            "analysis_every_frame": args.analysis_every_frame,
+            "results": results,
+        }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Filename: bench_raw_frame_buffer.py
+Description: Compare the memory traffic of the old "copy every frame for WB
+calibration" approach with the on-demand RawFrameBuffer used by MediaRelay.
+
+No camera is needed: synthetic frames are generated in memory.
+
+Usage:
+    python3 tools/bench_raw_frame_buffer.py
+    python3 tools/bench_raw_frame_buffer.py --frames 300 --request-every 100 --json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path for imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_stream_pipeline import RawFrameBuffer  # noqa: E402
+from config import CAMERA_FRAME_RATE  # noqa: E402
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080)]
+
+
+def bench_copy_every_frame(frames):
+    """Old behavior: frame.copy() on every frame."""
+    copied = 0
+    start = time.perf_counter()
+    for frame in frames:
+        kept = frame.copy()
+        copied += kept.nbytes
+    elapsed = time.perf_counter() - start
+    return elapsed, copied
+
+
+def bench_on_demand(frames, request_every):
+    """New behavior: offer() every frame, copy only when a request is pending."""
+    buffer = RawFrameBuffer()
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        if request_every and i % request_every == 0:
+            buffer.request()  # e.g. someone opened /wb/preview
+        buffer.offer(frame, i)
+    elapsed = time.perf_counter() - start
+    return elapsed, buffer.bytes_copied
+
+
+def run(frame_count, request_every):
+    rng = np.random.default_rng(0)
+    results = []
+    for width, height in RESOLUTIONS:
+        # A few distinct frames so the copies are not served from cache
+        pool = [rng.integers(0, 256, (height, width, 3), dtype=np.uint8) for _ in range(4)]
+        frames = [pool[i % len(pool)] for i in range(frame_count)]
+
+        old_s, old_bytes = bench_copy_every_frame(frames)
+        new_s, new_bytes = bench_on_demand(frames, request_every)
+        results.append({
+            "resolution": f"{width}x{height}",
+            "frames": frame_count,
+            "request_every": request_every,
+            "old_ms_per_frame": round(1000.0 * old_s / frame_count, 4),
+            "new_ms_per_frame": round(1000.0 * new_s / frame_count, 4),
+            "old_bytes_per_frame": old_bytes // frame_count,
+            "new_bytes_per_frame": new_bytes // frame_count,
+            # Memory bandwidth spent on the copy at the configured camera frame rate
+            "old_mb_per_s_at_fps": round(old_bytes / frame_count * CAMERA_FRAME_RATE / 1e6, 2),
+            "new_mb_per_s_at_fps": round(new_bytes / frame_count * CAMERA_FRAME_RATE / 1e6, 3),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--frames", type=int, default=200, help="frames per resolution")
+    parser.add_argument(
+        "--request-every", type=int, default=100,
+        help="simulate one calibration request every N frames (0 = never)",
+    )
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    results = run(max(1, args.frames), max(0, args.request_every))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Raw frame copy benchmark ({args.frames} frames, "
+          f"request every {args.request_every or 'never'}; MB/s at {CAMERA_FRAME_RATE} FPS)")
+    print(f"{'resolution':>10} | {'old ms/f':>9} {'new ms/f':>9} | "
+          f"{'old B/f':>10} {'new B/f':>10} | {'old MB/s':>9} {'new MB/s':>9}")
+    for r in results:
+        print(f"{r['resolution']:>10} | {r['old_ms_per_frame']:>9.3f} {r['new_ms_per_frame']:>9.3f} | "
+              f"{r['old_bytes_per_frame']:>10} {r['new_bytes_per_frame']:>10} | "
+              f"{r['old_mb_per_s_at_fps']:>9.2f} {r['new_mb_per_s_at_fps']:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
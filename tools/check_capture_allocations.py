@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Filename: check_capture_allocations.py
+Description: Measure how much memory MediaRelay allocates per frame, with and
+without buffer pool mode (ENABLE_BUFFER_POOL), using Python's tracemalloc.
+
+NumPy and OpenCV arrays are tracked by tracemalloc, so the "peak above
+baseline" while processing one frame is the amount of short-lived memory
+the allocator had to hand out for it. In buffer pool mode the pixel stages
+(read, color LUT, overlay, rotation) should allocate almost nothing; the
+JPEG encoder still returns one new buffer per frame (OpenCV's Python API
+has no way to encode into an existing buffer).
+
+Runs on a synthetic camera, no hardware needed. Exits with status 1 if the
+pooled pixel stages allocate more than --limit bytes per frame (median), if
+any pooled frame allocates more than --frame-limit bytes from read to
+publish on top of its own JPEG (so a stray copy anywhere in the pooled path
+fails, even in the encode/publish step), or if memory still held after a
+frame grows by more than --retained-limit bytes per frame in either mode
+(a leak; frame history is turned off for the run).
+
+Usage:
+    python3 tools/check_capture_allocations.py
+    python3 tools/check_capture_allocations.py --width 1920 --height 1080 --rotate 180
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+import tracemalloc
+
+# Add parent directory (web_stream) and this directory (synthetic_camera) to path
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import web_stream  # noqa: E402
+from synthetic_camera import SyntheticCapture  # noqa: E402
+
+
+def measure(buffer_pool, width, height, rotate, frames, warmup):
+    """Return per-frame allocation stats for one configuration."""
+    relay = web_stream.MediaRelay(
+        enable_overlay=True,
+        rotation_angle=rotate,
+        width=width,
+        height=height,
+        frame_rate=30.0,
+        pipelined=False,
+        buffer_pool=buffer_pool,
+    )
+    relay.cap = SyntheticCapture(width, height)
+    relay.history = None  # Keeps frames on purpose; not a leak
+    relay.add_consumer("stream")
+
+    def pixel_stages():
+        ret, frame = relay._read_frame()
+        return relay._process_frame(frame, time.time())
+
+    # Warm up: fill buffer rings, compile the LUT, render overlay patches
+    for _ in range(warmup):
+        relay._encode_and_publish(*pixel_stages())
+
+    tracemalloc.start()
+    pixel_peaks = []
+    encode_peaks = []
+    frame_overheads = []  # Whole frame minus its JPEG output
+    start_current = None
+    for i in range(frames):
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        result = pixel_stages()
+        current, peak = tracemalloc.get_traced_memory()
+        pixel_peaks.append(peak - base)
+
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        relay._encode_and_publish(*result)
+        del result
+        current, peak = tracemalloc.get_traced_memory()
+        encode_peaks.append(peak - base)
+        frame_overheads.append(pixel_peaks[-1] + encode_peaks[-1] - len(relay.frame))
+        if i == 0:
+            # Count growth from here: the previous frame (still published)
+            # was allocated before tracing started
+            start_current = current
+    end_current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pixel_peaks.sort()
+    encode_peaks.sort()
+    return {
+        "buffer_pool": buffer_pool,
+        "pixel_median_bytes": pixel_peaks[len(pixel_peaks) // 2],
+        "pixel_max_bytes": pixel_peaks[-1],
+        "encode_median_bytes": encode_peaks[len(encode_peaks) // 2],
+        "frame_overhead_max_bytes": max(frame_overheads),
+        "retained_growth_per_frame": (end_current - start_current) // max(1, frames - 1),
+        "jpeg_bytes": len(relay.frame),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-frame allocation check for MediaRelay")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--rotate", type=int, default=0, choices=[0, 90, 180, 270])
+    parser.add_argument("--frames", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument(
+        "--limit", type=int, default=64 * 1024,
+        help="max median bytes per frame allowed for pooled pixel stages",
+    )
+    parser.add_argument(
+        "--frame-limit", type=int, default=64 * 1024,
+        help="max bytes any pooled frame may allocate (all stages) besides its JPEG",
+    )
+    parser.add_argument(
+        "--retained-limit", type=int, default=4 * 1024,
+        help="max growth of retained memory per frame (either mode)",
+    )
+    args = parser.parse_args()
+
+    # Keep the console readable: only warnings from web_stream
+    web_stream.logger.setLevel(logging.WARNING)
+
+    print(f"MediaRelay allocations per frame at {args.width}x{args.height}, rotate={args.rotate}")
+    print(f"{'mode':>8} | {'pixel median':>12} {'pixel max':>10} | {'encode median':>13} | "
+          f"{'overhead max':>12} | {'retained/frame':>14} | {'jpeg':>8}")
+    results = {}
+    for pool in (False, True):
+        r = measure(pool, args.width, args.height, args.rotate, args.frames, args.warmup)
+        results[pool] = r
+        print(f"{'pool' if pool else 'default':>8} | {r['pixel_median_bytes']:>12} {r['pixel_max_bytes']:>10} | "
+              f"{r['encode_median_bytes']:>13} | {r['frame_overhead_max_bytes']:>12} | "
+              f"{r['retained_growth_per_frame']:>14} | {r['jpeg_bytes']:>8}")
+
+    failures = []
+    pooled = results[True]["pixel_median_bytes"]
+    if pooled > args.limit:
+        failures.append(f"pooled pixel stages allocate {pooled} bytes/frame (limit {args.limit})")
+    overhead = results[True]["frame_overhead_max_bytes"]
+    if overhead > args.frame_limit:
+        failures.append(f"a pooled frame allocates {overhead} bytes besides its JPEG (limit {args.frame_limit})")
+    for pool, r in results.items():
+        growth = r["retained_growth_per_frame"]
+        if growth > args.retained_limit:
+            failures.append(f"{'pool' if pool else 'default'} mode retains {growth} more bytes "
+                            f"every frame (limit {args.retained_limit})")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+    print(f"OK: pooled pixel stages allocate {pooled} bytes/frame (limit {args.limit}), "
+          f"whole pooled frames at most {overhead} bytes besides the JPEG (limit {args.frame_limit}), "
+          f"no retained growth above {args.retained_limit} bytes/frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Filename: check_capture_drain.py
+Description: Check that draining stale camera buffers (CAPTURE_DRAIN_MAX_GRABS)
+and low-latency mode (ENABLE_LOW_LATENCY) never cost frames or add jitter.
+
+Runs MediaRelay's real capture thread on a synthetic camera that paces
+itself and models the driver's frame queue (tools/synthetic_camera.py),
+for several camera/relay frame rate pairs, with the drain off, on, and in
+low-latency mode (1-frame driver buffer). For each run it reports the
+frame rate actually delivered, late deadlines, pacing jitter, frames
+discarded by the drain and how old the kept frames were.
+
+When the camera runs at the relay's own rate nothing is stale, so every
+mode must deliver the full frame rate with the same jitter as the drain
+off. Exits with status 1 if a matched-rate run delivers less than
+--min-fps-ratio of the target or its p95 jitter is more than
+--max-extra-jitter-ms above the run with the drain off.
+
+Usage:
+    python3 tools/check_capture_drain.py
+    python3 tools/check_capture_drain.py --rates 5:5,30:30,30:5 --seconds 5 --json
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+# Add parent directory (web_stream) and this directory (synthetic_camera) to path
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import web_stream  # noqa: E402
+from synthetic_camera import SyntheticCapture  # noqa: E402
+
+# camera fps:relay fps
+DEFAULT_RATES = "5:5,10:10,30:30,30:5"
+MODES = {
+    "off": {"drain_grabs": 0, "low_latency": False},
+    "drain": {"drain_grabs": 4, "low_latency": False},
+    "low_latency": {"drain_grabs": 4, "low_latency": True},
+}
+
+
+def run_one(camera_fps, relay_fps, mode, seconds, warmup):
+    settings = MODES[mode]
+    relay = web_stream.MediaRelay(
+        width=320, height=240, frame_rate=relay_fps, low_latency=settings["low_latency"],
+        pipelined=False, name="drain",
+    )
+    relay.history = None
+    relay.drain_grabs = settings["drain_grabs"]
+    relay.cap = SyntheticCapture(320, 240, fps=camera_fps)
+    # Age of every kept frame, recorded right after the read
+    ages = []
+    read_frame = relay._read_frame
+
+    def read_and_record():
+        result = read_frame()
+        ages.append(relay.cap.last_frame_age)
+        return result
+
+    relay._read_frame = read_and_record
+    relay.add_consumer("stream")
+    relay.start_threads()
+    time.sleep(warmup)
+
+    before = relay.pacer.stats()
+    relay.pacer._jitter.clear()  # Jitter of the measured part only
+    del ages[:]
+    started = time.monotonic()
+    time.sleep(seconds)
+    elapsed = time.monotonic() - started
+    after = relay.pacer.stats()
+    kept_ages = sorted(ages)
+    relay.stop()
+
+    frames = after["frames"] - before["frames"]
+    return {
+        "camera_fps": camera_fps,
+        "relay_fps": relay_fps,
+        "mode": mode,
+        "fps": round(frames / elapsed, 2),
+        "late": after["late"] - before["late"],
+        "skipped_deadlines": after["skipped_deadlines"] - before["skipped_deadlines"],
+        "drained": after["drained_buffers"] - before["drained_buffers"],
+        "jitter_p95_ms": after["jitter_ms"]["p95"],
+        "frame_age_ms": round(1000.0 * kept_ages[len(kept_ages) // 2], 1) if kept_ages else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture drain / low-latency pacing check")
+    parser.add_argument("--rates", default=DEFAULT_RATES, help="camera:relay fps pairs, e.g. 5:5,30:5")
+    parser.add_argument("--modes", default=",".join(MODES), help="off, drain, low_latency")
+    parser.add_argument("--seconds", type=float, default=4.0, help="measured time per run")
+    parser.add_argument("--warmup", type=float, default=1.0)
+    parser.add_argument("--min-fps-ratio", type=float, default=0.95)
+    parser.add_argument("--max-extra-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a table")
+    args = parser.parse_args()
+
+    # Keep the console readable: only warnings from web_stream
+    web_stream.logger.setLevel(logging.WARNING)
+    rates = [tuple(float(v) for v in pair.split(":")) for pair in args.rates.split(",") if pair]
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"unknown mode {mode!r} ({', '.join(MODES)})")
+
+    results = []
+    for camera_fps, relay_fps in rates:
+        for mode in modes:
+            results.append(run_one(camera_fps, relay_fps, mode, args.seconds, args.warmup))
+            if not args.json:
+                r = results[-1]
+                if len(results) == 1:
+                    print(f"{'camera':>6} {'relay':>5} {'mode':>11} | {'fps':>6} {'late':>4} {'skip':>4} | "
+                          f"{'jitter p95':>10} | {'drained':>7} {'age ms':>7}")
+                print(f"{r['camera_fps']:>6g} {r['relay_fps']:>5g} {r['mode']:>11} | {r['fps']:>6} "
+                      f"{r['late']:>4} {r['skipped_deadlines']:>4} | {r['jitter_p95_ms']:>10} | "
+                      f"{r['drained']:>7} {r['frame_age_ms']:>7}")
+
+    # Matched rates: nothing is stale, so no mode may cost frames or jitter
+    failures = []
+    for camera_fps, relay_fps in rates:
+        if camera_fps != relay_fps:
+            continue
+        runs = {r["mode"]: r for r in results if (r["camera_fps"], r["relay_fps"]) == (camera_fps, relay_fps)}
+        baseline = runs.get("off")
+        for mode, r in runs.items():
+            if r["fps"] < args.min_fps_ratio * relay_fps:
+                failures.append(f"{camera_fps:g}:{relay_fps:g} {mode}: {r['fps']} fps (target {relay_fps:g})")
+            if baseline and r["jitter_p95_ms"] > baseline["jitter_p95_ms"] + args.max_extra_jitter_ms:
+                failures.append(f"{camera_fps:g}:{relay_fps:g} {mode}: p95 jitter {r['jitter_p95_ms']} ms "
+                                f"(drain off: {baseline['jitter_p95_ms']} ms)")
+    if args.json:
+        print(json.dumps({"results": results, "failures": failures}, indent=2))
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr if args.json else sys.stdout)
+    if failures:
+        sys.exit(1)
+    if not args.json:
+        print("OK: matched camera/relay rates keep their frame rate and jitter in every mode")
+
+
+if __name__ == "__main__":
+    main()
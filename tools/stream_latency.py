@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Filename: stream_latency.py
+Description: Measure how old MJPEG frames are when they reach a viewer.
+
+Every part of /streamN.mjpg carries two extra headers:
+    X-Frame-Seq          the relay's frame number (1, 2, 3, ...)
+    X-Capture-Timestamp  Unix time the frame left the camera driver
+This client reads the stream and, for every frame, subtracts the capture
+time from the time the whole JPEG arrived. That covers decoding, color
+correction, overlays, JPEG encoding, the wait for the viewer's turn and the
+network - everything except the camera's own exposure/USB time and the
+browser's decode and paint. Gaps in X-Frame-Seq are frames the viewer
+never got (it was too slow, or the relay dropped them).
+
+Clocks: the capture time comes from the server's clock. Run this on the
+Pi itself, or sync both machines with NTP/chrony and pass the known
+difference with --clock-offset (seconds the server clock is ahead).
+For true glass-to-glass latency, film a millisecond clock with the camera
+and photograph the clock next to the browser showing the stream.
+
+ENABLE_LOW_LATENCY in config.py (1-frame camera buffer) is meant to lower
+these numbers on a USB camera that runs faster than the stream; compare a
+run with it off and on (--synthetic --low-latency does this on a synthetic
+camera that models the driver's frame queue).
+
+Usage:
+    python3 tools/stream_latency.py --url http://raspberrypi.local:8000/stream0.mjpg
+    python3 tools/stream_latency.py --synthetic asyncio --seconds 10
+    python3 tools/stream_latency.py --synthetic threaded --fps 10 --camera-fps 10 --low-latency --json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.request
+
+# Add parent directory (web_stream) and this directory (stream_load_test) to path
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+DEFAULT_URL = "http://127.0.0.1:8000/stream0.mjpg"
+
+
+def read_part(stream):
+    """Headers of the next multipart part as a dict (lower-case names), body skipped."""
+    headers = {}
+    while True:
+        line = stream.readline()
+        if not line:
+            raise EOFError("stream closed")
+        line = line.strip()
+        if not line:
+            if headers:
+                break
+            continue  # Trailing CRLF of the previous part
+        if line.startswith(b"--"):
+            continue  # Boundary
+        name, _, value = line.partition(b":")
+        headers[name.strip().lower().decode("ascii", "replace")] = value.strip().decode("ascii", "replace")
+    length = int(headers.get("content-length", 0))
+    remaining = length
+    while remaining > 0:
+        chunk = stream.read(min(remaining, 65536))
+        if not chunk:
+            raise EOFError("stream closed mid-frame")
+        remaining -= len(chunk)
+    return headers
+
+
+def measure(url, seconds, clock_offset, warmup):
+    """Read the stream for `seconds` (after `warmup`); return the raw samples."""
+    latencies, seqs = [], []
+    missing_headers = 0
+    with urllib.request.urlopen(url, timeout=10) as stream:
+        started = time.time()
+        measure_from = started + warmup
+        while time.time() < measure_from + seconds:
+            headers = read_part(stream)
+            received = time.time()  # Whole JPEG is here
+            if received < measure_from:
+                continue  # First frames may have waited for the connection
+            if "x-capture-timestamp" not in headers or "x-frame-seq" not in headers:
+                missing_headers += 1
+                continue
+            captured = float(headers["x-capture-timestamp"]) - clock_offset
+            latencies.append(received - captured)
+            seqs.append(int(headers["x-frame-seq"]))
+    return latencies, seqs, missing_headers
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(latencies, seqs, missing_headers, seconds):
+    ordered = sorted(latencies)
+    missed = sum(max(0, b - a - 1) for a, b in zip(seqs, seqs[1:]))
+    span = seqs[-1] - seqs[0] + 1 if seqs else 0
+    return {
+        "frames": len(latencies),
+        "fps": round(len(latencies) / seconds, 2),
+        "latency_ms": {
+            name: round(1000.0 * percentile(ordered, fraction), 2)
+            for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99))
+        } | {
+            "min": round(1000.0 * ordered[0], 2) if ordered else 0.0,
+            "max": round(1000.0 * ordered[-1], 2) if ordered else 0.0,
+        },
+        # Published frames this viewer never received
+        "frames_missed": missed,
+        "missed_percent": round(100.0 * missed / span, 2) if span else 0.0,
+        "parts_without_timestamps": missing_headers,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture-to-receive latency of an MJPEG stream")
+    parser.add_argument("--url", default=DEFAULT_URL)
+    parser.add_argument("--synthetic", choices=["asyncio", "threaded"],
+                        help="start a local server with a synthetic camera instead of using --url")
+    parser.add_argument("--width", type=int, default=1280, help="synthetic camera size")
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--fps", type=float, default=15.0, help="synthetic stream frame rate")
+    parser.add_argument("--camera-fps", type=float, help="synthetic sensor frame rate (default 2 x --fps)")
+    parser.add_argument("--low-latency", action="store_true", help="synthetic server in low-latency mode")
+    parser.add_argument("--seconds", type=float, default=10.0, help="measured time")
+    parser.add_argument("--warmup", type=float, default=1.0, help="seconds ignored at the start")
+    parser.add_argument("--clock-offset", type=float, default=0.0,
+                        help="seconds the server clock is ahead of this machine's")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of text")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if args.synthetic:
+        from stream_load_test import ServerProcess
+        server = ServerProcess(args.synthetic, args.width, args.height, args.fps,
+                               args.camera_fps, args.low_latency)
+        url = f"http://127.0.0.1:{server.port}/stream0.mjpg"
+    try:
+        latencies, seqs, missing = measure(url, args.seconds, args.clock_offset, args.warmup)
+    finally:
+        if server is not None:
+            server.stop()
+
+    result = {"url": url, "seconds": args.seconds, "clock_offset": args.clock_offset}
+    result.update(summarize(latencies, seqs, missing, args.seconds))
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    if missing and not latencies:
+        print(f"{url}: no X-Capture-Timestamp headers (server older than this tool?)")
+        return
+    ms = result["latency_ms"]
+    print(f"{url}: {result['frames']} frames in {args.seconds}s ({result['fps']} fps)")
+    print(f"  capture -> received  p50 {ms['p50']} ms  p90 {ms['p90']} ms  p99 {ms['p99']} ms  "
+          f"max {ms['max']} ms")
+    print(f"  frames missed: {result['frames_missed']} ({result['missed_percent']}%)")
+    if ms["min"] < 0:
+        print("  Negative latency: the clocks differ, see --clock-offset")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Filename: stream_load_test.py
+Description: Open many simultaneous /stream0.mjpg viewers against a local
+streaming server and check that every one of them keeps receiving frames.
+
+The server, MediaRelay and a synthetic camera run in a child process, so
+no camera or second machine is needed and the server's CPU use and thread
+count can be measured on their own (Linux /proc). Viewers are asyncio
+coroutines in this process that parse the multipart stream frame by frame.
+
+For each viewer count it reports the FPS every viewer actually received,
+the time between consecutive frames (inter-frame latency percentiles over
+all viewers), server CPU and peak server threads. --sweep tries several
+viewer counts to find where FPS collapses; the viewers themselves use CPU
+too, so on a single machine the result is a lower bound.
+
+Usage:
+    python3 tools/stream_load_test.py --server asyncio --clients 300
+    python3 tools/stream_load_test.py --server threaded --clients 50 --seconds 10
+    python3 tools/stream_load_test.py --server threaded --sweep 1,10,50,100,200,400 --json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+
+# Add parent directory (web_stream) and this directory (synthetic_camera) to path
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TOOLS_DIR))
+sys.path.insert(0, TOOLS_DIR)
+
+import web_stream  # noqa: E402
+from bench_multi_camera import process_cpu_seconds  # noqa: E402
+from synthetic_camera import SyntheticCapture  # noqa: E402
+
+DEFAULT_SWEEP = "1,10,50,100,200,400"
+
+
+def start_relay(width, height, fps, camera_fps=None, low_latency=False):
+    """MediaRelay fed by a synthetic camera (default: twice `fps`), capture thread running."""
+    relay = web_stream.MediaRelay(
+        enable_overlay=True, width=width, height=height, frame_rate=fps, low_latency=low_latency
+    )
+    relay.cap = SyntheticCapture(width, height, fps=camera_fps or fps * 2)
+    relay.start_threads()
+    return relay
+
+
+def start_server(kind, relay):
+    """Start the chosen server on a free localhost port. Returns (server, port)."""
+    if kind == "asyncio":
+        srv = web_stream.AsyncStreamingServer(
+            ("127.0.0.1", 0), relay, web_stream.simple_response,
+            web_stream.StreamingHandler._parse_rendition, web_stream.parse_replay,
+        )
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        srv.started.wait(5)
+        return srv, srv.port
+    web_stream.relay0 = relay  # The threaded handler serves the global relay
+    web_stream.StreamingHandler.log_message = lambda *args: None  # No per-request stderr lines
+    srv = web_stream.StreamingServer(("127.0.0.1", 0), web_stream.StreamingHandler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv, srv.server_address[1]
+
+
+def server_process_main(kind, width, height, fps, conn, camera_fps=None, low_latency=False):
+    """Child process: synthetic relay + server until the parent says stop."""
+    web_stream.logger.setLevel(logging.WARNING)
+    relay = start_relay(width, height, fps, camera_fps, low_latency)
+    srv, port = start_server(kind, relay)
+    conn.send(port)
+    try:
+        conn.recv()  # Any message (or the parent exiting) means stop
+    except EOFError:
+        pass
+    srv.shutdown()
+    relay.stop()
+
+
+class ServerProcess:
+    """Run start_relay() + start_server() in a child process."""
+
+    def __init__(self, kind, width, height, fps, camera_fps=None, low_latency=False):
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=server_process_main,
+            args=(kind, width, height, fps, child_conn, camera_fps, low_latency),
+            daemon=True,
+        )
+        self.process.start()
+        if not self._conn.poll(30):
+            self.process.kill()
+            raise RuntimeError("server process did not start")
+        self.port = self._conn.recv()
+
+    def cpu_seconds(self):
+        return process_cpu_seconds(self.process.pid)
+
+    def thread_count(self):
+        """Threads in the server process right now (Linux), or 0."""
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith("Threads:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    def stop(self):
+        try:
+            self._conn.send("stop")
+        except OSError:
+            pass
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.kill()
+
+
+def raise_open_file_limit(needed):
+    """Every viewer needs a socket on both ends; lift the soft limit if we can."""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+
+async def viewer(port, path, stop_at, result):
+    """One MJPEG client: count the complete JPEG parts it receives."""
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    except OSError as e:
+        result["error"] = str(e)
+        return
+    try:
+        writer.write(f"GET {path} HTTP/1.0\r\nHost: localhost\r\n\r\n".encode())
+        await writer.drain()
+        await reader.readuntil(b"\r\n\r\n")  # Response headers
+        while time.monotonic() < stop_at:
+            remaining = max(0.1, stop_at - time.monotonic())
+            part_head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), remaining)
+            length = 0
+            for line in part_head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length + 2)  # JPEG + trailing CRLF
+            now = time.monotonic()
+            if result["first"] is None:
+                result["first"] = now
+            else:
+                result["gaps"].append(now - result["last"])
+            result["frames"] += 1
+            result["last"] = now
+    except asyncio.TimeoutError:
+        pass
+    except (OSError, asyncio.IncompleteReadError) as e:
+        result["error"] = str(e) or type(e).__name__
+    finally:
+        writer.close()
+
+
+async def run_clients(port, path, clients, seconds, ramp):
+    results = [{"frames": 0, "first": None, "last": None, "error": None, "gaps": []} for _ in range(clients)]
+    stop_at = time.monotonic() + ramp + seconds
+    tasks = []
+    for result in results:
+        tasks.append(asyncio.create_task(viewer(port, path, stop_at, result)))
+        if ramp:
+            await asyncio.sleep(ramp / clients)
+    await asyncio.gather(*tasks)
+    return results
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def summarize(kind, clients, seconds, results, fps, server_threads, server_cpu=None):
+    rates = []
+    for r in results:
+        if r["frames"] >= 2:
+            rates.append((r["frames"] - 1) / max(1e-6, r["last"] - r["first"]))
+        else:
+            rates.append(0.0)
+    starved = sum(1 for r in results if r["frames"] == 0)
+    gaps = sorted(gap for r in results for gap in r["gaps"])
+    summary = {
+        "server": kind,
+        "clients": clients,
+        "seconds": seconds,
+        "camera_fps": fps,
+        "errors": sum(1 for r in results if r["error"]),
+        "starved_clients": starved,
+        "fps_per_client": {
+            "min": round(min(rates), 2),
+            "median": round(statistics.median(rates), 2),
+            "max": round(max(rates), 2),
+        },
+        "total_frames": sum(r["frames"] for r in results),
+        # Time between consecutive frames at each viewer (1000 / fps = perfect)
+        "interframe_ms": {
+            name: round(1000.0 * percentile(gaps, fraction), 1)
+            for name, fraction in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+        },
+        "server_threads": server_threads,
+    }
+    if server_cpu is not None:
+        # 100% = one CPU core fully busy
+        summary["server_cpu_percent"] = round(100.0 * server_cpu / seconds, 1)
+    return summary
+
+
+def measure(kind, clients, args):
+    """Fresh server process, `clients` viewers; returns the summary dict."""
+    server = ServerProcess(kind, args.width, args.height, args.fps)
+    try:
+        # Sample the server's thread count and CPU while the viewers run
+        threads_seen = []
+        cpu = {}
+        sampler_stop = threading.Event()
+
+        def sample_server():
+            # CPU is measured after the ramp, i.e. with every viewer connected
+            if not sampler_stop.wait(args.ramp):
+                cpu["start"] = (time.monotonic(), server.cpu_seconds())
+            while not sampler_stop.wait(0.5):
+                threads_seen.append(server.thread_count())
+                cpu["end"] = (time.monotonic(), server.cpu_seconds())
+
+        sampler = threading.Thread(target=sample_server, daemon=True)
+        sampler.start()
+        results = asyncio.run(run_clients(server.port, args.path, clients, args.seconds, args.ramp))
+        sampler_stop.set()
+        sampler.join()
+    finally:
+        server.stop()
+    server_cpu = None
+    if "start" in cpu and "end" in cpu:
+        (t0, c0), (t1, c1) = cpu["start"], cpu["end"]
+        server_cpu = (c1 - c0) * args.seconds / max(1e-6, t1 - t0)  # Scaled to the full window
+    return summarize(kind, clients, args.seconds, results, args.fps, max(threads_seen or [0]), server_cpu)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent MJPEG viewer load test")
+    parser.add_argument("--server", choices=["asyncio", "threaded"], default="asyncio")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--sweep", nargs="?", const=DEFAULT_SWEEP, default=None,
+                        help=f"comma-separated viewer counts to try one after another (default {DEFAULT_SWEEP})")
+    parser.add_argument("--seconds", type=float, default=8.0)
+    parser.add_argument("--ramp", type=float, default=2.0, help="seconds to connect all clients")
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=240)
+    parser.add_argument("--fps", type=float, default=5.0)
+    parser.add_argument("--path", default="/stream0.mjpg")
+    parser.add_argument("--json", action="store_true", help="print JSON instead of a summary")
+    args = parser.parse_args()
+
+    web_stream.logger.setLevel(logging.WARNING)
+    counts = [int(n) for n in args.sweep.split(",") if n.strip()] if args.sweep else [args.clients]
+    raise_open_file_limit(2 * max(counts) + 256)
+
+    summaries = []
+    for clients in counts:
+        summaries.append(measure(args.server, clients, args))
+        if args.json:
+            continue
+        summary = summaries[-1]
+        if len(summaries) == 1:
+            print(f"{args.server} server, camera {args.fps} FPS at {args.width}x{args.height}, "
+                  f"{args.seconds}s per run, {os.cpu_count()} CPU core(s)")
+            print(f"{'viewers':>7} | {'fps min':>7} {'median':>7} | {'gap p50':>7} {'p95':>7} {'p99':>7} "
+                  f"{'max ms':>7} | {'cpu %':>6} {'threads':>7} | starved errors")
+        rates, gaps = summary["fps_per_client"], summary["interframe_ms"]
+        print(f"{clients:>7} | {rates['min']:>7} {rates['median']:>7} | {gaps['p50']:>7} {gaps['p95']:>7} "
+              f"{gaps['p99']:>7} {gaps['max']:>7} | {summary.get('server_cpu_percent', '-'):>6} "
+              f"{summary['server_threads']:>7} | {summary['starved_clients']:>7} {summary['errors']:>6}")
+    if args.json:
+        print(json.dumps(summaries if args.sweep else summaries[0], indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Filename: synthetic_camera.py
+Description: Camera stand-in with the same interface as cv2.VideoCapture,
+for benchmarking and load-testing MediaRelay without /dev/video0.
+
+It produces a moving test pattern (gradient + bars + noise) so JPEG sizes
+and encode times are realistic, supports read(image=...), grab()/retrieve(),
+CAP_PROP_CONVERT_RGB=0 (returns camera-style MJPEG buffers) and can pace
+itself to a fixed frame rate like a real sensor. When paced it also models
+the V4L2 driver queue: up to `buffers` frames wait for the application and
+newer frames are dropped while that queue is full, so a slow reader gets
+stale frames exactly like with a real USB camera.
+
+Usage (from another tool):
+    from synthetic_camera import SyntheticCapture
+    relay.cap = SyntheticCapture(1280, 720, fps=30)
+
+Usage (stand-alone self check):
+    python3 tools/synthetic_camera.py
+"""
+
+import time
+
+import cv2
+import numpy as np
+
+
+class SyntheticCapture:
+    """Minimal cv2.VideoCapture look-alike that generates frames in memory."""
+
+    def __init__(self, width=1280, height=720, fps=None, pattern_frames=8, seed=0, buffers=4):
+        self.width = int(width)
+        self.height = int(height)
+        self.fps = fps  # None = deliver frames as fast as they are asked for
+        self.convert_rgb = True
+        self.read_count = 0
+        self.grab_count = 0
+        self._opened = True
+        self.buffers = max(1, int(buffers))
+        self._start = time.monotonic()
+        self._produced = 0  # Frames the "sensor" has produced so far
+        self._queue = []  # Production times of frames waiting in the driver
+        self._pending = None  # Index of the grabbed-but-not-retrieved frame
+        self.last_frame_age = 0.0  # Seconds between production and grab of the last frame
+        self._frame_stamp = 0.0  # Monotonic production time of the last frame (CAP_PROP_POS_MSEC)
+        self._patterns = self._make_patterns(pattern_frames, seed)
+        self._jpegs = None  # Encoded versions, built on first CONVERT_RGB=0 read
+        self._start = time.monotonic()  # Sensor starts once the patterns exist
+
+    def _make_patterns(self, count, seed):
+        """Pre-render a few frames of a moving pattern (cheap to replay)."""
+        rng = np.random.default_rng(seed)
+        h, w = self.height, self.width
+        x = np.linspace(0, 255, w, dtype=np.float32)
+        y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+        patterns = []
+        for i in range(max(1, count)):
+            shift = i * w // max(1, count)
+            frame = np.empty((h, w, 3), np.uint8)
+            frame[:, :, 0] = np.roll(x, shift)[None, :] * 0.6 + y * 0.4
+            frame[:, :, 1] = (y * 0.7 + 40).astype(np.uint8)
+            frame[:, :, 2] = np.roll(x[::-1], shift)[None, :] * 0.5 + 60
+            # Vertical bars and a little sensor noise
+            frame[:, (np.arange(w) // 64) % 2 == 0] //= 2
+            noise = rng.integers(0, 12, (h, w, 3), dtype=np.uint8)
+            cv2.add(frame, noise, dst=frame)
+            patterns.append(frame)
+        return patterns
+
+    # ------------------------ VideoCapture API ---------------------------- #
+    def isOpened(self):
+        return self._opened
+
+    def release(self):
+        self._opened = False
+
+    def set(self, prop_id, value):
+        if prop_id == cv2.CAP_PROP_CONVERT_RGB:
+            self.convert_rgb = bool(value)
+            return True
+        if prop_id == cv2.CAP_PROP_FPS:
+            self.fps = float(value) if value else None
+            # Restart the sensor clock at the new rate
+            self._start = time.monotonic()
+            self._produced = 0
+            self._queue = []
+            return True
+        if prop_id == cv2.CAP_PROP_BUFFERSIZE:
+            self.buffers = max(1, int(value))
+            return True
+        # Resolution, exposure, FOURCC...: accepted and ignored
+        return True
+
+    def get(self, prop_id):
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.width)
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.height)
+        if prop_id == cv2.CAP_PROP_FPS:
+            return float(self.fps or 0.0)
+        if prop_id == cv2.CAP_PROP_BUFFERSIZE:
+            return float(self.buffers)
+        if prop_id == cv2.CAP_PROP_POS_MSEC:
+            # Like V4L2: when the sensor produced the frame, monotonic clock in ms
+            return 1000.0 * self._frame_stamp
+        if prop_id == cv2.CAP_PROP_FOURCC:
+            return float(cv2.VideoWriter_fourcc(*"MJPG"))
+        return 0.0
+
+    def _produce_until(self, now):
+        """Simulate the sensor: queue frames produced up to `now`, drop them when full."""
+        while self._start + self._produced / self.fps <= now:
+            if len(self._queue) < self.buffers:
+                self._queue.append((self._produced, self._start + self._produced / self.fps))
+            self._produced += 1
+
+    def grab(self):
+        """Take the oldest queued frame (waiting for one if paced and none is queued)."""
+        if not self._opened:
+            return False
+        if self.fps:
+            now = time.monotonic()
+            self._produce_until(now)
+            if not self._queue:
+                due = self._start + self._produced / self.fps
+                time.sleep(max(0.0, due - now))
+                now = time.monotonic()
+                self._produce_until(now)
+            index, produced_at = self._queue.pop(0)
+            self.last_frame_age = now - produced_at
+            self._frame_stamp = produced_at
+        else:
+            index = self.grab_count
+            self._frame_stamp = time.monotonic()
+        self._pending = index % len(self._patterns)
+        self.grab_count += 1
+        return True
+
+    def retrieve(self, image=None, flag=0):
+        """Return the grabbed frame (copied into `image` if it has the right shape)."""
+        if self._pending is None:
+            return False, None
+        index = self._pending
+        self._pending = None
+        if not self.convert_rgb:
+            # Like a USB camera in MJPEG mode: a 1xN buffer of JPEG bytes
+            if self._jpegs is None:
+                self._jpegs = [
+                    cv2.imencode(".jpg", p, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].reshape(1, -1)
+                    for p in self._patterns
+                ]
+            return True, self._jpegs[index].copy()
+        source = self._patterns[index]
+        if image is not None and image.shape == source.shape and image.dtype == source.dtype:
+            np.copyto(image, source)
+            return True, image
+        return True, source.copy()
+
+    def read(self, image=None):
+        """grab() + retrieve(), like cv2.VideoCapture.read()."""
+        if not self.grab():
+            return False, None
+        self.read_count += 1
+        return self.retrieve(image)
+
+
+if __name__ == "__main__":
+    cap = SyntheticCapture(640, 480, fps=30)
+    start = time.monotonic()
+    for _ in range(30):
+        ok, frame = cap.read()
+    elapsed = time.monotonic() - start
+    print(f"30 frames of {frame.shape} in {elapsed:.2f}s ({30 / elapsed:.1f} FPS)")
+    buf = np.empty_like(frame)
+    ok, same = cap.read(image=buf)
+    print(f"read(image=...) reused the buffer: {same is buf}")
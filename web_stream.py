@@ -39,18 +39,47 @@
 import os  # For file system operations and path handling
 import sys  # For interpreter path visibility in logs
 import logging  # For dynamic level tweaks when debugging
+import multiprocessing  # For camera worker processes (ENABLE_CAMERA_PROCESSES)
+import socket  # For network info and send timeouts on stream clients
 import socketserver  # For creating network servers that handle multiple clients
 import time  # For adding delays and timing operations
+from contextlib import contextmanager  # For "with relay.consumer():" blocks
+from email.utils import formatdate, parsedate_to_datetime  # For HTTP dates
 import numpy as np  # For numerical operations and color correction
 from http import server  # For creating HTTP web servers
 from threading import (
     Condition,  # For synchronizing threads (like a traffic signal)
+    Lock,  # For protecting shared counters
     Thread,  # For running background tasks
+    current_thread,  # For naming HTTP connection threads
 )  # For running multiple tasks simultaneously
-from typing import Optional  # For type hints
+from typing import Dict, Optional  # For type hints
 
 from logging_config import get_logger
 from web_stream_page import PAGE
+from web_stream_async import AsyncStreamingServer
+from web_stream_cameras import camera_configs, split_camera_path
+from web_stream_adaptive import AdaptiveQuality
+from web_stream_history import FrameHistory, ReplayCursor, parse_time
+from web_stream_metrics import PipelineMetrics, render_prometheus, timed_stage
+from web_stream_profiler import ProfilerBusy, sample_threads, stage_deltas
+from web_stream_workers import SharedFrameRing, camera_worker_main, wait_for_reply
+from web_stream_multipart import STREAM_CONTENT_TYPE, jpeg_size, limit_send_buffer, make_part, send_part
+from web_stream_pipeline import (
+    ClientStats,
+    DropOldestQueue,
+    FramePacer,
+    FramePool,
+    OrderedEncoderPool,
+    PublishedFrame,
+    RawFrameBuffer,
+)
+from web_stream_renditions import RenditionCache
+from web_stream_overlay import (
+    OverlayCompositor,
+    build_label_patch,
+    build_day_night_patch,
+)
 from config import (
     ENABLE_LABEL_OVERLAY,
     LABEL_TEXT,
@@ -68,9 +97,40 @@ from config import (
     CAMERA_DAY_EXPOSURE_VALUE,
     CAMERA_NIGHT_EXPOSURE_VALUE,
     JPEG_QUALITY,
+    ENABLE_ADAPTIVE_QUALITY,
+    ADAPTIVE_QUALITY_MIN,
+    ADAPTIVE_QUALITY_STEP,
+    ADAPTIVE_SCALES,
+    ADAPTIVE_TARGET_KBPS,
+    ADAPTIVE_ENCODE_BUDGET,
+    ADAPTIVE_MAX_LAG_SECONDS,
+    ADAPTIVE_WINDOW_SECONDS,
+    ADAPTIVE_UP_WINDOWS,
+    USB_CAMERA_FOURCC,
+    ENABLE_MJPEG_PASSTHROUGH,
+    ENABLE_PIPELINED_CAPTURE,
+    PIPELINE_QUEUE_SIZE,
+    JPEG_ENCODER_WORKERS,
+    ENABLE_BUFFER_POOL,
+    CAPTURE_DRAIN_MAX_GRABS,
+    ENABLE_LOW_LATENCY,
+    ENABLE_ASYNC_SERVER,
+    STREAM_SEND_TIMEOUT,
+    STREAM_MAX_LAG_SECONDS,
+    STREAM_SEND_BUFFER_BYTES,
+    SNAPSHOT_MAX_AGE_SECONDS,
+    FRAME_HISTORY_BYTES,
+    FRAME_HISTORY_ALWAYS_RECORD,
     KNOWN_CAMERA_INDEX,
+    CAMERAS,
+    ENABLE_CAMERA_PROCESSES,
+    CAMERA_WORKER_RING_SLOTS,
+    CAMERA_WORKER_SLOT_BYTES,
+    ENABLE_PROFILE_ENDPOINT,
+    PROFILE_MAX_SECONDS,
     # Day/Night config (software only)
     ENABLE_DAY_NIGHT,
+    DAY_NIGHT_BADGE,
     NIGHT_LUMA_THRESHOLD,
     DAY_LUMA_THRESHOLD,
     LUMA_SAMPLE_EVERY_SEC,
@@ -88,6 +148,7 @@ from config import (
     WB_GAIN_MAX,
     WB_EXCLUDE_DARK,
     WB_EXCLUDE_BRIGHT,
+    ANALYSIS_THUMB_WIDTH,
     WB_CALIBRATION_FILE,
     # Night-only brightness boost
     NIGHT_BRIGHTNESS_ENABLE,
@@ -192,6 +253,161 @@ def apply_brightness_contrast_gamma(frame, alpha=1.0, beta=0.0, gamma=1.0):
         return frame
 
 
+# ---------------------- COLOR PIPELINE COMPILER --------------------------- #
+class ColorPipeline:
+    """
+    Folds every per-pixel color stage into ONE lookup table (LUT).
+
+    RGB correction, white balance gains, LED gamma and the night
+    brightness/contrast/gamma boost all map each channel value 0-255 to a new
+    value 0-255 independently. Chaining several such mappings is the same as
+    applying a single combined table, so instead of split/multiply/merge/LUT
+    passes over 2 million pixels per frame we do one cv2.LUT call.
+
+    The table is built by running a 256-pixel "ramp" image through the
+    original functions above, so the result is identical to the old
+    step-by-step pipeline. It is cached and only rebuilt when the gains,
+    the day/night mode or the color config change.
+    """
+
+    def __init__(self):
+        self._key = None  # Settings the cached table was built from
+        self._lut = None  # 1x256x3 uint8 table (None = identity, nothing to do)
+        self.rebuild_count = 0  # How many times the table was (re)compiled
+
+    @staticmethod
+    def _config_key(wb_gains, mode):
+        """Everything that affects the table, as a hashable tuple."""
+        night = bool(
+            ENABLE_DAY_NIGHT and NIGHT_BRIGHTNESS_ENABLE and mode == "night"
+        )
+        return (
+            bool(ENABLE_RGB_LED_CORRECTION),
+            round(float(RGB_CORRECTION_RED * wb_gains[0]), 6),
+            round(float(RGB_CORRECTION_GREEN * wb_gains[1]), 6),
+            round(float(RGB_CORRECTION_BLUE * wb_gains[2]), 6),
+            float(RGB_LED_GAMMA),
+            night,
+            float(NIGHT_BRIGHTNESS_ALPHA) if night else 1.0,
+            float(NIGHT_BRIGHTNESS_BETA) if night else 0.0,
+            float(NIGHT_EXTRA_GAMMA) if night else 1.0,
+        )
+
+    @staticmethod
+    def _compile(key):
+        """Build the combined 1x256x3 table for the given settings."""
+        (rgb_enable, red, green, blue, led_gamma,
+         night, alpha, beta, night_gamma) = key
+        # Ramp image: one row of 256 pixels whose B, G and R values are 0..255
+        ramp = np.repeat(np.arange(256, dtype=np.uint8), 3).reshape(1, 256, 3)
+        table = ramp
+        if rgb_enable:
+            table = apply_rgb_led_correction(
+                table,
+                red_mult=red,
+                green_mult=green,
+                blue_mult=blue,
+                gamma=led_gamma,
+            )
+        if night:
+            table = apply_brightness_contrast_gamma(
+                table, alpha=alpha, beta=beta, gamma=night_gamma
+            )
+        if np.array_equal(table, ramp):
+            return None  # Identity table: skip the LUT pass entirely
+        return np.ascontiguousarray(table)
+
+    def get_lut(self, wb_gains, mode):
+        """Return the cached table, recompiling only if settings changed."""
+        key = self._config_key(wb_gains, mode)
+        if key != self._key:
+            self._lut = self._compile(key)
+            self._key = key
+            self.rebuild_count += 1
+            logger.debug(
+                f"[ColorPipeline] LUT rebuilt (#{self.rebuild_count}) for {key}"
+            )
+        return self._lut
+
+    def apply(self, frame, wb_gains, mode, in_place=False):
+        """Apply every color stage to a BGR frame with a single cv2.LUT.
+        in_place=True overwrites `frame` instead of allocating a new array.
+        """
+        if frame is None:
+            return frame
+        lut = self.get_lut(wb_gains, mode)
+        if lut is None:
+            return frame
+        if in_place:
+            return cv2.LUT(frame, lut, dst=frame)
+        return cv2.LUT(frame, lut)
+
+
+# ------------------------ ANALYSIS THUMBNAIL ------------------------------ #
+class AnalysisThumbnail:
+    """
+    Small downscaled copy of a camera frame shared by every analysis stage.
+
+    Brightness (day/night), grayworld white balance and WB calibration
+    previews only need averages, and the average of a 320-pixel-wide
+    thumbnail is practically the same as that of the full 1080p frame at a
+    tiny fraction of the cost. The thumbnail, its grayscale version and the
+    "usable pixels" mask are each computed once and then reused.
+    """
+
+    def __init__(self, frame, max_width=ANALYSIS_THUMB_WIDTH):
+        h, w = frame.shape[:2]
+        scale = float(max_width) / max(w, 1)
+        if scale < 1.0:
+            # INTER_AREA averages blocks of pixels, like a proper downscale should
+            self.bgr = cv2.resize(
+                frame,
+                (max(1, int(w * scale)), max(1, int(h * scale))),
+                interpolation=cv2.INTER_AREA,
+            )
+        else:
+            # Small frame: keep our own copy, the original may be drawn on later
+            self.bgr = frame.copy()
+        self.gray = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2GRAY)
+        self._mask = None
+
+    @classmethod
+    def _from_parts(cls, bgr, gray):
+        """Wrap already-downscaled arrays (used for ROI crops)."""
+        thumb = cls.__new__(cls)
+        thumb.bgr = bgr
+        thumb.gray = gray
+        thumb._mask = None
+        return thumb
+
+    @property
+    def mask(self):
+        """255 where a pixel is neither too dark nor too bright for WB statistics."""
+        if self._mask is None:
+            self._mask = cv2.inRange(self.gray, WB_EXCLUDE_DARK, WB_EXCLUDE_BRIGHT)
+        return self._mask
+
+    def luma(self):
+        """Average brightness, normalized to 0.0-1.0."""
+        return cv2.mean(self.gray)[0] / 255.0
+
+    def masked_channel_means(self):
+        """(R, G, B) means over the usable pixels in one pass, or None if there are none."""
+        if cv2.countNonZero(self.mask) == 0:
+            return None
+        b_mean, g_mean, r_mean, _ = cv2.mean(self.bgr, mask=self.mask)
+        return (r_mean, g_mean, b_mean)
+
+    def roi(self, roi_mode="", size_fraction=0.45):
+        """Thumbnail of a region, using the same rules as MediaRelay._extract_roi."""
+        if not roi_mode:
+            return self
+        return AnalysisThumbnail._from_parts(
+            MediaRelay._extract_roi(self.bgr, roi_mode, size_fraction),
+            MediaRelay._extract_roi(self.gray, roi_mode, size_fraction),
+        )
+
+
 # --------------------- MEDIA RELAY (FRAME BROADCASTER) -------------------- #
 class MediaRelay:
     """
@@ -212,18 +428,109 @@ class MediaRelay:
         width=1280,
         height=720,
         frame_rate=10.0,
+        pipelined=None,
+        buffer_pool=None,
+        encoder_workers=None,
+        adaptive_quality=None,
+        low_latency=None,
+        name="Pod",
+        wb_calibration_file=None,
     ):
+        # Shown in log messages and /cameras
+        self.name = name
+        # Each camera keeps its own locked white balance
+        self.wb_calibration_file = wb_calibration_file or WB_CALIBRATION_FILE
         # This will store the most recent camera frame as JPEG bytes
         self.frame = None
+        # Versioned latest-frame slot: a PublishedFrame (seq, timestamp, jpeg,
+        # ready-to-send part, rendered pixels, metadata), replaced for every
+        # frame. Clients ask for "anything newer than the seq I sent last".
+        self.latest_frame = None
+        # Sequence numbers restart at 1 with every run; this makes snapshot
+        # ETags unique across restarts
+        self.instance_id = f"{int(time.time()):x}"
+        self.renditions = RenditionCache()
+        # Recent full-size JPEGs for time-shift replay (None = disabled)
+        self.history = FrameHistory(FRAME_HISTORY_BYTES) if FRAME_HISTORY_BYTES else None
+        # Built once instead of a new list for every encoded frame
+        self._encode_params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
 
         # Condition is like a traffic light for threads: it lets them wait for new frames
         self.condition = Condition()
+        # Callbacks run after every published frame (the asyncio server uses
+        # one to hand frames to its event loop instead of a thread per client)
+        self._frame_listeners = []
 
         # Control variables for the camera and background thread
         self.running = False
         self.cap = None
         self.capture_thread = None
 
+        # Pipelined mode: separate processing and encoding threads fed by
+        # small drop-oldest queues (None = use ENABLE_PIPELINED_CAPTURE)
+        self.pipelined = ENABLE_PIPELINED_CAPTURE if pipelined is None else bool(pipelined)
+        self.process_thread = None
+        self.encode_thread = None
+        self._process_queue = DropOldestQueue(PIPELINE_QUEUE_SIZE, name="process")
+        self._encode_queue = DropOldestQueue(PIPELINE_QUEUE_SIZE, name="encode")
+        # Parallel JPEG encoding (None = use JPEG_ENCODER_WORKERS); the pool
+        # itself is started with the capture threads
+        self.encoder_workers = max(1, int(JPEG_ENCODER_WORKERS if encoder_workers is None else encoder_workers))
+        self._encoder_pool = None
+        # Low-latency mode (None = use ENABLE_LOW_LATENCY): one-frame driver queue
+        self.low_latency = ENABLE_LOW_LATENCY if low_latency is None else bool(low_latency)
+        self.drain_grabs = CAPTURE_DRAIN_MAX_GRABS
+        self._camera_queue = None  # (camera FPS, driver buffers), read on the first grab
+        self._queued = 0.0  # Estimated frames waiting in the driver
+        self._last_grab = None  # Monotonic time of the last grab()
+        self._frame_time = None  # Wall-clock time the last frame was taken from the driver
+
+        # Buffer pool mode: camera reads and rotation write into rings of
+        # preallocated frames (None = use ENABLE_BUFFER_POOL). A ring must
+        # outlive every frame still queued, being processed or published.
+        self.buffer_pool = ENABLE_BUFFER_POOL if buffer_pool is None else bool(buffer_pool)
+        ring_size = 3 + (2 * PIPELINE_QUEUE_SIZE + 2 if self.pipelined else 0)
+        if self.encoder_workers > 1:
+            ring_size += self.encoder_workers  # Frames being encoded by the pool
+        self._read_pool = FramePool(ring_size, name="read")
+        self._rotate_pool = FramePool(ring_size, name="rotate")
+        self._raw_shape = None  # Shape of the last raw frame (sizes the read ring)
+
+        # Consumers (stream viewers, snapshot requests, recorders) currently
+        # attached. With nobody watching we still analyze frames (day/night, WB)
+        # but skip the expensive color/overlay/encode work.
+        self._consumers = {}  # kind -> count
+        self._consumer_lock = Lock()
+        # Connected viewers with per-client delivery counters
+        self._clients = set()
+        self._departed_sent = 0  # Totals of viewers that already left
+        self._departed_skipped = 0
+        self._evicted = {}  # reason ("send_timeout", "lag") -> viewers dropped
+        # Capture schedule (monotonic deadlines, jitter stats). The first
+        # consumer to attach wakes it so a frame is produced right away.
+        self.pacer = FramePacer(frame_rate)
+        # Per-stage latency histograms and frame rates for /metrics
+        self.metrics = PipelineMetrics()
+        self._reconnects = {"ok": 0, "failed": 0}
+        # Adaptive JPEG quality / output scale (None = use ENABLE_ADAPTIVE_QUALITY)
+        self.adaptive = None
+        if ENABLE_ADAPTIVE_QUALITY if adaptive_quality is None else adaptive_quality:
+            self.adaptive = AdaptiveQuality(
+                frame_rate,
+                JPEG_QUALITY,
+                min_quality=ADAPTIVE_QUALITY_MIN,
+                quality_step=ADAPTIVE_QUALITY_STEP,
+                scales=ADAPTIVE_SCALES,
+                target_kbps=ADAPTIVE_TARGET_KBPS,
+                encode_budget=ADAPTIVE_ENCODE_BUDGET,
+                max_lag=ADAPTIVE_MAX_LAG_SECONDS,
+                window=ADAPTIVE_WINDOW_SECONDS,
+                up_windows=ADAPTIVE_UP_WINDOWS,
+                client_stats=self.client_stats,
+            )
+        if self.history is not None and FRAME_HISTORY_ALWAYS_RECORD:
+            self.add_consumer("history")  # Permanent consumer: never pause encoding
+
         # Store camera-specific settings
         self.enable_overlay = enable_overlay and ENABLE_LABEL_OVERLAY
         self.rotation_angle = rotation_angle
@@ -240,10 +547,12 @@ class MediaRelay:
 
         # Day/Night state
         self.enable_day_night = ENABLE_DAY_NIGHT
+        self.day_night_badge = DAY_NIGHT_BADGE
         self.current_mode = "day"  # default
         self._last_exposure_mode = None  # Track last exposure mode
         self._last_luma_check = 0.0
         self._mode_switch_count = 0  # Require multiple samples before switching
+        self._pending_exposure_mode = None  # Exposure change for the capture thread
         self._smoothed_luma = None  # Exponential moving average of brightness
 
         # Software white balance state
@@ -251,13 +560,28 @@ class MediaRelay:
         self._wb_last_update = 0.0
         # Order: (R, G, B)
         self._wb_gains = [1.0, 1.0, 1.0]
-        # Keep last uncorrected frame for calibration
-        self._last_uncorrected = None
+        # Uncorrected frame for calibration, copied only when a request
+        # is waiting for it (preallocated double buffer)
+        self._raw_buffer = RawFrameBuffer()
+        # Raw frames seen so far, and which one the cached analysis thumbnail
+        # was built from (so it is built at most once per frame)
+        self._raw_frame_no = 0
+        self._thumb = None
+        self._thumb_frame_no = -1
+        # Compiled color LUT (RGB correction + WB + gamma + night boost)
+        self.color_pipeline = ColorPipeline()
+        # Cached overlay patches (label, DAY/NIGHT badge)
+        self.overlays = OverlayCompositor()
 
         # Remember how the camera was opened for potential reconnects
         self.camera_index = 0
         self.use_libcamera = False
 
+        # MJPEG pass-through (USB only): True once the camera agreed to hand us
+        # its compressed JPEG buffers (CAP_PROP_CONVERT_RGB=0)
+        self.passthrough = False
+        self._last_compressed = None  # Latest raw JPEG buffer from the camera
+
     # ------------------------ START CAPTURE ------------------------------- #
     def start_capture(self, camera_index=0, use_libcamera=False):
         # Start capturing video from camera (USB or CSI)
@@ -297,6 +621,8 @@ class MediaRelay:
             logger.info(
                 f"[MediaRelay] ✓ USB camera {camera_index} opened successfully with V4L2"
             )
+            # Pixel format must be chosen before the resolution
+            self._configure_usb_format()
 
         # Enhanced camera configuration with multiple attempts
         self._configure_camera_settings(camera_index)
@@ -342,11 +668,41 @@ class MediaRelay:
             pass
 
         # Start the background thread to capture frames
+        self.start_threads()
+
+    def start_threads(self):
+        """Start the capture thread (and the pipeline stage threads) on the open self.cap."""
         self.running = True
-        self.capture_thread = Thread(target=self._capture_frames)
+        if self.low_latency:
+            self._configure_low_latency()
+        self._camera_queue = None
+        if self.encoder_workers > 1 and self._encoder_pool is None:
+            self._encoder_pool = OrderedEncoderPool(
+                self.encoder_workers, self._encode_wanted, self._publish_encoded,
+                name=f"{self.name}-encoder",
+            )
+            logger.info(f"[MediaRelay] JPEG encoder pool: {self.encoder_workers} workers")
+        if self.pipelined:
+            # Start the downstream stages first so the first frame has somewhere to go
+            # Named threads are easy to find in /debug/profile
+            self.encode_thread = Thread(target=self._encode_loop, name=f"{self.name}-encode", daemon=True)
+            self.encode_thread.start()
+            self.process_thread = Thread(target=self._process_loop, name=f"{self.name}-process", daemon=True)
+            self.process_thread.start()
+            logger.info("[MediaRelay] Pipelined capture enabled (capture -> process -> encode threads)")
+        self.capture_thread = Thread(target=self._capture_frames, name=f"{self.name}-capture")
         self.capture_thread.daemon = True
         self.capture_thread.start()
 
+    def _configure_low_latency(self):
+        """Ask the driver to keep only the newest frame (not every backend can)."""
+        try:
+            accepted = self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        except Exception:
+            accepted = False
+        buffer = "1-frame camera buffer" if accepted else "camera kept its buffer size"
+        logger.info(f"[MediaRelay] Low-latency mode: {buffer}")
+
     def _reopen_camera(self) -> bool:
         """Attempt to reopen the camera using stored settings.
         Returns True on success, False otherwise.
@@ -380,7 +736,12 @@ class MediaRelay:
                     logger.error(f"[MediaRelay] Reconnect failed: could not open USB camera {self.camera_index}")
                     return False
                 # Configure
+                self._configure_usb_format()
                 self._configure_camera_settings(self.camera_index)
+                if self.low_latency:
+                    self._configure_low_latency()
+                self._camera_queue = None  # Frame rate / buffers may have changed
+                self._last_grab = None
                 logger.info("[MediaRelay] ✓ USB camera reconnected")
 
             # Warm a couple frames
@@ -393,6 +754,28 @@ class MediaRelay:
             logger.error(f"[MediaRelay] Camera reconnect error: {e}")
             return False
 
+    def _configure_usb_format(self):
+        """Request the configured FOURCC and, optionally, raw MJPEG buffers."""
+        self.passthrough = False
+        try:
+            # Pass-through needs the camera's JPEGs; otherwise keep the driver's format
+            wanted = USB_CAMERA_FOURCC or ("MJPG" if ENABLE_MJPEG_PASSTHROUGH else "")
+            if wanted:
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*wanted))
+            fourcc_code = int(self.cap.get(cv2.CAP_PROP_FOURCC))
+            fourcc = "".join(chr((fourcc_code >> (8 * i)) & 0xFF) for i in range(4))
+            logger.info(f"[MediaRelay] USB pixel format: {fourcc!r}")
+            if ENABLE_MJPEG_PASSTHROUGH:
+                if fourcc != "MJPG":
+                    logger.warning("[MediaRelay] MJPEG pass-through needs an MJPG camera format; disabled")
+                elif self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+                    self.passthrough = True
+                    logger.info("[MediaRelay] MJPEG pass-through enabled (camera JPEGs sent without re-encoding)")
+                else:
+                    logger.warning("[MediaRelay] Camera refused CAP_PROP_CONVERT_RGB=0; pass-through disabled")
+        except Exception as e:
+            logger.warning(f"[MediaRelay] Could not set USB pixel format: {e}")
+
     def _configure_camera_settings(self, camera_index):
         """Enhanced camera configuration with multiple attempts to force settings."""
         logger.info(
@@ -483,31 +866,23 @@ class MediaRelay:
     # -------------------- SOFTWARE WHITE BALANCE ------------------------ #
     def _compute_grayworld_gains(self, frame):
         """Estimate per-channel gains using grayworld assumption on a downscaled, masked frame.
-        Returns gains in (R, G, B) order.
+        Accepts a BGR frame or an AnalysisThumbnail. Returns gains in (R, G, B) order.
         """
         try:
-            if frame is None or frame.size == 0:
+            if frame is None:
                 return (1.0, 1.0, 1.0)
-
-            # Downscale to speed up
-            h, w = frame.shape[:2]
-            scale = 320.0 / max(w, 1)
-            if scale < 1.0:
-                small = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+            if isinstance(frame, AnalysisThumbnail):
+                thumb = frame
             else:
-                small = frame
+                if frame.size == 0:
+                    return (1.0, 1.0, 1.0)
+                thumb = AnalysisThumbnail(frame)
 
-            # Mask out very dark/bright pixels
-            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
-            mask = (gray >= WB_EXCLUDE_DARK) & (gray <= WB_EXCLUDE_BRIGHT)
-            if not np.any(mask):
+            # Masked means of each channel (very dark/bright pixels ignored)
+            means = thumb.masked_channel_means()
+            if means is None:
                 return (1.0, 1.0, 1.0)
-
-            b, g, r = cv2.split(small)
-            # Use masked means
-            r_mean = float(r[mask].mean()) if np.any(mask) else 1.0
-            g_mean = float(g[mask].mean()) if np.any(mask) else 1.0
-            b_mean = float(b[mask].mean()) if np.any(mask) else 1.0
+            r_mean, g_mean, b_mean = means
 
             # Target is the average of the three channels
             target = (r_mean + g_mean + b_mean) / 3.0
@@ -532,15 +907,17 @@ class MediaRelay:
             logger.debug(f"[MediaRelay] Grayworld gains computation failed: {e}")
             return (1.0, 1.0, 1.0)
 
-    def _update_auto_wb(self, frame, now_ts):
-        """Update internal WB gains periodically with EMA smoothing."""
+    def _update_auto_wb(self, thumb, now_ts):
+        """Update internal WB gains periodically with EMA smoothing.
+        `thumb` is the shared AnalysisThumbnail (a plain frame also works).
+        """
         if self.wb_mode != "auto_grayworld":
             return
         if (now_ts - self._wb_last_update) < WB_UPDATE_EVERY_SEC:
             return
         self._wb_last_update = now_ts
 
-        r_gain, g_gain, b_gain = self._compute_grayworld_gains(frame)
+        r_gain, g_gain, b_gain = self._compute_grayworld_gains(thumb)
         # EMA smoothing
         self._wb_gains[0] = (1 - WB_ALPHA) * self._wb_gains[0] + WB_ALPHA * r_gain
         self._wb_gains[1] = (1 - WB_ALPHA) * self._wb_gains[1] + WB_ALPHA * g_gain
@@ -549,7 +926,8 @@ class MediaRelay:
             f"[MediaRelay] WB gains updated (R,G,B) -> ({self._wb_gains[0]:.3f}, {self._wb_gains[1]:.3f}, {self._wb_gains[2]:.3f})"
         )
 
-    def _extract_roi(self, frame, roi_mode: str = "", size_fraction: float = 0.45):
+    @staticmethod
+    def _extract_roi(frame, roi_mode: str = "", size_fraction: float = 0.45):
         """Return ROI of frame based on mode; supports 'center' square ROI.
         Falls back to full frame on errors.
         """
@@ -581,9 +959,7 @@ class MediaRelay:
                 },
                 "timestamp": time.time(),
             }
-            # Save next to this script
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            path = os.path.join(base_dir, WB_CALIBRATION_FILE)
+            path = self.wb_calibration_path()
             import json
             with open(path, "w", encoding="utf-8") as f:
                 json.dump(data, f, indent=2)
@@ -591,10 +967,14 @@ class MediaRelay:
         except Exception as e:
             logger.warning(f"[MediaRelay] Failed to save WB calibration: {e}")
 
+    def wb_calibration_path(self):
+        """Where this camera's WB calibration is stored (next to this script)."""
+        base_dir = os.path.dirname(os.path.abspath(__file__))
+        return os.path.join(base_dir, self.wb_calibration_file)
+
     def _load_wb_calibration(self):
         try:
-            base_dir = os.path.dirname(os.path.abspath(__file__))
-            path = os.path.join(base_dir, WB_CALIBRATION_FILE)
+            path = self.wb_calibration_path()
             if not os.path.exists(path):
                 return False
             import json
@@ -618,15 +998,40 @@ class MediaRelay:
             logger.warning(f"[MediaRelay] Failed to load WB calibration: {e}")
             return False
 
+    def _latest_thumbnail(self, frame):
+        """Analysis thumbnail of the newest raw frame, built at most once per frame."""
+        if self._thumb is not None and self._thumb_frame_no == self._raw_frame_no:
+            return self._thumb
+        self._thumb = AnalysisThumbnail(frame)
+        self._thumb_frame_no = self._raw_frame_no
+        return self._thumb
+
+    def _fresh_thumbnail(self):
+        """Analysis thumbnail of a recent UNCORRECTED frame, for WB calibration/preview.
+        Returns None if no frame is available.
+        """
+        if self.passthrough and self._last_compressed is not None:
+            # MJPEG pass-through: decode the newest camera JPEG at 1/4 scale
+            small = cv2.imdecode(self._last_compressed, cv2.IMREAD_REDUCED_COLOR_4)
+            return AnalysisThumbnail(small) if small is not None else None
+        if self.running:
+            # Ask the capture pipeline to keep its next raw frame and wait for it
+            timeout = max(1.0, 3.0 / max(self.frame_rate, 0.1))
+            thumb = self._raw_buffer.wait_for(AnalysisThumbnail, timeout)
+            if thumb is not None:
+                return thumb
+        # Fall back to the last kept frame or the last analysis thumbnail
+        return self._raw_buffer.read(AnalysisThumbnail) or self._thumb
+
     def calibrate_from_last_frame(self, roi_mode: str = "", size_fraction: float = 0.45):
         """Compute grayworld gains from the last uncorrected frame and lock WB.
         Optional ROI selection via roi_mode and size_fraction.
         """
-        src = self._last_uncorrected
-        if src is None:
+        thumb = self._fresh_thumbnail()
+        if thumb is None:
             raise RuntimeError("No recent frame available for calibration")
-        src_roi = self._extract_roi(src, roi_mode=roi_mode, size_fraction=size_fraction)
-        r_gain, g_gain, b_gain = self._compute_grayworld_gains(src_roi)
+        thumb_roi = thumb.roi(roi_mode=roi_mode, size_fraction=size_fraction)
+        r_gain, g_gain, b_gain = self._compute_grayworld_gains(thumb_roi)
         self._wb_gains = [r_gain, g_gain, b_gain]
         self.wb_mode = "locked"
         self._save_wb_calibration()
@@ -634,300 +1039,150 @@ class MediaRelay:
 
     def preview_calibration(self, roi_mode: str = "", size_fraction: float = 0.45):
         """Compute proposed grayworld gains from the last uncorrected frame without applying."""
-        src = self._last_uncorrected
-        if src is None:
+        thumb = self._fresh_thumbnail()
+        if thumb is None:
             raise RuntimeError("No recent frame available for preview")
-        src_roi = self._extract_roi(src, roi_mode=roi_mode, size_fraction=size_fraction)
-        return self._compute_grayworld_gains(src_roi)
+        thumb_roi = thumb.roi(roi_mode=roi_mode, size_fraction=size_fraction)
+        return self._compute_grayworld_gains(thumb_roi)
+
+    # --------------------------- CONSUMERS -------------------------------- #
+    def add_consumer(self, kind="stream"):
+        """Register someone who needs encoded frames (stream, snapshot, recorder...)."""
+        with self._consumer_lock:
+            was_idle = not any(self._consumers.values())
+            self._consumers[kind] = self._consumers.get(kind, 0) + 1
+        if was_idle:
+            # First viewer: produce a frame immediately instead of waiting a frame period
+            self.pacer.wake()
+            logger.info(f"[MediaRelay] First consumer attached ({kind}); encoding resumed")
+
+    def remove_consumer(self, kind="stream"):
+        """Unregister a consumer added with add_consumer()."""
+        with self._consumer_lock:
+            count = self._consumers.get(kind, 0) - 1
+            if count > 0:
+                self._consumers[kind] = count
+            else:
+                self._consumers.pop(kind, None)
+            now_idle = not any(self._consumers.values())
+        if now_idle:
+            logger.info("[MediaRelay] No consumers left; encoding paused (analysis continues)")
+
+    @contextmanager
+    def consumer(self, kind="stream"):
+        """Context manager form: `with relay.consumer("stream"): ...`"""
+        self.add_consumer(kind)
+        try:
+            yield self
+        finally:
+            self.remove_consumer(kind)
+
+    def has_consumers(self):
+        """True if at least one stream/snapshot/recorder subscriber is attached."""
+        with self._consumer_lock:
+            return any(self._consumers.values())
+
+    def needs_full_encode(self):
+        """True if any consumer wants the full-size JPEG.
+        Rendition-only viewers just need the rendered pixels.
+        """
+        with self._consumer_lock:
+            return any(n for kind, n in self._consumers.items() if kind != "rendition")
+
+    def consumer_counts(self):
+        """Copy of the per-kind consumer counts."""
+        with self._consumer_lock:
+            return dict(self._consumers)
+
+    def register_client(self, kind, address):
+        """Add a viewer as a consumer and return its ClientStats."""
+        client = ClientStats(kind, address)
+        with self._consumer_lock:
+            self._clients.add(client)
+        self.add_consumer(kind)
+        return client
+
+    def unregister_client(self, client, evicted=None):
+        """Remove a viewer added with register_client().
+        `evicted` is the reason if we dropped it for being too slow.
+        """
+        with self._consumer_lock:
+            self._clients.discard(client)
+            self._departed_sent += client.sent
+            self._departed_skipped += client.skipped
+            if evicted:
+                self._evicted[evicted] = self._evicted.get(evicted, 0) + 1
+        self.remove_consumer(client.kind)
+
+    @staticmethod
+    def eviction_reason(client):
+        """Return "lag" if a viewer's last frame arrived too late to be useful, else None."""
+        if STREAM_MAX_LAG_SECONDS and client.lag > STREAM_MAX_LAG_SECONDS:
+            return "lag"
+        return None
+
+    def client_stats(self):
+        """Per-viewer sent/skipped counters plus totals (JSON friendly)."""
+        with self._consumer_lock:
+            clients = list(self._clients)
+            sent = self._departed_sent
+            skipped = self._departed_skipped
+            evicted = dict(self._evicted)
+        viewers = [c.as_dict() for c in clients]
+        lagging = sum(1 for v in viewers if v["lagging"])
+        return {
+            "connected": len(viewers),
+            "healthy": len(viewers) - lagging,
+            "lagging": lagging,
+            "evicted": sum(evicted.values()),
+            "evicted_by_reason": evicted,
+            "frames_sent": sent + sum(v["sent"] for v in viewers),
+            "frames_skipped": skipped + sum(v["skipped"] for v in viewers),
+            "viewers": viewers,
+        }
 
     # ------------------------ CAPTURE FRAMES ------------------------------- #
+    # The work done for every frame is split into small "stage" methods:
+    #   read -> process (WB, day/night, color, overlay, rotation) -> encode -> publish
+    # In sequential mode one thread runs them back to back. In pipelined mode
+    # each group of stages gets its own thread, connected by small queues, so
+    # reading frame N+1 overlaps with processing frame N and encoding frame N-1.
+
     def _capture_frames(self):
         """This method runs in a background thread and keeps grabbing frames from the camera
         It stores the latest frame and notifies all waiting clients"""
-        frame_time = (
-            1.0 / self.frame_rate
-        )  # Calculate time between frames for rate limiting
-        last_frame_time = 0
-
         fail_count = 0
-        last_heartbeat = time.time()
+        last_heartbeat = time.monotonic()
+        self.pacer.reset()
 
         while self.running:
             if self.cap is not None:
-                current_time = time.time()
+                # Rate limiting: sleep until the next frame is due (woken early
+                # when a first consumer is waiting for a frame)
+                self.pacer.wait()
+                if not self.running:
+                    break
 
-                # Rate limiting: only process frames at the specified max FPS
-                if current_time - last_frame_time < frame_time:
-                    time.sleep(0.001)  # Small sleep to prevent busy waiting
-                    continue
+                # Exposure changes requested by the day/night stage are applied
+                # here so only this thread ever talks to the camera
+                self._apply_pending_exposure()
 
                 # Try to read one frame from the camera
-                ret, frame = self.cap.read()
+                ret, frame = self._read_frame()
+                # When the frame left the driver (before decoding); viewers
+                # get it as X-Capture-Timestamp
+                current_time = self._frame_time or time.time()
                 if ret:
-                    # IR LED control removed; no per-frame forcing
-                    
-                    # Save an uncorrected copy for WB calibration before any processing
-                    try:
-                        self._last_uncorrected = frame.copy()
-                    except Exception:
-                        self._last_uncorrected = None
-                    # Apply RGB LED color correction (OPTIMAL LOCATION: early in pipeline)
-                    if ENABLE_RGB_LED_CORRECTION and frame is not None:
-                        try:
-                            # Update auto WB gains periodically (if enabled)
-                            self._update_auto_wb(frame, current_time)
-                            wb_r, wb_g, wb_b = self._wb_gains
-                            # Combine base multipliers with auto gains
-                            frame = apply_rgb_led_correction(
-                                frame,
-                                red_mult=RGB_CORRECTION_RED * wb_r,
-                                green_mult=RGB_CORRECTION_GREEN * wb_g,
-                                blue_mult=RGB_CORRECTION_BLUE * wb_b,
-                                gamma=RGB_LED_GAMMA
-                            )
-                        except Exception as e:
-                            logger.debug(f"[MediaRelay] RGB LED correction failed: {e}")
-                    
-                    # Optional: day/night switching using luminance from frame
-                    # (now uses corrected frame for accurate luminance)
-                    if self.enable_day_night and frame is not None:
-                        now = current_time
-                        if now - self._last_luma_check >= LUMA_SAMPLE_EVERY_SEC:
-                            self._last_luma_check = now
-                            # Compute normalized luma from the UNCORRECTED frame to avoid bias
-                            src_for_luma = self._last_uncorrected if self._last_uncorrected is not None else frame
-                            gray = cv2.cvtColor(src_for_luma, cv2.COLOR_BGR2GRAY)
-                            raw_luma = float(gray.mean()) / 255.0
-                            
-                            # Apply exponential moving average to smooth out auto-exposure variations
-                            # Alpha = 0.3 means 30% new value, 70% old value (heavy smoothing)
-                            if self._smoothed_luma is None:
-                                self._smoothed_luma = raw_luma
-                            else:
-                                self._smoothed_luma = 0.3 * raw_luma + 0.7 * self._smoothed_luma
-                            
-                            mean_luma = self._smoothed_luma
-                            
-                            # Determine if we should switch modes (with damping)
-                            should_switch_to_night = self.current_mode == "day" and mean_luma < NIGHT_LUMA_THRESHOLD
-                            should_switch_to_day = self.current_mode == "night" and mean_luma > DAY_LUMA_THRESHOLD
-                            
-                            if should_switch_to_night or should_switch_to_day:
-                                self._mode_switch_count += 1
-                                # Require 2 consecutive samples in target range before switching
-                                if self._mode_switch_count >= 2:
-                                    new_mode = "night" if should_switch_to_night else "day"
-                                    self.current_mode = new_mode
-                                    self._mode_switch_count = 0
-                                    try:
-                                        # Set camera exposure automatically for day/night
-                                        if not CAMERA_AUTO_EXPOSURE and self.cap is not None:
-                                            if new_mode == "night":
-                                                self.cap.set(cv2.CAP_PROP_EXPOSURE, CAMERA_NIGHT_EXPOSURE_VALUE)
-                                                logger.info(f"[MediaRelay] Exposure set to NIGHT value: {CAMERA_NIGHT_EXPOSURE_VALUE}")
-                                            else:
-                                                self.cap.set(cv2.CAP_PROP_EXPOSURE, CAMERA_DAY_EXPOSURE_VALUE)
-                                                logger.info(f"[MediaRelay] Exposure set to DAY value: {CAMERA_DAY_EXPOSURE_VALUE}")
-                                        if hasattr(self.cap, "set_day_mode") and hasattr(self.cap, "set_night_mode"):
-                                            if new_mode == "night":
-                                                self.cap.set_night_mode()
-                                            else:
-                                                self.cap.set_day_mode()
-                                        logger.info(f"[MediaRelay] Day/Night switched to {new_mode} (smoothed luma={mean_luma:.3f}, raw={raw_luma:.3f})")
-                                    except Exception as e:
-                                        logger.warning(f"[MediaRelay] Exposure switch error: {e}")
-                            else:
-                                # Reset counter if brightness is stable in current mode
-                                self._mode_switch_count = 0
-                    # Night-only brightness boost (software), after day/night decision
-                    if self.enable_day_night and frame is not None and self.current_mode == "night":
-                        if NIGHT_BRIGHTNESS_ENABLE:
-                            try:
-                                frame = apply_brightness_contrast_gamma(
-                                    frame,
-                                    alpha=NIGHT_BRIGHTNESS_ALPHA,
-                                    beta=NIGHT_BRIGHTNESS_BETA,
-                                    gamma=NIGHT_EXTRA_GAMMA,
-                                )
-                            except Exception:
-                                pass
-                    # Add WNCC STEM Club label timing logic (only if enabled for this camera)
-                    if self.enable_overlay:
-                        current_cycle_time = (
-                            current_time - self.label_start_time
-                        )
-
-                        # Show label for configured duration every configured interval
-                        cycle_duration = (
-                            LABEL_CYCLE_MINUTES * 60
-                        )  # Convert minutes to seconds
-                        if current_cycle_time >= cycle_duration:  # Reset cycle
-                            self.label_start_time = current_time
-                            current_cycle_time = 0
-                            self.label_shown = False
-
-                        # Show label for first X seconds of each cycle
-                        show_label = current_cycle_time < LABEL_DURATION_SECONDS
-
-                        # Add overlay text if it's time to show it
-                        if show_label:
-                            # Add semi-transparent background for better text visibility
-                            overlay = frame.copy()
-
-                            # Calculate text size and position
-                            font = cv2.FONT_HERSHEY_SIMPLEX
-                            thickness = 2
-
-                            # Get text size to position it properly
-                            (text_width, text_height), baseline = (
-                                cv2.getTextSize(
-                                    LABEL_TEXT,
-                                    font,
-                                    LABEL_FONT_SCALE,
-                                    thickness,
-                                )
-                            )
-
-                            # Position in bottom-left corner with some padding
-                            x = 20  # 20 pixels from left edge
-                            # 20 pixels from bottom edge
-                            y = frame.shape[0] - 20
-
-                            # Draw semi-transparent background rectangle
-                            cv2.rectangle(
-                                overlay,
-                                (x - 10, y - text_height - 10),
-                                (x + text_width + 10, y + 10),
-                                (0, 0, 0),
-                                -1,
-                            )  # Black background
-
-                            # Blend the overlay with the original frame for transparency
-                            cv2.addWeighted(
-                                overlay,
-                                LABEL_TRANSPARENCY,
-                                frame,
-                                1 - LABEL_TRANSPARENCY,
-                                0,
-                                frame,
-                            )
-
-                            # Add label text using the configured text color and transparency
-                            if TEXT_TRANSPARENCY < 1.0:
-                                text_overlay = frame.copy()
-                                cv2.putText(
-                                    text_overlay,
-                                    LABEL_TEXT,
-                                    (x, y),
-                                    font,
-                                    LABEL_FONT_SCALE,
-                                    TEXT_COLOR,
-                                    thickness,
-                                )
-                                cv2.addWeighted(
-                                    text_overlay,
-                                    TEXT_TRANSPARENCY,
-                                    frame,
-                                    1 - TEXT_TRANSPARENCY,
-                                    0,
-                                    frame,
-                                )
-                            else:
-                                cv2.putText(
-                                    frame,
-                                    LABEL_TEXT,
-                                    (x, y),
-                                    font,
-                                    LABEL_FONT_SCALE,
-                                    TEXT_COLOR,
-                                    thickness,
-                                )
-
-                            # Log when label appears (only once per state change)
-                            if not self.label_shown:
-                                logger.info(
-                                    f"[MediaRelay] Label '{LABEL_TEXT}' displayed for {LABEL_DURATION_SECONDS}s"
-                                )
-                                self.label_shown = True
-                        else:
-                            # Log when label disappears (only once per state change)
-                            if self.label_shown:
-                                logger.info(
-                                    f"[MediaRelay] Label '{LABEL_TEXT}' hidden - next display in {LABEL_CYCLE_MINUTES} minutes"
-                                )
-                                self.label_shown = False
-
-                    # Apply rotation if specified for this camera
-                    # Debug logging to help diagnose unexpected rotation behavior
-                    logger.debug(
-                        f"[MediaRelay] rotation_angle={self.rotation_angle}"
-                    )
-                    if self.rotation_angle == 90:
-                        # Rotate 90 degrees counterclockwise
-                        logger.debug(
-                            "[MediaRelay] Applying rotation: 90° CCW (ROTATE_90_COUNTERCLOCKWISE)"
-                        )
-                        frame = cv2.rotate(
-                            frame, cv2.ROTATE_90_COUNTERCLOCKWISE
-                        )
-                    elif self.rotation_angle == 180:
-                        # Rotate 180 degrees
-                        logger.debug(
-                            "[MediaRelay] Applying rotation: 180° (ROTATE_180)"
-                        )
-                        frame = cv2.rotate(frame, cv2.ROTATE_180)
-                    elif self.rotation_angle == 270:
-                        # Rotate 270 degrees counterclockwise (or 90 degrees clockwise)
-                        logger.debug(
-                            "[MediaRelay] Applying rotation: 270° CCW / 90° CW (ROTATE_90_CLOCKWISE)"
-                        )
-                        frame = cv2.rotate(frame, cv2.ROTATE_90_CLOCKWISE)
-
-                    # Convert the frame to JPEG format with controlled quality for web streaming
-                    # ---------------- Day/Night corner label -----------------
-                    if self.enable_day_night and frame is not None:
-                        mode_text = "DAY" if self.current_mode == "day" else "NIGHT"
-                        font = cv2.FONT_HERSHEY_SIMPLEX
-                        dn_scale = 0.6
-                        dn_thickness = 2
-                        try:
-                            (mtw, mth), _ = cv2.getTextSize(mode_text, font, dn_scale, dn_thickness)
-                            pad = 6
-                            # Guard against unexpected empty dimensions
-                            if mtw > 0 and mth > 0:
-                                x2 = max(0, frame.shape[1] - mtw - pad - 8)
-                                y2 = pad + mth + 2
-                                bg_color = (0, 120, 0) if self.current_mode == "day" else (0, 0, 160)
-                                txt_color = (255, 255, 255)
-                                cv2.rectangle(
-                                    frame,
-                                    (x2 - pad, y2 - mth - pad),
-                                    (x2 + mtw + pad, y2 + pad // 2),
-                                    bg_color,
-                                    -1,
-                                )
-                                cv2.putText(
-                                    frame,
-                                    mode_text,
-                                    (x2, y2),
-                                    font,
-                                    dn_scale,
-                                    txt_color,
-                                    dn_thickness,
-                                    cv2.LINE_AA,
-                                )
-                        except Exception as e:
-                            logger.debug(f"[MediaRelay] Day/Night label draw failed: {e}")
-                    encode_params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
-                    _, buffer = cv2.imencode(".jpg", frame, encode_params)
-                    frame_bytes = buffer.tobytes()
-
-                    # Notify all clients that a new frame is ready
-                    with self.condition:
-                        self.frame = frame_bytes
-                        self.condition.notify_all()
-
-                    last_frame_time = current_time
+                    self.metrics.capture_rate.mark()
+                    self.pacer.frame_taken()
+                    if self.pipelined:
+                        # Hand off to the processing thread (drops the oldest
+                        # waiting frame if processing has fallen behind)
+                        self._process_queue.put((frame, current_time))
+                    else:
+                        result = self._process_frame(frame, current_time)
+                        if result is not None:
+                            self._encode_and_publish(*result)
                 else:
                     # Frame capture failed; track and optionally reconnect
                     fail_count += 1
@@ -937,10 +1192,11 @@ class MediaRelay:
                     if fail_count >= int(self.frame_rate) * 3:
                         logger.error("[MediaRelay] Persistent frame read failures. Attempting camera reconnect...")
                         success = self._reopen_camera()
+                        self._reconnects["ok" if success else "failed"] += 1
                         if success:
                             logger.info("[MediaRelay] Reconnect succeeded. Resuming capture.")
                             fail_count = 0
-                            last_frame_time = time.time()
+                            self.pacer.reset()
                         else:
                             logger.error("[MediaRelay] Reconnect failed. Stopping capture loop.")
                             break
@@ -951,9 +1207,566 @@ class MediaRelay:
                 break
 
             # Heartbeat every 60s to confirm capture is active
-            if time.time() - last_heartbeat >= 60:
+            if time.monotonic() - last_heartbeat >= 60:
                 logger.info("[MediaRelay] Capture heartbeat: running OK")
-                last_heartbeat = time.time()
+                last_heartbeat = time.monotonic()
+
+    @timed_stage("read")
+    def _read_frame(self):
+        """Read the newest frame, into a recycled buffer when buffer pool mode is on."""
+        image = None
+        if self.buffer_pool and self._raw_shape is not None and not self.passthrough:
+            image = self._read_pool.next(self._raw_shape)
+        if self.drain_grabs > 0 and hasattr(self.cap, "grab"):
+            # USB camera: skip stale queued frames, then decode only the one we keep
+            if not self._grab_newest():
+                return False, None
+            self._frame_time = self._capture_time()
+            ret, frame = self.cap.retrieve(image) if image is not None else self.cap.retrieve()
+        elif image is not None:
+            ret, frame = self.cap.read(image=image)
+            self._frame_time = self._capture_time()
+        else:
+            ret, frame = self.cap.read()
+            self._frame_time = self._capture_time()
+        if ret and frame is not None:
+            self._raw_shape = frame.shape
+        return ret, frame
+
+    def _frame_age(self):
+        """Seconds since the camera captured the frame just grabbed, or None.
+
+        V4L2 stamps every buffer on the monotonic clock when the sensor
+        delivers it (CAP_PROP_POS_MSEC), so this includes the time the frame
+        waited in the driver queue. Other backends report something else
+        there (or 0), so anything that isn't a plausible age means unknown.
+        """
+        try:
+            age = time.monotonic() - self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        except Exception:
+            return None
+        return age if 0.0 <= age < 2.0 else None
+
+    def _capture_time(self):
+        """Wall-clock time the camera captured the frame just read."""
+        return time.time() - (self._frame_age() or 0.0)
+
+    def _grab_newest(self):
+        """Grab (without decoding) the newest frame, skipping stale queued ones.
+
+        Frames only pile up in the driver when the camera runs faster than
+        we read. We keep a running estimate of the driver's queue: it grows
+        by the camera's frame rate x the time since the last grab (up to the
+        driver's `buffers`), shrinks by one per grab, and is known to be
+        empty whenever a grab() had to wait for the camera. All but the
+        newest queued frame are stale and discarded. When the camera runs at
+        our own rate the queue never holds more than the one frame we want,
+        so nothing is discarded. If the queue overflowed (the camera is at
+        least twice as fast) even the newest queued frame is old, and one
+        more grab waits at most one camera frame for a fresh one.
+        Returns False if the camera stopped delivering frames.
+        """
+        if self._camera_queue is None:
+            camera_fps = self.cap.get(cv2.CAP_PROP_FPS) or 0.0
+            buffers = int(self.cap.get(cv2.CAP_PROP_BUFFERSIZE) or 0) or self.drain_grabs + 1
+            self._camera_queue = (camera_fps, buffers)
+            self._queued = 0.0
+        camera_fps, buffers = self._camera_queue
+        discards = 0
+        if camera_fps > 0 and self._last_grab is not None:
+            queued = self._queued + (time.monotonic() - self._last_grab) * camera_fps
+            # Frames were dropped and the camera is clearly faster than we
+            # read: the next fresh frame is only a short wait away
+            faster = camera_fps * self.pacer.interval >= 2.0
+            wait_fresh = 1 if faster and queued > buffers else 0
+            self._queued = min(queued, float(buffers))
+            discards = min(self.drain_grabs, max(0, int(self._queued) - 1) + wait_fresh)
+        fresh_after = min(0.004, 0.25 / camera_fps) if camera_fps > 0 else 0.004
+        for grabbed in range(discards + 1):
+            started = time.monotonic()
+            if not self.cap.grab():
+                return False
+            if time.monotonic() - started >= fresh_after:
+                self._queued = 0.0  # Had to wait: this frame is brand new
+                break
+            self._queued = max(0.0, self._queued - 1.0)
+        if self.low_latency and camera_fps > 0:
+            # Latency before smoothness: a frame more than one camera frame
+            # old means a newer one was made meanwhile (and dropped by the
+            # 1-frame queue), so wait for the next one instead
+            for _ in range(self.drain_grabs):
+                age = self._frame_age()
+                if age is None or age < 1.0 / camera_fps:
+                    break
+                if not self.cap.grab():
+                    return False
+                grabbed += 1
+                self._queued = 0.0
+        self._last_grab = time.monotonic()
+        self.pacer.drained_count += grabbed
+        return True
+
+    def _process_loop(self):
+        """Pipelined mode: processing thread (color, overlay, rotation)."""
+        while self.running:
+            item = self._process_queue.get(timeout=0.5)
+            if item is None:
+                continue
+            frame, current_time = item
+            try:
+                result = self._process_frame(frame, current_time)
+            except Exception as e:
+                logger.debug(f"[MediaRelay] Processing stage failed: {e}")
+                continue
+            if result is not None:
+                self._encode_queue.put(result)
+
+    def _encode_loop(self):
+        """Pipelined mode: encoding thread (JPEG encode + publish to clients)."""
+        while self.running:
+            result = self._encode_queue.get(timeout=0.5)
+            if result is None:
+                continue
+            try:
+                self._encode_and_publish(*result)
+            except Exception as e:
+                logger.debug(f"[MediaRelay] Encoding stage failed: {e}")
+
+    def pipeline_stats(self):
+        """Return per-stage queue depth and drop counts (for /pipeline/status)."""
+        stats = {
+            "mode": "pipelined" if self.pipelined else "sequential",
+            "encoding": self.has_consumers(),
+            "consumers": self.consumer_counts(),
+            "clients": self.client_stats(),
+            "renditions": self.renditions.stats(),
+            "raw_buffer": self._raw_buffer.stats(),
+            "pacing": self.pacer.stats(),
+        }
+        if self.history is not None:
+            stats["history"] = self.history.stats()
+        if self.buffer_pool:
+            stats["buffer_pool"] = {
+                "read": self._read_pool.stats(),
+                "rotate": self._rotate_pool.stats(),
+            }
+        if self.pipelined:
+            stats["queues"] = {
+                "process": self._process_queue.stats(),
+                "encode": self._encode_queue.stats(),
+            }
+        if self._encoder_pool is not None:
+            stats["encoder_pool"] = self._encoder_pool.stats()
+        if self.adaptive is not None:
+            stats["adaptive"] = self.adaptive.stats()
+        return stats
+
+    def metrics_snapshot(self):
+        """Everything /metrics reports for this camera, as plain (picklable) dicts."""
+        snapshot = self.metrics.snapshot()
+        snapshot.update({
+            "frames_captured": self.pacer.frame_count,
+            "frames_published": self.frame_seq,
+            "frames_late": self.pacer.late_count,
+            "reconnects": dict(self._reconnects),
+            "mode": self.current_mode,
+            "scene_luma": self._smoothed_luma,
+            "encoding": self.has_consumers(),
+            "clients": self.client_stats(),
+        })
+        if self.adaptive is not None:
+            snapshot["jpeg_quality"], snapshot["output_scale"] = self.adaptive.settings()
+        if self.pipelined:
+            snapshot["queue_drops"] = {
+                "process": self._process_queue.drop_count,
+                "encode": self._encode_queue.drop_count,
+            }
+        return snapshot
+
+    # ------------------------ PROCESSING STAGES ---------------------------- #
+    def _process_frame(self, frame, current_time):
+        """Analyze a raw camera frame, then render it for viewers.
+        Returns (pixels, jpeg, capture time) for _encode_and_publish, or None
+        when nobody is consuming frames. `jpeg` is only set in MJPEG
+        pass-through mode.
+        """
+        self._raw_frame_no += 1
+        if self.passthrough and frame.ndim < 3:
+            return self._process_compressed(frame, current_time)
+        self._analyze_frame(frame, current_time)
+        if not self.has_consumers():
+            return None
+        return self._render_frame(frame, current_time), None, current_time
+
+    def _process_compressed(self, buffer, current_time):
+        """MJPEG pass-through: handle a compressed camera buffer.
+
+        Pixels are only decoded when something needs them: a reduced-scale
+        decode for the periodic analysis, and a full decode when a
+        pixel-modifying stage is active or rendition clients want pixels.
+        Otherwise the camera's JPEG goes straight to the clients.
+        """
+        self._last_compressed = buffer
+        if self._analysis_due(current_time):
+            small = cv2.imdecode(buffer, cv2.IMREAD_REDUCED_COLOR_4)
+            if small is not None:
+                self._analyze_frame(small, current_time)
+        if not self.has_consumers():
+            return None
+
+        modify_pixels = self._pixel_stages_active(current_time)
+        rendered = None
+        if modify_pixels or self.consumer_counts().get("rendition"):
+            frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+            if frame is None:
+                return None
+            rendered = self._render_frame(frame, current_time)
+        # Untouched pixels: reuse the camera's JPEG instead of re-encoding
+        jpeg = None if modify_pixels else buffer.tobytes()
+        return rendered, jpeg, current_time
+
+    def _due_analyses(self, now):
+        """(wb_due, luma_due): which analysis stages sample a frame at time `now`."""
+        wb_due = (
+            ENABLE_RGB_LED_CORRECTION
+            and self.wb_mode == "auto_grayworld"
+            and (now - self._wb_last_update) >= WB_UPDATE_EVERY_SEC
+        )
+        luma_due = self.enable_day_night and (now - self._last_luma_check) >= LUMA_SAMPLE_EVERY_SEC
+        return bool(wb_due), bool(luma_due)
+
+    def _analysis_due(self, now):
+        """True if the WB or day/night stage will sample a frame at time `now`."""
+        return any(self._due_analyses(now))
+
+    def _pixel_stages_active(self, now):
+        """True if any stage in _render_frame would change the camera's pixels."""
+        if self.color_pipeline.get_lut(self._wb_gains, self.current_mode) is not None:
+            return True
+        if self.rotation_angle in (90, 180, 270):
+            return True
+        if self.enable_day_night and self.day_night_badge:
+            return True  # DAY/NIGHT badge is drawn on every frame
+        return bool(self.enable_overlay and self._label_visible(now))
+
+    @timed_stage("analyze")
+    def _analyze_frame(self, frame, current_time):
+        """Stages that must keep running with no viewers (WB, day/night)."""
+        if frame is None:
+            return
+        # Keep an uncorrected copy ONLY if a calibration request is waiting for one
+        self._raw_buffer.offer(frame, self._raw_frame_no)
+
+        wb_due, luma_due = self._due_analyses(current_time)
+        if not (wb_due or luma_due):
+            return
+        # One downscaled thumbnail of the UNCORRECTED frame, shared by both stages
+        thumb = self._latest_thumbnail(frame)
+
+        # Update auto WB gains periodically (if enabled);
+        # the gains are applied by the color LUT in _render_frame
+        if wb_due:
+            try:
+                self._update_auto_wb(thumb, current_time)
+            except Exception as e:
+                logger.debug(f"[MediaRelay] Auto WB update failed: {e}")
+
+        # Optional: day/night switching using average brightness
+        if luma_due:
+            self._update_day_night(thumb, current_time)
+
+    def _render_frame(self, frame, current_time):
+        """Pixel-modifying stages, only needed when someone is watching."""
+        # Color correction: RGB LED multipliers, WB gains, LED gamma and the
+        # night-only brightness boost, folded into one cached LUT pass
+        if frame is not None:
+            frame = self._apply_color(frame)
+
+        # Add WNCC STEM Club label timing logic (only if enabled for this camera)
+        if self.enable_overlay:
+            self._draw_label_overlay(frame, current_time)
+
+        frame = self._rotate_frame(frame)
+
+        # ---------------- Day/Night corner label -----------------
+        if self.enable_day_night and self.day_night_badge and frame is not None:
+            self._draw_day_night_label(frame)
+        return frame
+
+    @timed_stage("color")
+    def _apply_color(self, frame):
+        """One LUT pass for every color stage (returns the frame unchanged on error)."""
+        try:
+            # In place: the raw frame is not needed once analysis is done
+            return self.color_pipeline.apply(frame, self._wb_gains, self.current_mode, in_place=True)
+        except Exception as e:
+            logger.debug(f"[MediaRelay] Color correction failed: {e}")
+            return frame
+
+    def _update_day_night(self, thumb, now):
+        """Sample brightness every LUMA_SAMPLE_EVERY_SEC and switch day/night mode.
+        `thumb` is the shared AnalysisThumbnail of the UNCORRECTED frame (avoids bias).
+        """
+        if now - self._last_luma_check < LUMA_SAMPLE_EVERY_SEC:
+            return
+        self._last_luma_check = now
+        raw_luma = thumb.luma()
+
+        # Apply exponential moving average to smooth out auto-exposure variations
+        # Alpha = 0.3 means 30% new value, 70% old value (heavy smoothing)
+        if self._smoothed_luma is None:
+            self._smoothed_luma = raw_luma
+        else:
+            self._smoothed_luma = 0.3 * raw_luma + 0.7 * self._smoothed_luma
+
+        mean_luma = self._smoothed_luma
+
+        # Determine if we should switch modes (with damping)
+        should_switch_to_night = self.current_mode == "day" and mean_luma < NIGHT_LUMA_THRESHOLD
+        should_switch_to_day = self.current_mode == "night" and mean_luma > DAY_LUMA_THRESHOLD
+
+        if should_switch_to_night or should_switch_to_day:
+            self._mode_switch_count += 1
+            # Require 2 consecutive samples in target range before switching
+            if self._mode_switch_count >= 2:
+                new_mode = "night" if should_switch_to_night else "day"
+                self.current_mode = new_mode
+                self._mode_switch_count = 0
+                # The capture thread applies the exposure before its next read
+                self._pending_exposure_mode = new_mode
+                logger.info(f"[MediaRelay] Day/Night switched to {new_mode} (smoothed luma={mean_luma:.3f}, raw={raw_luma:.3f})")
+        else:
+            # Reset counter if brightness is stable in current mode
+            self._mode_switch_count = 0
+
+    def _apply_pending_exposure(self):
+        """Set camera exposure for a day/night switch requested by the processing stage."""
+        new_mode = self._pending_exposure_mode
+        if new_mode is None:
+            return
+        self._pending_exposure_mode = None
+        try:
+            # Set camera exposure automatically for day/night
+            if not CAMERA_AUTO_EXPOSURE and self.cap is not None:
+                if new_mode == "night":
+                    self.cap.set(cv2.CAP_PROP_EXPOSURE, CAMERA_NIGHT_EXPOSURE_VALUE)
+                    logger.info(f"[MediaRelay] Exposure set to NIGHT value: {CAMERA_NIGHT_EXPOSURE_VALUE}")
+                else:
+                    self.cap.set(cv2.CAP_PROP_EXPOSURE, CAMERA_DAY_EXPOSURE_VALUE)
+                    logger.info(f"[MediaRelay] Exposure set to DAY value: {CAMERA_DAY_EXPOSURE_VALUE}")
+            if hasattr(self.cap, "set_day_mode") and hasattr(self.cap, "set_night_mode"):
+                if new_mode == "night":
+                    self.cap.set_night_mode()
+                else:
+                    self.cap.set_day_mode()
+        except Exception as e:
+            logger.warning(f"[MediaRelay] Exposure switch error: {e}")
+
+    def _label_visible(self, current_time):
+        """Advance the label cycle and return True while the label should show."""
+        current_cycle_time = (
+            current_time - self.label_start_time
+        )
+
+        # Show label for configured duration every configured interval
+        cycle_duration = (
+            LABEL_CYCLE_MINUTES * 60
+        )  # Convert minutes to seconds
+        if current_cycle_time >= cycle_duration:  # Reset cycle
+            self.label_start_time = current_time
+            current_cycle_time = 0
+            self.label_shown = False
+
+        # Show label for first X seconds of each cycle
+        return current_cycle_time < LABEL_DURATION_SECONDS
+
+    @timed_stage("overlay")
+    def _draw_label_overlay(self, frame, current_time):
+        """Draw the club label for LABEL_DURATION_SECONDS every LABEL_CYCLE_MINUTES."""
+        # Add overlay text if it's time to show it
+        if self._label_visible(current_time):
+            # The label is pre-rendered once into a small patch; each frame only
+            # blends the rectangle it covers (rebuilt if text/colors/size change)
+            key = (
+                frame.shape, LABEL_TEXT, LABEL_FONT_SCALE,
+                LABEL_TRANSPARENCY, TEXT_TRANSPARENCY, tuple(TEXT_COLOR),
+            )
+            self.overlays.draw(
+                frame,
+                "label",
+                key,
+                lambda: build_label_patch(
+                    frame.shape,
+                    LABEL_TEXT,
+                    LABEL_FONT_SCALE,
+                    LABEL_TRANSPARENCY,
+                    TEXT_TRANSPARENCY,
+                    TEXT_COLOR,
+                ),
+            )
+
+            # Log when label appears (only once per state change)
+            if not self.label_shown:
+                logger.info(
+                    f"[MediaRelay] Label '{LABEL_TEXT}' displayed for {LABEL_DURATION_SECONDS}s"
+                )
+                self.label_shown = True
+        else:
+            # Log when label disappears (only once per state change)
+            if self.label_shown:
+                logger.info(
+                    f"[MediaRelay] Label '{LABEL_TEXT}' hidden - next display in {LABEL_CYCLE_MINUTES} minutes"
+                )
+                self.label_shown = False
+
+    @timed_stage("rotate")
+    def _rotate_frame(self, frame):
+        """Apply rotation if specified for this camera."""
+        # Debug logging to help diagnose unexpected rotation behavior
+        logger.debug(
+            f"[MediaRelay] rotation_angle={self.rotation_angle}"
+        )
+        if self.rotation_angle == 90:
+            # Rotate 90 degrees counterclockwise
+            logger.debug(
+                "[MediaRelay] Applying rotation: 90° CCW (ROTATE_90_COUNTERCLOCKWISE)"
+            )
+            code = cv2.ROTATE_90_COUNTERCLOCKWISE
+        elif self.rotation_angle == 180:
+            # Rotate 180 degrees
+            logger.debug(
+                "[MediaRelay] Applying rotation: 180° (ROTATE_180)"
+            )
+            code = cv2.ROTATE_180
+        elif self.rotation_angle == 270:
+            # Rotate 270 degrees counterclockwise (or 90 degrees clockwise)
+            logger.debug(
+                "[MediaRelay] Applying rotation: 270° CCW / 90° CW (ROTATE_90_CLOCKWISE)"
+            )
+            code = cv2.ROTATE_90_CLOCKWISE
+        else:
+            return frame
+        if self.buffer_pool:
+            h, w = frame.shape[:2]
+            out_shape = (h, w) + frame.shape[2:] if code == cv2.ROTATE_180 else (w, h) + frame.shape[2:]
+            return cv2.rotate(frame, code, dst=self._rotate_pool.next(out_shape))
+        return cv2.rotate(frame, code)
+
+    @timed_stage("badge")
+    def _draw_day_night_label(self, frame):
+        """Draw the DAY/NIGHT badge in the top-right corner (cached patch)."""
+        try:
+            mode = self.current_mode
+            self.overlays.draw(
+                frame,
+                "day_night",
+                (frame.shape, mode),
+                lambda: build_day_night_patch(frame.shape, mode),
+            )
+        except Exception as e:
+            logger.debug(f"[MediaRelay] Day/Night label draw failed: {e}")
+
+    # ------------------------ ENCODE / PUBLISH ----------------------------- #
+    @timed_stage("encode")
+    def _encode_frame(self, frame):
+        """Convert the frame to JPEG format with controlled quality for web streaming."""
+        adaptive = self.adaptive
+        if adaptive is None:
+            _, buffer = cv2.imencode(".jpg", frame, self._encode_params)
+        else:
+            # Quality and size chosen by the adaptive controller, which
+            # learns from how long this frame took and how big it came out
+            started = time.perf_counter()
+            quality, scale = adaptive.settings()
+            if scale < 1.0:
+                # INTER_AREA is best for shrinking but slow unless the
+                # factor is a whole number (1/2, 1/3, ...)
+                whole = (1.0 / scale).is_integer()
+                interpolation = cv2.INTER_AREA if whole else cv2.INTER_LINEAR
+                frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=interpolation)
+            _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+            adaptive.observe(time.perf_counter() - started, buffer.size)
+        if self.buffer_pool:
+            # Zero-copy: hand out the encoder's own output buffer (a new one is
+            # made for every frame and never written again) instead of copying
+            # it into a bytes object. Clients only need len() and write().
+            # It can't be recycled: cv2.imencode() has no output argument, and
+            # copying into a reused buffer would cost more than it saves.
+            return memoryview(buffer).cast("B")
+        return buffer.tobytes()
+
+    def _encode_and_publish(self, frame, jpeg=None, timestamp=None):
+        """Encode the full-size JPEG (if anyone wants it) and publish the frame.
+        `jpeg` is an already-encoded frame (MJPEG pass-through) to send as-is.
+        """
+        if self._encoder_pool is not None:
+            # Encoded on a pool thread, published in capture order
+            self._encoder_pool.submit(frame, jpeg, timestamp)
+            return
+        if jpeg is None and frame is not None and self.needs_full_encode():
+            jpeg = self._encode_frame(frame)
+        self._publish_frame(jpeg, frame, timestamp)
+
+    def _encode_wanted(self, frame):
+        """Encoder pool job: the full-size JPEG if any consumer wants it, else None."""
+        return self._encode_frame(frame) if self.needs_full_encode() else None
+
+    def _publish_encoded(self, frame, jpeg, timestamp):
+        """Encoder pool callback (runs in capture order)."""
+        self._publish_frame(jpeg, frame, timestamp)
+
+    @timed_stage("publish")
+    def _publish_frame(self, frame_bytes, rendered=None, timestamp=None):
+        """Publish a new version of the latest frame and wake every waiting client."""
+        seq = self.frame_seq + 1  # Only the publishing thread changes it
+        timestamp = time.time() if timestamp is None else timestamp
+        part = make_part(frame_bytes, seq, timestamp) if frame_bytes is not None else None
+        metadata = {"mode": self.current_mode}
+        if rendered is not None:
+            metadata["width"], metadata["height"] = rendered.shape[1], rendered.shape[0]
+            if self.adaptive is not None and frame_bytes is not None:
+                # The adaptive controller may have shrunk the JPEG: report the
+                # size viewers actually get (the scale can change between
+                # encode and publish, so read it from the JPEG itself)
+                metadata["width"], metadata["height"] = jpeg_size(frame_bytes) or rendered.shape[1::-1]
+            if self.buffer_pool:
+                # Pool buffers are overwritten a few reads later, but a
+                # published frame can be used for up to a second (snapshots,
+                # slow rendition encodes). Rendition viewers get their own
+                # copy; snapshots decode the JPEG instead.
+                rendered = rendered.copy() if self.consumer_counts().get("rendition") else None
+        # Notify all clients that a new frame is ready
+        with self.condition:
+            if frame_bytes is not None:
+                self.frame = frame_bytes
+            published = self.latest_frame = PublishedFrame(
+                seq=seq,
+                timestamp=timestamp,
+                jpeg=frame_bytes,
+                part=part,
+                rendered=rendered,
+                metadata=metadata,
+            )
+            self.condition.notify_all()
+        if self.history is not None and frame_bytes is not None:
+            # Same bytes the live viewers get: recording costs no extra encode
+            self.history.add(published.seq, published.timestamp, frame_bytes, part)
+        for listener in self._frame_listeners:
+            try:
+                listener()
+            except Exception as e:
+                logger.debug(f"[MediaRelay] Frame listener failed: {e}")
+        self.metrics.publish_rate.mark()
+        if frame_bytes is not None:
+            self.metrics.jpeg_bytes.observe(len(frame_bytes))
+
+    def add_frame_listener(self, callback):
+        """Call callback() (from the publishing thread) after every new frame."""
+        self._frame_listeners = self._frame_listeners + [callback]
+
+    def remove_frame_listener(self, callback):
+        """Stop calling a callback registered with add_frame_listener()."""
+        self._frame_listeners = [cb for cb in self._frame_listeners if cb is not callback]
 
     # ------------------------- GET FRAME ---------------------------------- #
     def get_frame(self):
@@ -965,15 +1778,593 @@ class MediaRelay:
             self.condition.wait()  # Wait until a new frame is available
             return self.frame
 
+    @property
+    def frame_seq(self):
+        """Sequence number of the latest published frame (0 before the first)."""
+        latest = self.latest_frame
+        return latest.seq if latest is not None else 0
+
+    def get_frame_after(self, seq, timeout=None):
+        """
+        Return the newest PublishedFrame with a sequence number above `seq`,
+        waiting up to `timeout` seconds for one (None = wait forever).
+        Returns None on timeout.
+
+        A client that fell behind gets the NEWEST frame straight away (the
+        ones in between are skipped, never queued), and one that is already
+        up to date waits for the next frame instead of resending this one.
+        """
+        with self.condition:
+            if not self.condition.wait_for(
+                lambda: self.latest_frame is not None and self.latest_frame.seq > seq, timeout
+            ):
+                return None
+            return self.latest_frame
+
+    # --------------------------- SNAPSHOTS ---------------------------------- #
+    def get_snapshot(self, max_age=SNAPSHOT_MAX_AGE_SECONDS, timeout=3.0):
+        """
+        Return a recent PublishedFrame that has a full-size JPEG, or None.
+
+        While someone is streaming, the latest frame is always fresh and is
+        returned straight away (no extra encode). Otherwise we attach as a
+        "snapshot" consumer, which wakes the pipeline up, and wait for the
+        next encoded frame.
+        """
+        latest = self.latest_frame
+        if latest is not None and latest.jpeg is not None and time.time() - latest.timestamp <= max_age:
+            return latest
+        seq = latest.seq if latest is not None else 0
+        deadline = time.monotonic() + timeout
+        with self.consumer("snapshot"):
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                published = self.get_frame_after(seq, remaining)
+                if published is None:
+                    return None
+                if published.jpeg is not None:
+                    return published
+                seq = published.seq  # Rendition-only frame: wait for the next
+
+    def snapshot_jpeg(self, published, width=0):
+        """JPEG for a snapshot, downscaled to `width` (cached per frame like renditions)."""
+        if not width:
+            return published.jpeg
+        pixels = published.rendered
+        if pixels is None:
+            # MJPEG pass-through or buffer pool frame: decode the JPEG once
+            pixels = cv2.imdecode(np.frombuffer(published.jpeg, np.uint8), cv2.IMREAD_COLOR)
+        return self.renditions.get(published.seq, pixels, width, JPEG_QUALITY)
+
     def stop(self):
         # Cleanly stop the background thread and release the camera
         self.running = False
+        self.pacer.wake()  # Don't wait out the current frame interval
         if self.capture_thread:
             self.capture_thread.join()
+        for stage_thread in (self.process_thread, self.encode_thread):
+            if stage_thread:
+                stage_thread.join(timeout=2.0)
+        self._process_queue.clear()
+        self._encode_queue.clear()
+        if self._encoder_pool is not None:
+            self._encoder_pool.close()
+            self._encoder_pool = None
         if self.cap:
             self.cap.release()
 
 
+# ------------------- CAMERA IN A WORKER PROCESS --------------------------- #
+class CameraWorkerRelay(MediaRelay):
+    """
+    MediaRelay whose camera pipeline runs in a separate worker process
+    (ENABLE_CAMERA_PROCESSES).
+
+    The worker runs an ordinary MediaRelay and writes each encoded JPEG into
+    a SharedFrameRing. This object stays in the web server: its receiver
+    thread copies each JPEG out once and publishes it through the usual
+    versioned frame slot, so streams, renditions, snapshots and replay
+    work exactly as with a local camera. White balance
+    requests and pipeline stats are forwarded to the worker.
+    """
+
+    # Opening a camera includes a warm-up; give the worker time for that
+    START_TIMEOUT = 30.0
+
+    def __init__(self, *, capture_factory=None, **kwargs):
+        # Set up before MediaRelay.__init__, which already sets WB state and
+        # may add a consumer
+        self._worker_kwargs = dict(kwargs)
+        self._capture_factory = capture_factory  # Replaces the camera (tools)
+        self._process = None
+        self._conn = None
+        self._conn_lock = Lock()
+        self._demand_lock = Lock()
+        self._demand = False  # Whether the worker was told to encode
+        self._ring = None
+        self._frame_event = None
+        self._wb_state = (WB_MODE, [1.0, 1.0, 1.0])  # Last known (mode, gains)
+        super().__init__(**kwargs)
+        # The worker encodes, so it runs the adaptive quality controller (on
+        # encode time and bitrate; viewer lag is only visible on this side)
+        self.adaptive = None
+
+    # ------------------------- WORKER CONTROL ----------------------------- #
+    def start_capture(self, camera_index=0, use_libcamera=False):
+        """Start the worker process, which opens the camera; raises RuntimeError if it can't."""
+        self.camera_index = int(camera_index)
+        self.use_libcamera = bool(use_libcamera)
+        # "spawn" starts a fresh interpreter instead of forking this
+        # (multi-threaded) process
+        ctx = multiprocessing.get_context("spawn")
+        slot_bytes = CAMERA_WORKER_SLOT_BYTES or self.width * self.height // 2
+        self._ring = SharedFrameRing(slots=CAMERA_WORKER_RING_SLOTS, slot_bytes=slot_bytes)
+        self._frame_event = ctx.Event()
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(
+            target=camera_worker_main,
+            args=(self._worker_kwargs, camera_index, use_libcamera, self._ring.name,
+                  self._frame_event, child_conn, self._capture_factory),
+            name=f"camera-worker-{camera_index}",
+            daemon=True,
+        )
+        self._process.start()
+        child_conn.close()
+        try:
+            wait_for_reply(self._conn, self.START_TIMEOUT)
+        except Exception as e:
+            self._stop_worker()
+            raise RuntimeError(f"Camera worker for {self.name} failed to start: {e}")
+        logger.info(
+            f"[MediaRelay] {self.name}: camera pipeline running in worker process {self._process.pid} "
+            f"({self._ring.slots} x {slot_bytes // 1024} kB shared frame slots)"
+        )
+        self.running = True
+        self._sync_demand()
+        self.capture_thread = Thread(target=self._receive_frames, name=f"{self.name}-receive", daemon=True)
+        self.capture_thread.start()
+
+    def _worker_alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def _call(self, command, *args, timeout=10.0):
+        """Send a control request to the worker and return its answer."""
+        if not self._worker_alive():
+            raise RuntimeError("Camera worker not running")
+        with self._conn_lock:
+            self._conn.send((command,) + args)
+            return wait_for_reply(self._conn, timeout)
+
+    def _sync_demand(self):
+        """Tell the worker whether anyone here wants frames (it pauses encoding otherwise)."""
+        with self._demand_lock:
+            wanted = self.has_consumers()
+            if wanted == self._demand or not self._worker_alive():
+                return
+            try:
+                self._call("demand", wanted)
+                self._demand = wanted
+            except Exception as e:
+                logger.warning(f"[MediaRelay] {self.name}: could not update camera worker: {e}")
+
+    def add_consumer(self, kind="stream"):
+        super().add_consumer(kind)
+        self._sync_demand()
+
+    def remove_consumer(self, kind="stream"):
+        super().remove_consumer(kind)
+        self._sync_demand()
+
+    def _receive_frames(self):
+        """Receiver thread: publish each new JPEG the worker put in the ring."""
+        seq = 0
+        while self.running:
+            self._frame_event.wait(0.5)
+            self._frame_event.clear()
+            latest = self._ring.read_latest(seq)
+            if latest is None:
+                if not self._worker_alive():
+                    logger.error(
+                        f"[MediaRelay] {self.name}: camera worker exited (code {self._process.exitcode})"
+                    )
+                    break
+                continue
+            seq, timestamp, jpeg = latest
+            rendered = None
+            if self.consumer_counts().get("rendition"):
+                # Rendition viewers need pixels; the worker only shares JPEGs
+                rendered = cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR)
+            if self.history is not None:
+                # The history keeps frames far longer than a ring slot lives
+                jpeg = bytes(jpeg)
+            self._publish_frame(jpeg, rendered, timestamp)
+
+    def _stop_worker(self):
+        if self._worker_alive():
+            try:
+                with self._conn_lock:
+                    self._conn.send(("stop",))
+            except (OSError, ValueError):
+                pass
+            self._process.join(timeout=5.0)
+            if self._process.is_alive():
+                self._process.terminate()
+        if self._ring is not None:
+            self._ring.close()
+
+    def stop(self):
+        self.running = False
+        if self._frame_event is not None:
+            self._frame_event.set()  # Wake the receiver thread
+        super().stop()
+        self._stop_worker()
+
+    # -------------------- FORWARDED TO THE WORKER ------------------------- #
+    def _worker_wb(self, mode=None, gains=None):
+        """Read (and optionally change) the worker's WB (mode, gains)."""
+        if not self._worker_alive():
+            current_mode, current_gains = self._wb_state
+            self._wb_state = (mode or current_mode, list(gains) if gains is not None else current_gains)
+            return self._wb_state
+        self._wb_state = tuple(self._call("wb", mode, None if gains is None else list(gains)))
+        return self._wb_state
+
+    @property
+    def wb_mode(self):
+        return self._worker_wb()[0]
+
+    @wb_mode.setter
+    def wb_mode(self, mode):
+        self._worker_wb(mode=mode)
+
+    @property
+    def _wb_gains(self):
+        return self._worker_wb()[1]
+
+    @_wb_gains.setter
+    def _wb_gains(self, gains):
+        self._worker_wb(gains=gains)
+
+    def calibrate_from_last_frame(self, roi_mode: str = "", size_fraction: float = 0.45):
+        return tuple(self._call("calibrate", roi_mode, size_fraction))
+
+    def preview_calibration(self, roi_mode: str = "", size_fraction: float = 0.45):
+        return tuple(self._call("preview", roi_mode, size_fraction))
+
+    def pipeline_stats(self):
+        """The worker's pipeline stats plus this side's viewers, renditions and history."""
+        try:
+            stats = self._call("stats")
+        except Exception as e:
+            stats = {"error": str(e)}
+        stats.update({
+            "encoding": self.has_consumers(),
+            "consumers": self.consumer_counts(),
+            "clients": self.client_stats(),
+            "renditions": self.renditions.stats(),
+            "worker": {
+                "pid": self._process.pid if self._process else None,
+                "alive": self._worker_alive(),
+                "ring": self._ring.stats() if self._ring else None,
+            },
+        })
+        if self.history is not None:
+            stats["history"] = self.history.stats()
+        return stats
+
+    def metrics_snapshot(self):
+        """The worker's pipeline metrics plus this side's viewers and delivery rate."""
+        snapshot = self._call("metrics")
+        snapshot.update({
+            "publish_fps": self.metrics.publish_rate.rate(),
+            "encoding": self.has_consumers(),
+            "clients": self.client_stats(),
+        })
+        return snapshot
+
+
+# ---------------------- SIMPLE (NON-STREAM) ENDPOINTS ---------------------- #
+JSON_HEADERS = [("Content-Type", "application/json")]
+TEXT_HEADERS = [("Content-Type", "text/plain; charset=utf-8")]
+
+
+def simple_response(path, qparams, camera_relay, request_headers=None):
+    """
+    Build the reply for every endpoint that is not a video stream.
+
+    Returns (status, headers, body) where headers is a list of (name, value)
+    pairs and body is bytes (for errors, status >= 400 and body is the error
+    message). Returns None for unknown paths. Shared by StreamingHandler and
+    the asyncio server so both serve exactly the same pages. May block for a
+    moment (WB calibration and snapshots wait for a fresh frame), so async
+    callers should run it in a worker thread. `request_headers` (an
+    http.client.HTTPMessage) is only needed for conditional snapshot requests.
+    """
+    import json
+
+    if path == "/":
+        # Redirect root path to the main page
+        return 301, [("Location", "/index.html")], b""
+    if path == "/index.html":
+        # Send the main HTML page
+        return 200, [("Content-Type", "text/html")], PAGE.encode("utf-8")
+    if path == "/favicon.ico":
+        # Handle favicon requests to prevent 404 errors
+        return 204, [], b""  # No Content
+    if path == "/cameras":
+        # Every configured camera with its URLs
+        listing = [
+            {
+                "camera": number,
+                "name": relay.name,
+                "width": relay.width,
+                "height": relay.height,
+                "fps": relay.frame_rate,
+                "stream": f"/stream{number}.mjpg",
+                "snapshot": f"/snapshot{number}.jpg",
+                "wb_status": f"/wb/{number}/status",
+            }
+            for number, relay in sorted(camera_registry().items())
+        ]
+        return 200, JSON_HEADERS, json.dumps(listing).encode("utf-8")
+    if path == "/snapshot.jpg":
+        return snapshot_response(qparams, camera_relay, request_headers)
+    if path.startswith("/frames/") and path.endswith(".jpg"):
+        return history_frame_response(path[len("/frames/"):-len(".jpg")], camera_relay, request_headers)
+    if path == "/wb/status":
+        # Return white balance status and gains
+        try:
+            gains = getattr(camera_relay, "_wb_gains", [1.0, 1.0, 1.0]) if camera_relay else [1.0, 1.0, 1.0]
+            mode = getattr(camera_relay, "wb_mode", "off") if camera_relay else "off"
+            payload = json.dumps({
+                "mode": mode,
+                "gains": {"r": gains[0], "g": gains[1], "b": gains[2]}
+            }).encode("utf-8")
+            return 200, JSON_HEADERS, payload
+        except Exception as e:
+            return 500, [], f"WB status error: {e}".encode("utf-8")
+    if path == "/metrics":
+        # Prometheus text format for every camera (scraped, not for people)
+        snapshots = {}
+        for number, relay in camera_registry().items():
+            try:
+                snapshots[number] = relay.metrics_snapshot()
+            except Exception as e:
+                logger.debug(f"[MediaRelay] Metrics for camera {number} failed: {e}")
+        body = render_prometheus(snapshots).encode("utf-8")
+        return 200, [("Content-Type", "text/plain; version=0.0.4; charset=utf-8")], body
+    if path == "/debug/profile":
+        return profile_response(qparams)
+    if path == "/pipeline/status":
+        # Return capture pipeline mode plus per-stage queue depth and drops
+        try:
+            if not camera_relay:
+                raise RuntimeError("Camera not available")
+            return 200, JSON_HEADERS, json.dumps(camera_relay.pipeline_stats()).encode("utf-8")
+        except Exception as e:
+            return 500, [], f"Pipeline status error: {e}".encode("utf-8")
+    if path == "/wb/calibrate":
+        # One-click neutral-card calibration: compute & lock gains from last frame
+        try:
+            if not camera_relay:
+                raise RuntimeError("Camera not available")
+            # ROI options: roi=center&size=0.4 (fraction of min dimension)
+            roi_mode = (qparams.get('roi', [''])[0] or '').lower()
+            size_f = float(qparams.get('size', [0.45])[0])
+            size_f = max(0.05, min(0.95, size_f))
+            r, g, b = camera_relay.calibrate_from_last_frame(roi_mode=roi_mode, size_fraction=size_f)
+            msg = f"Calibrated and locked WB (R,G,B)=({r:.3f},{g:.3f},{b:.3f})"
+            return 200, TEXT_HEADERS, msg.encode("utf-8")
+        except Exception as e:
+            return 500, [], f"Calibration failed: {e}".encode("utf-8")
+    if path == "/wb/preview":
+        # Compute proposed gains without applying them (for UI/testing)
+        try:
+            if not camera_relay:
+                raise RuntimeError("Camera not available")
+            roi_mode = (qparams.get('roi', [''])[0] or '').lower()
+            size_f = float(qparams.get('size', [0.45])[0])
+            size_f = max(0.05, min(0.95, size_f))
+            gains = camera_relay.preview_calibration(roi_mode=roi_mode, size_fraction=size_f)
+            payload = json.dumps({
+                "proposed_gains": {"r": gains[0], "g": gains[1], "b": gains[2]},
+                "mode": camera_relay.wb_mode,
+                "roi": roi_mode or "full",
+                "size_fraction": size_f
+            }).encode("utf-8")
+            return 200, JSON_HEADERS, payload
+        except Exception as e:
+            return 500, [], f"WB preview failed: {e}".encode("utf-8")
+    if path == "/wb/locked":
+        try:
+            if not camera_relay:
+                raise RuntimeError("Camera not available")
+            camera_relay.wb_mode = "locked"
+            return 200, TEXT_HEADERS, b"WB mode set to locked"
+        except Exception as e:
+            return 500, [], f"WB lock failed: {e}".encode("utf-8")
+    if path == "/wb/auto":
+        try:
+            if not camera_relay:
+                raise RuntimeError("Camera not available")
+            camera_relay.wb_mode = "auto_grayworld"
+            return 200, TEXT_HEADERS, b"WB mode set to auto_grayworld"
+        except Exception as e:
+            return 500, [], f"WB auto set failed: {e}".encode("utf-8")
+    if path == "/wb/off":
+        try:
+            if not camera_relay:
+                raise RuntimeError("Camera not available")
+            camera_relay.wb_mode = "off"
+            camera_relay._wb_gains = [1.0, 1.0, 1.0]
+            return 200, TEXT_HEADERS, b"WB mode set to off"
+        except Exception as e:
+            return 500, [], f"WB off failed: {e}".encode("utf-8")
+    if path == "/wb/clear":
+        try:
+            # Delete calibration file; set auto mode
+            if camera_relay:
+                pathf = camera_relay.wb_calibration_path()
+            else:
+                pathf = os.path.join(os.path.dirname(os.path.abspath(__file__)), WB_CALIBRATION_FILE)
+            if os.path.exists(pathf):
+                os.remove(pathf)
+            if camera_relay:
+                camera_relay.wb_mode = "auto_grayworld"
+            return 200, TEXT_HEADERS, b"WB calibration cleared; mode set to auto"
+        except Exception as e:
+            return 500, [], f"WB clear failed: {e}".encode("utf-8")
+    return None
+
+
+def profile_response(qparams):
+    """
+    /debug/profile?seconds=5 - sample every thread for a while and return
+    what they were doing. Blocks for `seconds` (up to PROFILE_MAX_SECONDS).
+
+    format=collapsed (default): flamegraph-ready stacks (flamegraph.pl,
+        https://www.speedscope.app)
+    format=pstats: a pstats file (python -m pstats profile.pstats, snakeviz)
+    format=stages: JSON time per pipeline stage (ENABLE_STAGE_TIMING), for
+        every camera including worker processes
+    threads=capture,http: only threads whose name contains one of these
+    """
+    import json
+
+    if not ENABLE_PROFILE_ENDPOINT:
+        return 404, [], b"Profiling disabled (ENABLE_PROFILE_ENDPOINT)"
+    try:
+        seconds = float(qparams.get("seconds", ["5"])[0])
+        interval = float(qparams.get("interval", ["0.005"])[0])
+    except ValueError:
+        return 400, [], b"seconds and interval must be numbers"
+    seconds = max(0.1, min(float(PROFILE_MAX_SECONDS), seconds))
+    output = (qparams.get("format", ["collapsed"])[0] or "collapsed").lower()
+    thread_filter = (qparams.get("threads", [""])[0] or "").split(",")
+
+    if output == "stages":
+        # No stack sampling: compare the stage histograms before and after
+        relays = camera_registry()
+        try:
+            before = {n: relay.metrics_snapshot()["stages"] for n, relay in relays.items()}
+            time.sleep(seconds)
+            payload = {
+                n: stage_deltas(before[n], relay.metrics_snapshot()["stages"], seconds)
+                for n, relay in relays.items()
+            }
+        except Exception as e:
+            return 500, [], f"Stage profile failed: {e}".encode("utf-8")
+        return 200, JSON_HEADERS, json.dumps({"seconds": seconds, "cameras": payload}).encode("utf-8")
+    if output not in ("collapsed", "pstats"):
+        return 400, [], b"format must be collapsed, pstats or stages"
+
+    try:
+        sampler = sample_threads(seconds, interval, thread_filter)
+    except ProfilerBusy as e:
+        return 409, [], f"Profile not started: {e}".encode("utf-8")
+    logger.info(
+        f"[MediaRelay] Profiled {len(sampler.stacks)} stacks in {sampler.sample_count} samples "
+        f"over {sampler.duration:.1f}s"
+    )
+    if output == "pstats":
+        return 200, [
+            ("Content-Type", "application/octet-stream"),
+            ("Content-Disposition", 'attachment; filename="profile.pstats"'),
+        ], sampler.pstats_dump()
+    return 200, TEXT_HEADERS, sampler.collapsed().encode("utf-8")
+
+
+def snapshot_response(qparams, camera_relay, request_headers=None):
+    """
+    /snapshot.jpg[?w=640]: the latest JPEG as a still image.
+
+    The ETag is the frame's sequence number, so a dashboard that polls with
+    If-None-Match (or If-Modified-Since) gets an empty 304 reply until the
+    camera has produced a new frame.
+    """
+    if camera_relay is None:
+        return 503, [], b"Camera not available"
+    try:
+        width = max(0, int(qparams.get("w", [0])[0] or 0))
+    except (TypeError, ValueError):
+        return 400, [], b"Invalid w parameter"
+    published = camera_relay.get_snapshot()
+    if published is None:
+        return 503, [], b"No frame available"
+
+    etag = f'"{camera_relay.instance_id}-{published.seq}' + (f'-w{width}"' if width else '"')
+    headers = frame_cache_headers(etag, published.timestamp)
+    if not_modified(request_headers, etag, published.timestamp):
+        return 304, headers, b""
+    try:
+        body = camera_relay.snapshot_jpeg(published, width)
+    except Exception as e:
+        return 500, [], f"Snapshot failed: {e}".encode("utf-8")
+    return 200, [("Content-Type", "image/jpeg")] + headers, body
+
+
+def history_frame_response(when, camera_relay, request_headers=None):
+    """
+    /frames/<time>.jpg: the frame that was live at <time>, straight from the
+    replay history (no re-encode). <time> is a Unix timestamp
+    (/frames/1760000000.5.jpg) or relative (/frames/-30s.jpg).
+    """
+    history = camera_relay.history if camera_relay is not None else None
+    if history is None:
+        return 503, [], b"Frame history not available (FRAME_HISTORY_BYTES is 0)"
+    try:
+        timestamp = parse_time(when)
+    except ValueError:
+        return 400, [], b"Invalid time (use a Unix timestamp or e.g. -30s, -5m)"
+    frame = history.frame_at(timestamp)
+    if frame is None:
+        return 404, [], b"No frame recorded at that time"
+    etag = f'"{camera_relay.instance_id}-{frame.seq}"'
+    headers = frame_cache_headers(etag, frame.timestamp)
+    headers.append(("X-Frame-Timestamp", f"{frame.timestamp:.3f}"))
+    if not_modified(request_headers, etag, frame.timestamp):
+        return 304, headers, b""
+    return 200, [("Content-Type", "image/jpeg")] + headers, frame.jpeg
+
+
+def frame_cache_headers(etag, timestamp):
+    """Validators for a single camera frame: ETag + Last-Modified."""
+    return [
+        ("ETag", etag),
+        ("Last-Modified", formatdate(timestamp, usegmt=True)),
+        # Caches may keep it but must check with us before reusing it
+        ("Cache-Control", "no-cache"),
+    ]
+
+
+def not_modified(request_headers, etag, timestamp):
+    """True if the client's If-None-Match / If-Modified-Since says it already has this frame."""
+    if request_headers is None:
+        return False
+    if_none_match = request_headers.get("If-None-Match")
+    if if_none_match:
+        return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+    if_modified_since = request_headers.get("If-Modified-Since")
+    if if_modified_since:
+        try:
+            return int(timestamp) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            pass  # Unparseable date: ignore the header
+    return False
+
+
+def parse_replay(qparams):
+    """Read from/speed query parameters of /replay.mjpg. Returns (start, speed);
+    raises ValueError for bad values."""
+    start = parse_time(qparams.get("from", ["-60s"])[0])
+    speed = float(qparams.get("speed", [1.0])[0] or 1.0)
+    if not 0 < speed <= 16:
+        raise ValueError("speed must be between 0 and 16")
+    return start, speed
+
+
 # -------------------- STREAMING HANDLER (Web Requests) -------------------- #
 class StreamingHandler(server.BaseHTTPRequestHandler):
     """
@@ -994,6 +2385,12 @@ class StreamingHandler(server.BaseHTTPRequestHandler):
     # Class variable to track the number of active streaming connections
     active_stream_connections = 0
 
+    def setup(self):
+        super().setup()
+        # One thread per connection: name it after the viewer so it is easy
+        # to pick out in /debug/profile (?threads=http)
+        current_thread().name = f"http-{self.client_address[0]}:{self.client_address[1]}"
+
     # -------------------------- DO GET ------------------------------------ #
     def do_GET(self):
         # This method handles GET requests from browsers (like when you type a URL)
@@ -1009,150 +2406,153 @@ class StreamingHandler(server.BaseHTTPRequestHandler):
         except Exception:
             qparams = {}
         
-        if path == "/":
-            # Redirect root path to the main page
-            self.send_response(301)
-            self.send_header("Location", "/index.html")
-            self.end_headers()
-        elif path == "/index.html":
-            # Send the main HTML page
-            content = PAGE.encode("utf-8")
-            self.send_response(200)
-            self.send_header("Content-Type", "text/html")
-            self.send_header("Content-Length", str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
-        elif path == "/stream0.mjpg":
-            # Handle Pod camera stream (camera 0)
-            self._handle_stream_request(relay0, "Pod")
-        elif path == "/wb/status":
-            # Return white balance status and gains
-            try:
-                gains = getattr(relay0, "_wb_gains", [1.0, 1.0, 1.0]) if relay0 else [1.0, 1.0, 1.0]
-                mode = getattr(relay0, "wb_mode", "off") if relay0 else "off"
-                import json
-                payload = json.dumps({
-                    "mode": mode,
-                    "gains": {"r": gains[0], "g": gains[1], "b": gains[2]}
-                }).encode("utf-8")
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.send_header("Content-Length", str(len(payload)))
-                self.end_headers()
-                self.wfile.write(payload)
-            except Exception as e:
-                self.send_error(500, f"WB status error: {e}")
-        elif path == "/wb/calibrate":
-            # One-click neutral-card calibration: compute & lock gains from last frame
-            try:
-                if not relay0:
-                    raise RuntimeError("Camera not available")
-                # ROI options: roi=center&size=0.4 (fraction of min dimension)
-                roi_mode = (qparams.get('roi', [''])[0] or '').lower()
-                size_f = float(qparams.get('size', [0.45])[0])
-                size_f = max(0.05, min(0.95, size_f))
-                r, g, b = relay0.calibrate_from_last_frame(roi_mode=roi_mode, size_fraction=size_f)
-                msg = f"Calibrated and locked WB (R,G,B)=({r:.3f},{g:.3f},{b:.3f})"
-                body = msg.encode("utf-8")
-                self.send_response(200)
-                self.send_header("Content-Type", "text/plain; charset=utf-8")
-                self.send_header("Content-Length", str(len(body)))
-                self.end_headers()
-                self.wfile.write(body)
-            except Exception as e:
-                self.send_error(500, f"Calibration failed: {e}")
-        elif path == "/wb/preview":
-            # Compute proposed gains without applying them (for UI/testing)
-            try:
-                if not relay0:
-                    raise RuntimeError("Camera not available")
-                roi_mode = (qparams.get('roi', [''])[0] or '').lower()
-                size_f = float(qparams.get('size', [0.45])[0])
-                size_f = max(0.05, min(0.95, size_f))
-                gains = relay0.preview_calibration(roi_mode=roi_mode, size_fraction=size_f)
-                import json
-                payload = json.dumps({
-                    "proposed_gains": {"r": gains[0], "g": gains[1], "b": gains[2]},
-                    "mode": relay0.wb_mode,
-                    "roi": roi_mode or "full",
-                    "size_fraction": size_f
-                }).encode("utf-8")
-                self.send_response(200)
-                self.send_header("Content-Type", "application/json")
-                self.send_header("Content-Length", str(len(payload)))
-                self.end_headers()
-                self.wfile.write(payload)
-            except Exception as e:
-                self.send_error(500, f"WB preview failed: {e}")
-        elif path == "/wb/locked":
-            try:
-                if not relay0:
-                    raise RuntimeError("Camera not available")
-                relay0.wb_mode = "locked"
-                msg = "WB mode set to locked"
-                body = msg.encode("utf-8")
-                self.send_response(200)
-                self.send_header("Content-Type", "text/plain; charset=utf-8")
-                self.send_header("Content-Length", str(len(body)))
-                self.end_headers()
-                self.wfile.write(body)
-            except Exception as e:
-                self.send_error(500, f"WB lock failed: {e}")
-        elif path == "/wb/auto":
-            try:
-                if not relay0:
-                    raise RuntimeError("Camera not available")
-                relay0.wb_mode = "auto_grayworld"
-                msg = "WB mode set to auto_grayworld"
-                body = msg.encode("utf-8")
-                self.send_response(200)
-                self.send_header("Content-Type", "text/plain; charset=utf-8")
-                self.send_header("Content-Length", str(len(body)))
-                self.end_headers()
-                self.wfile.write(body)
-            except Exception as e:
-                self.send_error(500, f"WB auto set failed: {e}")
-        elif path == "/wb/off":
+        # /stream1.mjpg, /wb/1/status, ... -> camera 1 and its own path
+        number, path = split_camera_path(path)
+        camera_relay = get_relay(number)
+        if number is not None and camera_relay is None and number > 0:
+            self.send_error(404, f"No camera {number}")
+            return
+        camera_description = camera_relay.name if camera_relay else "Pod"
+
+        if path == "/stream.mjpg":
+            # Handle a camera stream (/stream0.mjpg = Pod camera)
+            # Optional ?w=640&q=60&fps=2 selects a smaller / cheaper rendition
+            rendition = self._parse_rendition(qparams, camera_relay)
+            if rendition:
+                self._handle_rendition_stream_request(camera_relay, camera_description, *rendition)
+            else:
+                self._handle_stream_request(camera_relay, camera_description)
+        elif path == "/replay.mjpg":
+            # Time-shifted stream from the frame history: ?from=-60s&speed=1
             try:
-                if not relay0:
-                    raise RuntimeError("Camera not available")
-                relay0.wb_mode = "off"
-                relay0._wb_gains = [1.0, 1.0, 1.0]
-                msg = "WB mode set to off"
-                body = msg.encode("utf-8")
-                self.send_response(200)
-                self.send_header("Content-Type", "text/plain; charset=utf-8")
-                self.send_header("Content-Length", str(len(body)))
+                start, speed = parse_replay(qparams)
+            except ValueError as e:
+                self.send_error(400, str(e))
+                return
+            self._handle_replay_request(camera_relay, camera_description, start, speed)
+        else:
+            # Index page, WB controls, status endpoints (shared with the asyncio server)
+            response = simple_response(path, qparams, camera_relay, self.headers)
+            if response is None:
+                # Any other path: send a 404 Not Found error
+                self.send_error(404)
                 self.end_headers()
-                self.wfile.write(body)
-            except Exception as e:
-                self.send_error(500, f"WB off failed: {e}")
-        elif path == "/wb/clear":
-            try:
-                # Delete calibration file; set auto mode
-                base_dir = os.path.dirname(os.path.abspath(__file__))
-                pathf = os.path.join(base_dir, WB_CALIBRATION_FILE)
-                if os.path.exists(pathf):
-                    os.remove(pathf)
-                if relay0:
-                    relay0.wb_mode = "auto_grayworld"
-                msg = "WB calibration cleared; mode set to auto"
-                body = msg.encode("utf-8")
-                self.send_response(200)
-                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                return
+            status, headers, body = response
+            if status >= 400:
+                self.send_error(status, body.decode("utf-8"))
+                return
+            self.send_response(status)
+            for name, value in headers:
+                self.send_header(name, value)
+            if body:
                 self.send_header("Content-Length", str(len(body)))
-                self.end_headers()
-                self.wfile.write(body)
-            except Exception as e:
-                self.send_error(500, f"WB clear failed: {e}")
-        elif path == "/favicon.ico":
-            # Handle favicon requests to prevent 404 errors
-            self.send_response(204)  # No Content
             self.end_headers()
+            if body:
+                self.wfile.write(body)
+
+    @staticmethod
+    def _parse_rendition(qparams, camera_relay):
+        """Read w/q/fps query parameters. Returns (width, quality, fps) or None for the full stream."""
+        try:
+            width = int(qparams.get("w", [0])[0] or 0)
+            quality = int(qparams.get("q", [JPEG_QUALITY])[0] or JPEG_QUALITY)
+            fps = float(qparams.get("fps", [0])[0] or 0)
+        except (TypeError, ValueError):
+            return None
+        quality = max(10, min(95, quality))
+        max_fps = camera_relay.frame_rate if camera_relay else CAMERA_FRAME_RATE
+        fps = max(0.0, min(float(max_fps), fps))
+        if width <= 0 and quality == JPEG_QUALITY and fps == 0:
+            return None  # Nothing special requested: share the main encode
+        return (width, quality, fps)
+
+    def _send_to_client(self, client, published, part, live=True):
+        """Send one MJPEG part within STREAM_SEND_TIMEOUT and update the viewer's stats.
+        Returns the reason to drop this viewer ("send_timeout", "lag") or None.
+        Replayed frames (live=False) are old on purpose and don't count as lag.
+        """
+        deadline = time.monotonic() + STREAM_SEND_TIMEOUT if STREAM_SEND_TIMEOUT else None
+        try:
+            send_part(self.connection, *part, deadline=deadline)
+        except socket.timeout:
+            reason = "send_timeout"
         else:
-            # Any other path: send a 404 Not Found error
-            self.send_error(404)
-            self.end_headers()
+            client.delivered(published.seq, published.timestamp if live else None)
+            reason = MediaRelay.eviction_reason(client)
+        if reason:
+            logger.warning(
+                f"Dropping slow client {client.address} ({reason}): "
+                f"lag {client.lag:.1f}s, sent {client.sent}, skipped {client.skipped}"
+            )
+        return reason
+
+    def _handle_rendition_stream_request(self, camera_relay, camera_description, width, quality, fps):
+        """Handle MJPEG stream requests for a resized / re-compressed rendition.
+
+        All clients asking for the same (size, quality) share one resize+encode
+        per frame through camera_relay.renditions.
+        """
+        if camera_relay is None:
+            logger.error(
+                f"{camera_description} camera not available for {self.path}"
+            )
+            self.send_error(503, f"{camera_description} camera not available")
+            return
+
+        # Rendition viewers only need pixels, not the full-size JPEG
+        client = camera_relay.register_client("rendition", self.client_address[0])
+        StreamingHandler.active_stream_connections += 1
+        logger.info(
+            f"New {camera_description} rendition client connected from {self.client_address[0]} "
+            f"(w={width or 'full'} q={quality} fps={fps or 'max'}). "
+            f"Active connections: {StreamingHandler.active_stream_connections}"
+        )
+
+        self.send_response(200)
+        self.send_header("Age", "0")
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Pragma", "no-cache")
+        self.send_header("Content-Type", STREAM_CONTENT_TYPE)
+        self.end_headers()
+        min_interval = 1.0 / fps if fps > 0 else 0.0
+        last_sent = 0.0
+        seq = camera_relay.frame_seq  # Start with the next frame
+        evicted = None
+        limit_send_buffer(self.connection, STREAM_SEND_BUFFER_BYTES)
+        try:
+            while True:
+                published = camera_relay.get_frame_after(seq, timeout=1.0)
+                if published is None:
+                    continue
+                seq = published.seq
+                # Per-client frame rate limit: skip frames until it's our turn
+                now = time.monotonic()
+                if published.rendered is None or (min_interval and now - last_sent < min_interval):
+                    client.skip_to(seq)
+                    continue
+                part = camera_relay.renditions.get_part(
+                    seq, published.rendered, width, quality, published.timestamp
+                )
+                evicted = self._send_to_client(client, published, part)
+                if evicted:
+                    break
+                last_sent = now
+        except Exception as e:
+            logger.warning(
+                "Removed rendition client %s (%s): %s",
+                self.client_address,
+                camera_description,
+                str(e),
+            )
+        finally:
+            camera_relay.unregister_client(client, evicted)
+            StreamingHandler.active_stream_connections -= 1
+            logger.info(
+                f"{camera_description} rendition client {self.client_address[0]} disconnected from {self.path} "
+                f"(sent {client.sent}, skipped {client.skipped}). "
+                f"Active connections: {StreamingHandler.active_stream_connections}"
+            )
 
     def _handle_stream_request(self, camera_relay, camera_description):
         """Handle MJPEG stream requests for a specific camera relay."""
@@ -1164,6 +2564,9 @@ class StreamingHandler(server.BaseHTTPRequestHandler):
             self.send_error(503, f"{camera_description} camera not available")
             return
 
+        # Register with the relay so it encodes frames while we are connected
+        client = camera_relay.register_client("stream", self.client_address[0])
+
         # Increment the connection counter and log new connection
         StreamingHandler.active_stream_connections += 1
         logger.info(
@@ -1175,24 +2578,26 @@ class StreamingHandler(server.BaseHTTPRequestHandler):
         self.send_header("Age", "0")
         self.send_header("Cache-Control", "no-cache, private")
         self.send_header("Pragma", "no-cache")
-        self.send_header(
-            "Content-Type", "multipart/x-mixed-replace; boundary=FRAME"
-        )
+        self.send_header("Content-Type", STREAM_CONTENT_TYPE)
         self.end_headers()
+        seq = camera_relay.frame_seq  # Start with the next frame
+        evicted = None
+        limit_send_buffer(self.connection, STREAM_SEND_BUFFER_BYTES)
         try:
             while True:
-                # Get the latest frame from the specific MediaRelay
-                frame = camera_relay.get_frame()
-                if frame is not None:
-                    # Send the frame boundary marker
-                    self.wfile.write(b"--FRAME\r\n")
-                    # Send headers for this JPEG image
-                    self.send_header("Content-Type", "image/jpeg")
-                    self.send_header("Content-Length", str(len(frame)))
-                    self.end_headers()
-                    # Send the actual image data
-                    self.wfile.write(frame)
-                    self.wfile.write(b"\r\n")
+                # Get the newest frame we haven't sent yet, already packaged
+                # as (boundary + headers, JPEG) by the relay
+                published = camera_relay.get_frame_after(seq, timeout=1.0)
+                if published is None:
+                    continue
+                seq = published.seq
+                if published.part is None:
+                    client.skip_to(seq)  # Rendition-only frame, no full JPEG
+                    continue
+                # Boundary, headers, JPEG and trailing CRLF in one sendmsg()
+                evicted = self._send_to_client(client, published, published.part)
+                if evicted:
+                    break
         except Exception as e:
             # If the browser disconnects or there's a network error, log it
             logger.warning(
@@ -1203,9 +2608,66 @@ class StreamingHandler(server.BaseHTTPRequestHandler):
             )
         finally:
             # Decrement the connection counter when client disconnects
+            camera_relay.unregister_client(client, evicted)
+            StreamingHandler.active_stream_connections -= 1
+            logger.info(
+                f"{camera_description} streaming client {self.client_address[0]} disconnected from {self.path} "
+                f"(sent {client.sent}, skipped {client.skipped}). "
+                f"Active connections: {StreamingHandler.active_stream_connections}"
+            )
+
+    def _handle_replay_request(self, camera_relay, camera_description, start, speed):
+        """Handle /replay.mjpg: send recorded frames from `start` on at their original pace.
+
+        Frames come from camera_relay.history exactly as they were encoded
+        for the live stream. The replay stays the same distance behind live,
+        so the viewer keeps the relay encoding (and recording) like a live one.
+        """
+        history = camera_relay.history if camera_relay is not None else None
+        if history is None:
+            self.send_error(503, f"{camera_description} frame history not available (FRAME_HISTORY_BYTES is 0)")
+            return
+
+        client = camera_relay.register_client("replay", self.client_address[0])
+        StreamingHandler.active_stream_connections += 1
+        logger.info(
+            f"New {camera_description} replay client connected from {self.client_address[0]} "
+            f"(from {time.strftime('%H:%M:%S', time.localtime(start))}, speed {speed:g}). "
+            f"Active connections: {StreamingHandler.active_stream_connections}"
+        )
+
+        self.send_response(200)
+        self.send_header("Age", "0")
+        self.send_header("Cache-Control", "no-cache, private")
+        self.send_header("Pragma", "no-cache")
+        self.send_header("Content-Type", STREAM_CONTENT_TYPE)
+        self.end_headers()
+        cursor = ReplayCursor(history, start, speed)
+        evicted = None
+        limit_send_buffer(self.connection, STREAM_SEND_BUFFER_BYTES)
+        try:
+            while True:
+                frame, delay = cursor.next()
+                if delay:
+                    time.sleep(delay)
+                if frame is None:
+                    continue  # Caught up with the newest recorded frame
+                evicted = self._send_to_client(client, frame, frame.part, live=False)
+                if evicted:
+                    break
+        except Exception as e:
+            logger.warning(
+                "Removed replay client %s (%s): %s",
+                self.client_address,
+                camera_description,
+                str(e),
+            )
+        finally:
+            camera_relay.unregister_client(client, evicted)
             StreamingHandler.active_stream_connections -= 1
             logger.info(
-                f"{camera_description} streaming client {self.client_address[0]} disconnected from {self.path}. "
+                f"{camera_description} replay client {self.client_address[0]} disconnected "
+                f"(sent {client.sent}, skipped {client.skipped}). "
                 f"Active connections: {StreamingHandler.active_stream_connections}"
             )
 
@@ -1241,6 +2703,21 @@ class StreamingServer(socketserver.ThreadingMixIn, server.HTTPServer):
 # Global MediaRelay object that will be initialized in main()
 # relay0 for Pod camera (camera 0)
 relay0: Optional["MediaRelay"] = None  # Pod camera
+# Every camera by number (0, 1, ...) when several are configured (CAMERAS)
+cameras: Dict[int, "MediaRelay"] = {}
+
+
+def camera_registry():
+    """All cameras by number: `cameras`, or just relay0 as camera 0."""
+    if cameras:
+        return cameras
+    return {0: relay0} if relay0 is not None else {}
+
+
+def get_relay(number):
+    """MediaRelay for camera `number` (None = camera 0), or None if there is no such camera."""
+    return camera_registry().get(number or 0)
+
 
 # ====================== MAIN PROGRAM STARTS HERE ========================== #
 # This is where the actual program execution begins.
@@ -1310,6 +2787,39 @@ def find_working_camera():
     return (None, False)
 
 
+def start_configured_cameras(entries):
+    """
+    Open every camera listed in config.CAMERAS and register it in `cameras`.
+    A camera that fails to open is logged and skipped so the others still run.
+    """
+    # Each camera in its own process, or all in this one
+    relay_class = CameraWorkerRelay if ENABLE_CAMERA_PROCESSES else MediaRelay
+    for number, cam in enumerate(camera_configs(entries)):
+        use_libcamera = cam["backend"] == "libcamera"
+        if cam["backend"] == "auto" and LIBCAMERA_AVAILABLE and is_libcamera_available():
+            use_libcamera = cam["index"] in detect_csi_cameras()
+        relay = relay_class(
+            enable_overlay=cam["overlay"],
+            rotation_angle=cam["rotation"],
+            width=cam["width"],
+            height=cam["height"],
+            frame_rate=cam["fps"],
+            name=cam["name"],
+            # Camera 0 keeps the classic file name
+            wb_calibration_file=None if number == 0 else f"wb_calibration_{number}.json",
+        )
+        try:
+            relay.start_capture(camera_index=cam["index"], use_libcamera=use_libcamera)
+        except Exception as e:
+            logger.error(f"✗ {cam['name']} (camera {number}, device {cam['index']}) failed to initialize: {e}")
+            continue
+        cameras[number] = relay
+        logger.info(
+            f"✓ {cam['name']} ({'CSI' if use_libcamera else 'USB'} device {cam['index']}) "
+            f"available at /stream{number}.mjpg ({cam['width']}x{cam['height']} @ {cam['fps']} FPS)"
+        )
+
+
 def main():
     global relay0  # Declare relay as global so it can be accessed by StreamingHandler
 
@@ -1332,6 +2842,16 @@ def main():
     if LIBCAMERA_AVAILABLE:
         logger.info("Libcamera support available for CSI cameras")
     
+    if CAMERAS:
+        # Several cameras: one MediaRelay (and capture thread) per entry
+        start_configured_cameras(CAMERAS)
+        if not cameras:
+            logger.error("None of the cameras in config.CAMERAS could be initialized!")
+            exit(1)
+        relay0 = cameras.get(0)
+        serve(camera_registry())
+        return
+
     # Force USB mode if KNOWN_CAMERA_INDEX is set (user knows their camera)
     use_libcamera_0 = False
     if KNOWN_CAMERA_INDEX is not None:
@@ -1345,7 +2865,8 @@ def main():
             logger.info("Camera 0 detected as CSI camera")
 
     # Initialize camera relay for Pod (camera 0) with overlay enabled
-    relay0 = MediaRelay(
+    relay_class = CameraWorkerRelay if ENABLE_CAMERA_PROCESSES else MediaRelay
+    relay0 = relay_class(
         enable_overlay=True,
         rotation_angle=0,
         width=CAMERA_WIDTH,
@@ -1378,7 +2899,11 @@ def main():
 
     # Log camera availability
     logger.info("Pod camera available at: /stream0.mjpg")
+    serve(camera_registry())
+
 
+def serve(relays):
+    """Run the web server for `relays` ({camera number: MediaRelay}) until Ctrl+C."""
     # Now start the web server
     try:
         # Create the network address for our server
@@ -1388,13 +2913,18 @@ def main():
         address = ("", 8000)
 
         # Create the HTTP server object
-        # This combines our StreamingHandler (processes requests) with
-        # the StreamingServer (manages network connections)
-        server = StreamingServer(address, StreamingHandler)
+        if ENABLE_ASYNC_SERVER:
+            # One asyncio event loop serves every viewer (scales to hundreds)
+            server = AsyncStreamingServer(
+                address, relays, simple_response, StreamingHandler._parse_rendition, parse_replay
+            )
+            logger.info("Using asyncio streaming server (ENABLE_ASYNC_SERVER)")
+        else:
+            # This combines our StreamingHandler (processes requests) with
+            # the StreamingServer (manages network connections)
+            server = StreamingServer(address, StreamingHandler)
 
         # Get network information to display to the user
-        import socket  # Import here since we only need it once
-
         hostname = socket.gethostname()  # Get the computer's name
         try:
             # Try to get the computer's IP address on the local network
@@ -1405,9 +2935,10 @@ def main():
             logger.info(f"Pod camera view: http://localhost:8000/")
             logger.info(f"Network access: http://{local_ip}:8000/")
             logger.info(f"Raspberry Pi access: http://{hostname}.local:8000/")
-            logger.info(
-                f"Pod camera stream: http://{local_ip}:8000/stream0.mjpg"
-            )
+            for number, relay in sorted(relays.items()):
+                logger.info(
+                    f"{relay.name} camera stream: http://{local_ip}:8000/stream{number}.mjpg"
+                )
         except:
             # If we can't get the IP address, just show localhost
             logger.info(
@@ -1430,10 +2961,10 @@ def main():
         # This block always runs, even if an error occurred
         # It ensures we clean up resources properly
 
-        # Stop camera capture thread and close camera connection
-        if relay0:
-            relay0.stop()
-            logger.info("Pod camera stopped")
+        # Stop camera capture threads and close camera connections
+        for relay in relays.values():
+            relay.stop()
+            logger.info(f"{relay.name} camera stopped")
 
         logger.info("Cleanup completed. Goodbye!")
 
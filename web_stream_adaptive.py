@@ -0,0 +1,204 @@
+# ------------------------ WEB STREAM ADAPTIVE QUALITY --------------------- #
+"""
+Adaptive JPEG quality / output scale controller (ENABLE_ADAPTIVE_QUALITY):
+steps down when encoding, bitrate or viewers can't keep up, and back up
+when there is room.
+"""
+
+import time
+from threading import Lock
+
+
+class AdaptiveQuality:
+    """
+    Pick the JPEG quality and output scale for one camera.
+
+    The encoder calls settings() before and observe() after every frame;
+    both are cheap. Every `window` seconds observe() looks at the averages
+    and may change the settings. `client_stats` returns
+    MediaRelay.client_stats() for the viewer lag check.
+
+    Encoder pool threads call these concurrently, so every read and change
+    of the settings and counters happens under one lock.
+    """
+
+    def __init__(
+        self,
+        frame_rate,
+        max_quality,
+        min_quality=50,
+        quality_step=10,
+        scales=(1.0, 0.75, 0.5),
+        target_kbps=None,
+        encode_budget=0.5,
+        max_lag=1.0,
+        window=2.0,
+        up_windows=3,
+        down_windows=2,
+        client_stats=None,
+    ):
+        self.frame_interval = 1.0 / max(0.1, float(frame_rate))
+        self.max_quality = int(max_quality)
+        self.min_quality = max(1, min(int(min_quality), self.max_quality))
+        self.quality_step = max(1, int(quality_step))
+        self.scales = sorted({float(s) for s in scales if 0 < float(s) <= 1.0} | {1.0}, reverse=True)
+        self.target_kbps = target_kbps
+        self.encode_budget = float(encode_budget)  # Share of the frame interval
+        self.max_lag = float(max_lag)
+        self.window = float(window)
+        self.up_windows = max(1, int(up_windows))
+        self.down_windows = max(1, int(down_windows))
+        self._client_stats = client_stats
+
+        self.quality = self.max_quality
+        self.scale_index = 0  # Into self.scales (0 = full size)
+        self._lock = Lock()
+        self._reset_window(time.monotonic())
+        self._good_windows = 0
+        self._bad_windows = 0
+        self._up_backoff = 1  # Multiplies up_windows after failed step-ups
+        self._windows = 0  # Windows evaluated so far
+        self._last_up_window = None  # Window of the last step up
+        self._last_skipped = None
+        self._last_sent = None
+        self.changes = 0
+        self.last_change = None  # (direction, reason) of the last step
+        self.last_window = {}  # Averages the last decision was based on
+
+    @property
+    def scale(self):
+        return self.scales[self.scale_index]
+
+    def settings(self):
+        """(JPEG quality, output scale) for the next frame."""
+        with self._lock:
+            return self.quality, self.scales[self.scale_index]
+
+    def _reset_window(self, now):
+        self._window_start = now
+        self._encode_times = []
+        self._bytes = 0
+
+    def observe(self, encode_seconds, frame_bytes):
+        """Record one encoded frame; re-evaluate at the end of each window."""
+        with self._lock:
+            self._encode_times.append(encode_seconds)
+            self._bytes += frame_bytes
+            now = time.monotonic()
+            elapsed = now - self._window_start
+            if elapsed < self.window:
+                return
+            encode_times, total_bytes = self._encode_times, self._bytes
+            self._reset_window(now)
+        # Viewer counts come from the relay's own locks: read them before
+        # taking ours, so the two locks are never held in opposite orders
+        client_stats = self._client_stats() if self._client_stats is not None else None
+        with self._lock:
+            self._evaluate(encode_times, total_bytes, elapsed, client_stats)
+
+    # --------------------------- DECISIONS -------------------------------- #
+    def _viewer_lag(self, stats):
+        """(share of frames full-size viewers skipped this window, worst lag s)."""
+        if stats is None:
+            return 0.0, 0.0
+        viewers = [v for v in stats["viewers"] if v["kind"] == "stream"]
+        sent = sum(v["sent"] for v in viewers)
+        skipped = sum(v["skipped"] for v in viewers)
+        ratio = 0.0
+        if self._last_sent is not None and sent >= self._last_sent:
+            new_sent, new_skipped = sent - self._last_sent, skipped - self._last_skipped
+            ratio = new_skipped / max(1, new_sent + new_skipped)
+        self._last_sent, self._last_skipped = sent, skipped
+        worst = max((v["lag_ms"] for v in viewers), default=0.0) / 1000.0
+        return ratio, worst
+
+    def _evaluate(self, encode_times, total_bytes, elapsed, client_stats):
+        """Decide on one window's averages (called with the lock held)."""
+        encode_avg = sorted(encode_times)[len(encode_times) // 2]  # Median
+        fps = len(encode_times) / elapsed
+        kbps = 8.0 * total_bytes / elapsed / 1000.0
+        skip_ratio, worst_lag = self._viewer_lag(client_stats)
+        self._windows += 1
+        budget = self.encode_budget * self.frame_interval
+        self.last_window = {
+            "fps": round(fps, 2),
+            "encode_ms": round(1000.0 * encode_avg, 2),
+            "encode_budget_ms": round(1000.0 * budget, 2),
+            "kbps": round(kbps, 1),
+            "viewer_skip_ratio": round(skip_ratio, 3),
+            "viewer_worst_lag_ms": round(1000.0 * worst_lag, 1),
+        }
+
+        # Too slow / too big: any one reason is enough to step down
+        reason = None
+        if encode_avg > budget:
+            reason = "encode_time"
+        elif self.target_kbps and kbps > self.target_kbps:
+            reason = "bitrate"
+        elif skip_ratio > 0.25 or worst_lag > self.max_lag:
+            reason = "viewer_lag"
+        if reason:
+            self._good_windows = 0
+            self._bad_windows += 1
+            if self._bad_windows >= self.down_windows:
+                self._bad_windows = 0
+                self._step_down(reason)
+            return
+        self._bad_windows = 0
+
+        # Comfortably inside every limit: count towards stepping back up
+        comfortable = (
+            encode_avg < 0.6 * budget
+            and (not self.target_kbps or kbps < 0.7 * self.target_kbps)
+            and skip_ratio < 0.05
+            and worst_lag < 0.5 * self.max_lag
+        )
+        self._good_windows = self._good_windows + 1 if comfortable else 0
+        if self._good_windows >= self.up_windows * self._up_backoff:
+            self._good_windows = 0
+            self._step_up()
+
+    def _step_down(self, reason):
+        # Taking back a step up right away (the bad windows that led here
+        # started just after it): wait longer before the next one
+        recent = self._last_up_window is not None and (
+            self._windows - self._last_up_window <= self.down_windows + 1
+        )
+        if recent:
+            self._up_backoff = min(16, self._up_backoff * 2)
+        self._last_up_window = None
+        if self.quality > self.min_quality:
+            self.quality = max(self.min_quality, self.quality - self.quality_step)
+        elif self.scale_index < len(self.scales) - 1:
+            self.scale_index += 1
+        else:
+            return  # Already at the lowest settings
+        self.changes += 1
+        self.last_change = ("down", reason)
+
+    def _step_up(self):
+        if self.scale_index > 0:
+            self.scale_index -= 1
+        elif self.quality < self.max_quality:
+            self.quality = min(self.max_quality, self.quality + self.quality_step)
+        else:
+            return  # Already at full quality and size
+        self.changes += 1
+        self.last_change = ("up", "headroom")
+        self._last_up_window = self._windows
+        if self.scale_index == 0 and self.quality == self.max_quality:
+            self._up_backoff = 1  # Fully recovered
+
+    def stats(self):
+        """Current settings and the last window's averages (JSON friendly)."""
+        with self._lock:
+            return {
+                "quality": self.quality,
+                "scale": self.scale,
+                "quality_range": [self.min_quality, self.max_quality],
+                "scales": self.scales,
+                "changes": self.changes,
+                "up_after_windows": self.up_windows * self._up_backoff,
+                "last_change": list(self.last_change) if self.last_change else None,
+                "last_window": dict(self.last_window),
+            }
@@ -0,0 +1,367 @@
+# ---------------------- ASYNCIO STREAMING SERVER -------------------------- #
+"""
+Single-threaded asyncio alternative to StreamingServer in web_stream.py:
+one event loop serves every viewer instead of one OS thread per viewer.
+Non-stream endpoints reuse simple_response() in a worker thread.
+"""
+
+import asyncio
+import io
+import logging
+import time
+from http import HTTPStatus
+from http.client import parse_headers
+from threading import Event
+from urllib.parse import parse_qs
+
+from config import STREAM_SEND_BUFFER_BYTES, STREAM_SEND_TIMEOUT
+from web_stream_cameras import split_camera_path
+from web_stream_history import ReplayCursor
+from web_stream_multipart import PART_TRAILER, STREAM_CONTENT_TYPE, limit_send_buffer
+
+logger = logging.getLogger("web_stream")
+
+# Largest request line + headers we accept (browsers send well under 8 kB)
+MAX_REQUEST_HEAD = 16 * 1024
+
+STREAM_RESPONSE_HEAD = (
+    b"HTTP/1.0 200 OK\r\n"
+    b"Age: 0\r\n"
+    b"Cache-Control: no-cache, private\r\n"
+    b"Pragma: no-cache\r\n"
+    b"Content-Type: " + STREAM_CONTENT_TYPE.encode("ascii") + b"\r\n"
+    b"\r\n"
+)
+
+
+class _FrameFeed:
+    """One camera as seen by the event loop: its newest frame and the Future
+    resolved with the next one."""
+
+    __slots__ = ("relay", "latest", "future", "listener")
+
+    def __init__(self, relay):
+        self.relay = relay
+        self.latest = None
+        self.future = None
+        self.listener = None
+
+
+class AsyncStreamingServer:
+    """
+    MJPEG + control page server running on one asyncio event loop.
+
+    Usage mirrors StreamingServer: build it, then call serve_forever()
+    (blocks until shutdown() is called or Ctrl+C).
+
+    `relays` is {camera number: MediaRelay} (a single MediaRelay is camera 0).
+
+    `respond(path, qparams, relay, headers)` builds non-stream replies,
+    `parse_rendition(qparams, relay)` reads ?w=&q=&fps= and
+    `parse_replay(qparams)` reads ?from=&speed=; all come from web_stream.py
+    so this module doesn't need to import it.
+    """
+
+    def __init__(self, address, relays, respond, parse_rendition, parse_replay=None, camera_description="Pod"):
+        self.host, self.port = address
+        if relays is None:
+            relays = {}
+        elif not isinstance(relays, dict):
+            relays = {0: relays}
+        self.relays = relays
+        self._respond = respond
+        self._parse_rendition = parse_rendition
+        self._parse_replay = parse_replay
+        self.camera_description = camera_description
+        self.active_stream_connections = 0
+        self.frames_dispatched = 0  # Frames handed from the pipeline to the loop
+        self.started = Event()  # Set once the socket is listening (self.port is then final)
+        self._loop = None
+        self._server = None
+        # Per camera: newest PublishedFrame seen by the loop, and a Future
+        # resolved with the next one
+        self._feeds = {number: _FrameFeed(relay) for number, relay in relays.items()}
+
+    # ----------------------- FRAME HANDOFF -------------------------------- #
+    def _on_frame_published(self, feed):
+        """Frame listener: runs on a camera's capture/encode thread after each publish."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._wake_viewers, feed, feed.relay.latest_frame)
+        except RuntimeError:
+            pass  # Loop closed between the check and the call
+
+    def _wake_viewers(self, feed, published):
+        """Runs on the event loop: give the frame to everyone waiting for one."""
+        feed.latest = published
+        future = feed.future
+        feed.future = self._loop.create_future()
+        self.frames_dispatched += 1
+        if not future.done():
+            future.set_result(published)
+
+    async def _next_frame(self, feed, seq):
+        """Return the camera's newest PublishedFrame after `seq` (waiting for one if needed)."""
+        latest = feed.latest
+        if latest is not None and latest.seq > seq:
+            return latest  # This viewer fell behind: jump straight to the newest
+        # shield(): a viewer that disconnects must not cancel the shared Future
+        return await asyncio.shield(feed.future)
+
+    # ------------------------- CONNECTIONS -------------------------------- #
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername")
+        client_ip = peer[0] if peer else "?"
+        try:
+            try:
+                # A client that connects and never finishes its request
+                # (or sends endless headers) would hold the socket forever
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), STREAM_SEND_TIMEOUT or None)
+            except asyncio.TimeoutError:
+                logger.debug("Async request from %s: no request headers in time", client_ip)
+                return
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            request_line, _, header_block = head.partition(b"\r\n")
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                await self._send_response(writer, 400, [], b"Bad request syntax")
+                return
+            method, target = parts[0], parts[1]
+            if method != "GET":
+                await self._send_response(writer, 501, [], f"Unsupported method ({method!r})".encode("utf-8"))
+                return
+            path, _, query = target.partition("?")
+            qparams = parse_qs(query)
+            # /stream1.mjpg, /wb/1/status, ... -> camera 1 and its own path
+            number, path = split_camera_path(path)
+            relay = self.relays.get(number or 0)
+            if number and relay is None:
+                await self._send_response(writer, 404, [], f"No camera {number}".encode("utf-8"))
+                return
+
+            if path == "/stream.mjpg":
+                # Optional ?w=640&q=60&fps=2 selects a smaller / cheaper rendition
+                rendition = self._parse_rendition(qparams, relay)
+                await self._stream(writer, client_ip, target, number or 0, rendition)
+                return
+            if path == "/replay.mjpg" and self._parse_replay is not None:
+                try:
+                    start, speed = self._parse_replay(qparams)
+                except ValueError as e:
+                    await self._send_response(writer, 400, [], str(e).encode("utf-8"))
+                    return
+                await self._replay(writer, client_ip, relay, start, speed)
+                return
+
+            headers = parse_headers(io.BytesIO(header_block))
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(None, self._respond, path, qparams, relay, headers)
+            if response is None:
+                response = (404, [], b"Nothing matches the given URI")
+            await self._send_response(writer, *response)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            logger.warning("Async request from %s failed: %s", client_ip, e)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def _send_response(self, writer, status, headers, body):
+        """Send a complete (non-stream) reply; errors get a plain-text body."""
+        if status >= 400:
+            headers = [("Content-Type", "text/plain; charset=utf-8")]
+        lines = [f"HTTP/1.0 {status} {HTTPStatus(status).phrase}", "Connection: close"]
+        lines += [f"{name}: {value}" for name, value in headers]
+        if body:
+            lines.append(f"Content-Length: {len(body)}")
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        if body:
+            writer.write(body)
+        await writer.drain()
+
+    async def _stream(self, writer, client_ip, path, number, rendition):
+        """Send MJPEG parts from camera `number` to one viewer until it disconnects."""
+        feed = self._feeds.get(number)
+        if feed is None:
+            logger.error(f"{self.camera_description} camera not available for {path}")
+            await self._send_response(
+                writer, 503, [], f"{self.camera_description} camera not available".encode("utf-8")
+            )
+            return
+        relay = feed.relay
+        name = relay.name
+
+        # Rendition viewers only need pixels, not the full-size JPEG
+        kind = "rendition" if rendition else "stream"
+        width, quality, fps = rendition or (0, 0, 0.0)
+        min_interval = 1.0 / fps if fps > 0 else 0.0
+        last_sent = 0.0
+        loop = asyncio.get_running_loop()
+
+        client = relay.register_client(kind, client_ip)
+        seq = relay.frame_seq  # Start with the next frame
+        evicted = None
+        # Per-viewer send budget: small kernel buffer, and at most about one
+        # frame waiting in the transport before drain() makes us wait
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            limit_send_buffer(sock, STREAM_SEND_BUFFER_BYTES)
+        if STREAM_SEND_BUFFER_BYTES:
+            writer.transport.set_write_buffer_limits(high=STREAM_SEND_BUFFER_BYTES)
+        self.active_stream_connections += 1
+        logger.info(
+            f"New {name} {kind} client connected from {client_ip} requesting {path}. "
+            f"Active connections: {self.active_stream_connections}"
+        )
+        try:
+            writer.write(STREAM_RESPONSE_HEAD)
+            while True:
+                published = await self._next_frame(feed, seq)
+                seq = published.seq
+                part = published.part
+                if rendition:
+                    # Per-client frame rate limit: skip frames until it's our turn
+                    now = time.monotonic()
+                    if published.rendered is None or (min_interval and now - last_sent < min_interval):
+                        client.skip_to(seq)
+                        continue
+                    # Resize + encode off the loop (shared across viewers by the cache)
+                    part = await loop.run_in_executor(
+                        None, relay.renditions.get_part, seq, published.rendered, width, quality,
+                        published.timestamp,
+                    )
+                    last_sent = now
+                elif part is None:
+                    client.skip_to(seq)  # Rendition-only frame, no full JPEG
+                    continue
+                # Shared header + JPEG, no per-viewer formatting (on Python 3.12+
+                # writelines() sends the buffers with one sendmsg() call)
+                header, payload = part
+                writer.writelines((header, payload, PART_TRAILER))
+                # Waits only while this viewer's socket buffer is full
+                try:
+                    await asyncio.wait_for(writer.drain(), STREAM_SEND_TIMEOUT or None)
+                except asyncio.TimeoutError:
+                    evicted = "send_timeout"
+                else:
+                    client.delivered(seq, published.timestamp)
+                    evicted = relay.eviction_reason(client)
+                if evicted:
+                    logger.warning(
+                        f"Dropping slow client {client_ip} ({evicted}): "
+                        f"lag {client.lag:.1f}s, sent {client.sent}, skipped {client.skipped}"
+                    )
+                    break
+        except (ConnectionError, asyncio.CancelledError) as e:
+            logger.warning("Removed streaming client %s (%s): %s", client_ip, name, e)
+        finally:
+            relay.unregister_client(client, evicted)
+            self.active_stream_connections -= 1
+            logger.info(
+                f"{name} {kind} client {client_ip} disconnected from {path} "
+                f"(sent {client.sent}, skipped {client.skipped}). "
+                f"Active connections: {self.active_stream_connections}"
+            )
+
+    async def _replay(self, writer, client_ip, relay, start, speed):
+        """Send recorded frames from relay.history, starting at `start`, at their original pace."""
+        history = relay.history if relay is not None else None
+        if history is None:
+            await self._send_response(
+                writer, 503, [], f"{self.camera_description} frame history not available".encode("utf-8")
+            )
+            return
+        name = relay.name
+
+        # Counts as a consumer: the replay trails live, so recording must go on
+        client = relay.register_client("replay", client_ip)
+        cursor = ReplayCursor(history, start, speed)
+        evicted = None
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            limit_send_buffer(sock, STREAM_SEND_BUFFER_BYTES)
+        if STREAM_SEND_BUFFER_BYTES:
+            writer.transport.set_write_buffer_limits(high=STREAM_SEND_BUFFER_BYTES)
+        self.active_stream_connections += 1
+        logger.info(
+            f"New {name} replay client connected from {client_ip}. "
+            f"Active connections: {self.active_stream_connections}"
+        )
+        try:
+            writer.write(STREAM_RESPONSE_HEAD)
+            while True:
+                frame, delay = cursor.next()
+                if delay:
+                    await asyncio.sleep(delay)
+                if frame is None:
+                    continue  # Caught up with the newest recorded frame
+                header, payload = frame.part
+                writer.writelines((header, payload, PART_TRAILER))
+                try:
+                    await asyncio.wait_for(writer.drain(), STREAM_SEND_TIMEOUT or None)
+                except asyncio.TimeoutError:
+                    evicted = "send_timeout"
+                    logger.warning(f"Dropping slow replay client {client_ip} ({evicted})")
+                    break
+                client.delivered(frame.seq)  # Old on purpose: not counted as lag
+        except (ConnectionError, asyncio.CancelledError) as e:
+            logger.warning("Removed replay client %s (%s): %s", client_ip, name, e)
+        finally:
+            relay.unregister_client(client, evicted)
+            self.active_stream_connections -= 1
+            logger.info(
+                f"{name} replay client {client_ip} disconnected "
+                f"(sent {client.sent}, skipped {client.skipped}). "
+                f"Active connections: {self.active_stream_connections}"
+            )
+
+    # -------------------------- LIFECYCLE --------------------------------- #
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        for feed in self._feeds.values():
+            feed.future = self._loop.create_future()
+        self._server = await asyncio.start_server(
+            self._handle_connection,
+            self.host or None,
+            self.port,
+            reuse_address=True,
+            backlog=1024,
+            limit=MAX_REQUEST_HEAD,
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        for feed in self._feeds.values():
+            feed.listener = lambda feed=feed: self._on_frame_published(feed)
+            feed.relay.add_frame_listener(feed.listener)
+        self.started.set()
+        try:
+            await self._server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            for feed in self._feeds.values():
+                feed.relay.remove_frame_listener(feed.listener)
+
+    def serve_forever(self):
+        """Run the event loop in this thread until shutdown() (or Ctrl+C)."""
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        """Stop serve_forever() (safe to call from any thread)."""
+        loop, srv = self._loop, self._server
+        if loop is not None and srv is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(srv.close)
+
+    def stats(self):
+        """Connection counters as a plain dict (JSON friendly)."""
+        return {
+            "server": "asyncio",
+            "active_stream_connections": self.active_stream_connections,
+            "frames_dispatched": self.frames_dispatched,
+        }
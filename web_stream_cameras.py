@@ -0,0 +1,68 @@
+# ------------------------ WEB STREAM CAMERA LIST -------------------------- #
+"""
+Camera list (CAMERAS in config.py) and URL routing for serving several
+cameras from one server: /stream{n}.mjpg, /snapshot{n}.jpg, /wb/{n}/...
+The old single-camera URLs still mean camera 0.
+"""
+
+import re
+
+from config import CAMERA_FRAME_RATE, CAMERA_HEIGHT, CAMERA_WIDTH
+
+BACKENDS = ("auto", "v4l2", "libcamera")
+
+# Camera number in the path -> path relative to that camera
+_CAMERA_ROUTES = [
+    (re.compile(r"^/stream(\d+)\.mjpg$"), "/stream.mjpg"),
+    (re.compile(r"^/snapshot(\d+)\.jpg$"), "/snapshot.jpg"),
+    (re.compile(r"^/replay(\d+)\.mjpg$"), "/replay.mjpg"),
+    (re.compile(r"^/frames/(\d+)(/.+)$"), "/frames"),
+    (re.compile(r"^/wb/(\d+)(/.+)$"), "/wb"),
+    (re.compile(r"^/pipeline/(\d+)(/.+)$"), "/pipeline"),
+]
+
+
+def split_camera_path(path):
+    """
+    Return (camera number, path for that camera) for a request path.
+
+    "/stream1.mjpg" -> (1, "/stream.mjpg"), "/wb/2/status" -> (2, "/wb/status").
+    Paths without a camera number belong to camera 0 and are returned as-is
+    (the number is None so callers can tell "/wb/status" from "/wb/0/status").
+    """
+    for pattern, prefix in _CAMERA_ROUTES:
+        match = pattern.match(path)
+        if match:
+            rest = match.group(2) if pattern.groups > 1 else ""
+            return int(match.group(1)), prefix + rest
+    return None, path
+
+
+def camera_configs(entries):
+    """
+    Fill in defaults for the CAMERAS entries in config.py.
+
+    Returns a list of dicts with every key present: index, backend, width,
+    height, fps, rotation, overlay and name. Raises ValueError for an entry
+    that can't work (unknown backend, bad rotation).
+    """
+    configs = []
+    for number, entry in enumerate(entries):
+        entry = dict(entry)
+        backend = str(entry.get("backend", "auto")).lower()
+        if backend not in BACKENDS:
+            raise ValueError(f"camera {number}: backend must be one of {BACKENDS}, not {backend!r}")
+        rotation = int(entry.get("rotation", 0))
+        if rotation not in (0, 90, 180, 270):
+            raise ValueError(f"camera {number}: rotation must be 0, 90, 180 or 270")
+        configs.append({
+            "index": int(entry.get("index", number)),
+            "backend": backend,
+            "width": int(entry.get("width", CAMERA_WIDTH)),
+            "height": int(entry.get("height", CAMERA_HEIGHT)),
+            "fps": float(entry.get("fps", CAMERA_FRAME_RATE)),
+            "rotation": rotation,
+            "overlay": bool(entry.get("overlay", number == 0)),
+            "name": str(entry.get("name", f"Camera {number}")),
+        })
+    return configs
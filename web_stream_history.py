@@ -0,0 +1,150 @@
+# ------------------------ WEB STREAM FRAME HISTORY ------------------------ #
+"""
+Byte-capped in-memory history of recently encoded JPEGs for time-shift
+replay (/replay.mjpg?from=-60s) and single past frames (/frames/<time>.jpg).
+"""
+
+import bisect
+import re
+import time
+from collections import deque, namedtuple
+from threading import Lock
+
+# One recorded frame: sequence number, capture time (time.time()), JPEG
+# bytes, and the ready-to-send (multipart header, payload) pair
+HistoryFrame = namedtuple("HistoryFrame", "seq timestamp jpeg part")
+
+# Bookkeeping per frame (tuple, list slots, ...) counted against the budget
+_FRAME_OVERHEAD = 200
+
+# A jump in capture times longer than this (the camera was paused because
+# nobody was watching) is skipped during replay instead of waited out
+REPLAY_MAX_GAP_SECONDS = 2.0
+
+_RELATIVE_TIME = re.compile(r"^-(\d+(?:\.\d+)?)(s|m|h)?$")
+_UNIT_SECONDS = {None: 1.0, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_time(value, now=None):
+    """
+    Turn a time from a URL into a time.time() timestamp.
+
+    Accepts relative times ("-60s", "-5m", "-1h", "-90" = seconds ago) and
+    absolute Unix timestamps ("1760000000.25"). Raises ValueError otherwise.
+    """
+    value = (value or "").strip()
+    match = _RELATIVE_TIME.match(value)
+    if match:
+        seconds = float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+        return (time.time() if now is None else now) - seconds
+    timestamp = float(value)
+    if not timestamp > 0:
+        raise ValueError(f"invalid timestamp: {value!r}")
+    return timestamp
+
+
+class FrameHistory:
+    """
+    Byte-budgeted ring buffer of encoded frames, oldest first.
+
+    add() is called by the publishing thread; lookups come from web request
+    threads, so everything happens under one short lock.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._frames = deque()
+        self._timestamps = deque()  # Parallel to _frames, for bisect
+        self._lock = Lock()
+        self.total_bytes = 0
+        self.added = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _size(frame):
+        return len(frame.jpeg) + len(frame.part[0]) + _FRAME_OVERHEAD
+
+    def add(self, seq, timestamp, jpeg, part):
+        """Record a frame, dropping the oldest ones to stay within max_bytes."""
+        frame = HistoryFrame(seq, timestamp, jpeg, part)
+        size = self._size(frame)
+        if size > self.max_bytes:
+            return  # Larger than the whole budget: never fits
+        with self._lock:
+            if self._timestamps and timestamp < self._timestamps[-1]:
+                timestamp = self._timestamps[-1]  # Keep timestamps sorted for bisect
+                frame = frame._replace(timestamp=timestamp)
+            while self._frames and self.total_bytes + size > self.max_bytes:
+                old = self._frames.popleft()
+                self._timestamps.popleft()
+                self.total_bytes -= self._size(old)
+                self.evicted += 1
+            self._frames.append(frame)
+            self._timestamps.append(timestamp)
+            self.total_bytes += size
+            self.added += 1
+
+    def frame_at(self, timestamp):
+        """The frame that was live at `timestamp` (newest one captured at or
+        before it), or None if that is older than everything recorded."""
+        with self._lock:
+            index = bisect.bisect_right(self._timestamps, timestamp) - 1
+            return self._frames[index] if index >= 0 else None
+
+    def frame_after(self, timestamp):
+        """The first frame captured after `timestamp`, or None if there is none yet.
+        If `timestamp` has already fallen out of the buffer this is the oldest frame."""
+        with self._lock:
+            index = bisect.bisect_right(self._timestamps, timestamp)
+            return self._frames[index] if index < len(self._frames) else None
+
+    def stats(self):
+        """Size and time span as a plain dict (JSON friendly)."""
+        with self._lock:
+            oldest = self._timestamps[0] if self._timestamps else None
+            newest = self._timestamps[-1] if self._timestamps else None
+            return {
+                "frames": len(self._frames),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "oldest": oldest,
+                "newest": newest,
+                "span_s": round(newest - oldest, 1) if oldest is not None else 0.0,
+                "added": self.added,
+                "evicted": self.evicted,
+            }
+
+
+class ReplayCursor:
+    """
+    Walks through a FrameHistory at the original pace, starting at `start`.
+
+    The replay keeps a fixed delay behind live: a viewer that asks for
+    from=-60s keeps seeing what happened 60 seconds ago, because new frames
+    keep arriving in the history while older ones are played.
+    """
+
+    def __init__(self, history, start, speed=1.0):
+        self.history = history
+        self.speed = max(0.1, float(speed))
+        self.position = start  # Timestamp of the last frame handed out
+        self._clock_start = time.monotonic()
+        self._replay_start = start
+
+    def next(self):
+        """
+        Return (frame, delay): send `frame` after waiting `delay` seconds.
+        frame is None when the replay has caught up with the newest recorded
+        frame; wait `delay` seconds and ask again.
+        """
+        frame = self.history.frame_after(self.position)
+        if frame is None:
+            return None, 0.1
+        if frame.timestamp - self.position > REPLAY_MAX_GAP_SECONDS:
+            # Jumped over a pause in recording (or frames that were
+            # evicted under us): play on from here without waiting
+            self._clock_start = time.monotonic()
+            self._replay_start = frame.timestamp
+        self.position = frame.timestamp
+        due = self._clock_start + (frame.timestamp - self._replay_start) / self.speed
+        return frame, max(0.0, due - time.monotonic())
@@ -0,0 +1,210 @@
+# ------------------------- WEB STREAM METRICS ----------------------------- #
+"""
+Lock-free counters and histograms for the capture pipeline, and the
+Prometheus text format behind /metrics.
+"""
+
+import bisect
+import functools
+import threading
+import time
+from collections import deque
+
+from config import ENABLE_STAGE_TIMING
+
+# Seconds, for per-stage latency
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Bytes, for encoded JPEG sizes
+JPEG_BYTES_BUCKETS = tuple(k * 1024 for k in (16, 32, 64, 128, 256, 512, 1024, 2048))
+
+# Pipeline stages timed by MediaRelay, in pipeline order ("overlay" is the
+# label, "badge" the DAY/NIGHT corner label drawn after rotation)
+STAGES = ("read", "analyze", "color", "overlay", "rotate", "badge", "encode", "publish")
+
+
+class Histogram:
+    """Fixed-bucket histogram with one lock-free shard per recording thread."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []  # Every shard ever made (list.append is atomic)
+
+    def observe(self, value):
+        """Record one measurement (called from any thread, no lock)."""
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            # Per-bucket counts, the +Inf bucket, then the running sum
+            shard = self._local.shard = [0] * (len(self.buckets) + 1) + [0.0]
+            self._shards.append(shard)
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self):
+        """Totals over all shards: {"buckets", "counts" (cumulative), "count", "sum"}."""
+        per_bucket = [0] * (len(self.buckets) + 1)
+        total = 0.0
+        for shard in list(self._shards):
+            for i in range(len(per_bucket)):
+                per_bucket[i] += shard[i]
+            total += shard[-1]
+        cumulative, running = [], 0
+        for count in per_bucket:
+            running += count
+            cumulative.append(running)
+        return {"buckets": list(self.buckets), "counts": cumulative, "count": running, "sum": total}
+
+
+class RateMeter:
+    """Events per second over the most recent events (e.g. frames)."""
+
+    def __init__(self, window=64, max_age=2.0):
+        self._times = deque(maxlen=window)  # deque.append is atomic
+        self.max_age = max_age
+
+    def mark(self):
+        self._times.append(time.monotonic())
+
+    def rate(self):
+        times = list(self._times)
+        if len(times) < 2 or time.monotonic() - times[-1] > self.max_age:
+            return 0.0  # Stopped (e.g. nobody watching)
+        return (len(times) - 1) / max(1e-6, times[-1] - times[0])
+
+
+def timed_stage(stage):
+    """
+    Decorator for MediaRelay stage methods: adds the method's run time to
+    self.metrics.stages[stage]. Decided once, when the class is defined:
+    with ENABLE_STAGE_TIMING off the method is returned unchanged.
+    """
+    def decorate(method):
+        if not ENABLE_STAGE_TIMING:
+            return method
+
+        @functools.wraps(method)
+        def timed(self, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self.metrics.stages[stage].observe(time.perf_counter() - started)
+        return timed
+    return decorate
+
+
+class PipelineMetrics:
+    """Every hot-path measurement MediaRelay records for one camera."""
+
+    def __init__(self):
+        self.stages = {stage: Histogram(STAGE_BUCKETS) for stage in STAGES}
+        self.jpeg_bytes = Histogram(JPEG_BYTES_BUCKETS)
+        self.capture_rate = RateMeter()
+        self.publish_rate = RateMeter()
+
+    def snapshot(self):
+        return {
+            "stages": {stage: hist.snapshot() for stage, hist in self.stages.items()},
+            "jpeg_bytes": self.jpeg_bytes.snapshot(),
+            "capture_fps": self.capture_rate.rate(),
+            "publish_fps": self.publish_rate.rate(),
+        }
+
+
+# --------------------------- TEXT FORMAT ---------------------------------- #
+def _labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{str(value)}"'.replace("\n", " ") for key, value in labels.items())
+    return "{" + inner + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float):
+        return repr(round(value, 9))
+    return str(int(value))
+
+
+class _Families:
+    """Collects samples per metric family so HELP/TYPE are written once."""
+
+    def __init__(self):
+        self._families = {}  # name -> (type, help, [lines])
+
+    def add(self, kind, name, help_text, labels, value):
+        family = self._families.setdefault(name, (kind, help_text, []))
+        family[2].append(f"{name}{_labels(labels)} {_number(value)}")
+
+    def histogram(self, name, help_text, labels, snapshot):
+        family = self._families.setdefault(name, ("histogram", help_text, []))
+        lines = family[2]
+        for bound, count in zip(snapshot["buckets"] + [float("inf")], snapshot["counts"]):
+            lines.append(f"{name}_bucket{_labels(dict(labels, le=_number(float(bound))))} {count}")
+        lines.append(f"{name}_sum{_labels(labels)} {_number(float(snapshot['sum']))}")
+        lines.append(f"{name}_count{_labels(labels)} {snapshot['count']}")
+
+    def text(self):
+        out = []
+        for name, (kind, help_text, lines) in self._families.items():
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {kind}")
+            out.extend(lines)
+        return "\n".join(out) + "\n"
+
+
+def render_prometheus(snapshots):
+    """
+    Prometheus text format (version 0.0.4) for {camera number: snapshot}
+    as returned by MediaRelay.metrics_snapshot().
+    """
+    f = _Families()
+    for number, snap in sorted(snapshots.items()):
+        cam = {"camera": str(number)}
+        f.add("gauge", "podcam_capture_fps", "Frames read from the camera per second (recent)",
+              cam, snap["capture_fps"])
+        f.add("gauge", "podcam_publish_fps", "Frames published to viewers per second (recent)",
+              cam, snap["publish_fps"])
+        f.add("counter", "podcam_frames_captured_total", "Frames read from the camera",
+              cam, snap["frames_captured"])
+        f.add("counter", "podcam_frames_published_total", "Frames published to viewers",
+              cam, snap["frames_published"])
+        f.add("counter", "podcam_frames_late_total", "Frames captured after their deadline",
+              cam, snap["frames_late"])
+        for queue, drops in snap.get("queue_drops", {}).items():
+            f.add("counter", "podcam_queue_drops_total", "Frames dropped between pipeline stages",
+                  dict(cam, queue=queue), drops)
+        for stage, hist in snap["stages"].items():
+            f.histogram("podcam_stage_seconds", "Time spent in each pipeline stage per frame",
+                        dict(cam, stage=stage), hist)
+        f.histogram("podcam_jpeg_bytes", "Size of published full-size JPEG frames",
+                    cam, snap["jpeg_bytes"])
+        clients = snap["clients"]
+        for state in ("healthy", "lagging"):
+            f.add("gauge", "podcam_clients", "Connected stream viewers",
+                  dict(cam, state=state), clients[state])
+        for reason, count in clients["evicted_by_reason"].items():
+            f.add("counter", "podcam_clients_evicted_total", "Viewers dropped for being too slow",
+                  dict(cam, reason=reason), count)
+        f.add("counter", "podcam_client_frames_sent_total", "Frames sent to viewers",
+              cam, clients["frames_sent"])
+        f.add("counter", "podcam_client_frames_skipped_total", "Frames viewers were too slow to receive",
+              cam, clients["frames_skipped"])
+        for result, count in snap["reconnects"].items():
+            f.add("counter", "podcam_camera_reconnects_total", "Camera reconnect attempts",
+                  dict(cam, result=result), count)
+        for mode in ("day", "night"):
+            f.add("gauge", "podcam_day_night_mode", "1 for the current day/night mode",
+                  dict(cam, mode=mode), 1 if snap["mode"] == mode else 0)
+        if snap.get("scene_luma") is not None:
+            f.add("gauge", "podcam_scene_luma", "Smoothed scene brightness (0-1)",
+                  cam, snap["scene_luma"])
+        f.add("gauge", "podcam_encoding", "1 while someone is watching (frames are encoded)",
+              cam, 1 if snap["encoding"] else 0)
+        if snap.get("jpeg_quality") is not None:
+            f.add("gauge", "podcam_jpeg_quality", "JPEG quality chosen by adaptive quality",
+                  cam, snap["jpeg_quality"])
+            f.add("gauge", "podcam_output_scale", "Output size (1 = full) chosen by adaptive quality",
+                  cam, snap["output_scale"])
+    return f.text()
@@ -0,0 +1,91 @@
+# ----------------------- WEB STREAM MULTIPART ----------------------------- #
+"""
+Helpers for writing MJPEG (multipart/x-mixed-replace) parts to viewers:
+one shared header per frame, sent with the JPEG in a single sendmsg().
+"""
+
+import socket
+import time
+
+BOUNDARY = "FRAME"
+STREAM_CONTENT_TYPE = f"multipart/x-mixed-replace; boundary={BOUNDARY}"
+PART_TRAILER = b"\r\n"
+
+_PART_HEADER = b"--" + BOUNDARY.encode("ascii") + b"\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n"
+_FRAME_HEADERS = b"X-Frame-Seq: %d\r\nX-Capture-Timestamp: %.6f\r\n"
+
+
+def part_header(length, seq=None, timestamp=None):
+    """Boundary line + headers for a JPEG part of `length` bytes
+    (plus the frame's sequence number and capture time when given)."""
+    header = _PART_HEADER % length
+    if seq is not None and timestamp is not None:
+        header += _FRAME_HEADERS % (seq, timestamp)
+    return header + b"\r\n"
+
+
+def make_part(jpeg, seq=None, timestamp=None):
+    """Return (header, payload) for a JPEG; payload is a zero-copy memoryview."""
+    return part_header(len(jpeg), seq, timestamp), memoryview(jpeg)
+
+
+def jpeg_size(jpeg):
+    """(width, height) from a JPEG's frame header, or None if there isn't one.
+
+    Walks the marker segments after SOI (FF D8) up to the first SOFn, which
+    OpenCV writes within the first few hundred bytes.
+    """
+    data = memoryview(jpeg)
+    pos = 2
+    while pos + 9 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        # SOF0..SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height = (data[pos + 5] << 8) | data[pos + 6]
+            width = (data[pos + 7] << 8) | data[pos + 8]
+            return width, height
+        pos += 2 + ((data[pos + 2] << 8) | data[pos + 3])
+    return None
+
+
+def limit_send_buffer(sock, nbytes):
+    """Cap the kernel send buffer of a viewer's socket (the per-viewer send budget)."""
+    if nbytes:
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, int(nbytes))
+        except OSError:
+            pass  # Not supported on this platform: keep the default
+
+
+def send_part(sock, header, payload, deadline=None):
+    """Send one part (header, payload, trailer) on a socket, usually in one syscall.
+
+    sendmsg() may send only part of the data (e.g. when the viewer is slow);
+    in that case we continue from where it stopped. `deadline` is a
+    time.monotonic() value; if the part isn't fully sent by then,
+    socket.timeout is raised. Platforms without sendmsg() (Windows) fall
+    back to sendall().
+    """
+    buffers = [header, payload, PART_TRAILER]
+    if not hasattr(sock, "sendmsg"):
+        if deadline is not None:
+            sock.settimeout(max(0.001, deadline - time.monotonic()))
+        for buffer in buffers:
+            sock.sendall(buffer)
+        return
+    while buffers:
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout("send deadline exceeded")
+            sock.settimeout(remaining)
+        sent = sock.sendmsg(buffers)
+        # Drop the buffers that went out completely...
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers[0])
+            buffers.pop(0)
+        # ...and skip the part of the next one that was already sent
+        if buffers and sent:
+            buffers[0] = memoryview(buffers[0])[sent:]
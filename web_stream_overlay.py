@@ -0,0 +1,169 @@
+# ------------------------ WEB STREAM OVERLAYS ----------------------------- #
+"""
+Overlay compositor for the text label and DAY/NIGHT badge: each layer is
+rendered once into a small patch and only that rectangle is blended into
+every frame.
+"""
+
+import numpy as np
+
+import cv2
+
+
+# --------------------------- OVERLAY PATCH -------------------------------- #
+class OverlayPatch:
+    """A pre-rendered layer covering the rectangle (x0, y0)-(x1, y1) of the frame."""
+
+    def __init__(self, rect, premultiplied, inv_alpha):
+        self.rect = rect  # (x0, y0, x1, y1), x1/y1 exclusive
+        self._premul = premultiplied  # color * alpha, float32 HxWx3
+        self._inv_alpha = inv_alpha  # 1 - alpha, float32 HxWx3
+        self.opaque = not np.any(inv_alpha)
+        if self.opaque:
+            # Fully opaque layer: blending is just a copy
+            self._solid = np.clip(premultiplied + 0.5, 0, 255).astype(np.uint8)
+        # Reused for every blend so drawing the overlay allocates nothing
+        self._scratch = np.empty_like(premultiplied, dtype=np.float32)
+
+    @property
+    def bgra(self):
+        """The patch as a straight-alpha BGRA image (handy for saving/inspecting)."""
+        alpha = np.clip(1.0 - self._inv_alpha.mean(axis=2, keepdims=True), 0.0, 1.0)
+        color = np.where(alpha > 0, self._premul / np.maximum(alpha, 1e-6), 0.0)
+        bgra = np.concatenate([color, alpha * 255.0], axis=2)
+        return np.clip(bgra + 0.5, 0, 255).astype(np.uint8)
+
+    @classmethod
+    def render(cls, frame_shape, rect, draw, antialiased=False):
+        """Build a patch by calling draw(canvas, x0, y0) on two reference canvases.
+
+        `draw` uses frame coordinates shifted by (x0, y0) and may only use
+        blending operations (rectangles, text, cv2.addWeighted). Each of those
+        gives out = background * (1 - alpha) + color * alpha, so the black
+        canvas ends up holding color * alpha and white minus black 1 - alpha.
+        OpenCV only anti-aliases (cv2.LINE_AA) on 8-bit images, so layers that
+        use it are rendered on 8-bit black/white canvases instead of float ones.
+        Returns None if the rectangle falls outside the frame.
+        """
+        height, width = frame_shape[:2]
+        x0, y0, x1, y1 = rect
+        x0, y0 = max(0, int(x0)), max(0, int(y0))
+        x1, y1 = min(width, int(x1)), min(height, int(y1))
+        if x1 <= x0 or y1 <= y0:
+            return None
+        size = (y1 - y0, x1 - x0, 3)
+        if antialiased:
+            on_black = np.zeros(size, np.uint8)
+            on_white = np.full(size, 255, np.uint8)
+            draw(on_black, x0, y0)
+            draw(on_white, x0, y0)
+            premul = on_black.astype(np.float32)
+            inv_alpha = (on_white.astype(np.float32) - premul) / 255.0
+            return cls((x0, y0, x1, y1), premul, inv_alpha)
+        on_black = np.zeros(size, np.float32)
+        on_white = np.ones(size, np.float32)
+        draw(on_black, x0, y0)
+        draw(on_white, x0, y0)
+        return cls((x0, y0, x1, y1), on_black, on_white - on_black)
+
+    def blend_into(self, frame):
+        """Alpha-blend this patch into `frame` in place (only the covered rectangle)."""
+        x0, y0, x1, y1 = self.rect
+        if frame.shape[0] < y1 or frame.shape[1] < x1:
+            return
+        roi = frame[y0:y1, x0:x1]
+        if self.opaque:
+            roi[...] = self._solid
+            return
+        out = self._scratch
+        np.multiply(roi, self._inv_alpha, out=out)
+        out += self._premul
+        out += 0.5  # Round to nearest when converting back to uint8
+        np.clip(out, 0, 255, out=out)
+        np.copyto(roi, out, casting="unsafe")
+
+
+# ------------------------- OVERLAY COMPOSITOR ----------------------------- #
+class OverlayCompositor:
+    """
+    Keeps one cached OverlayPatch per named layer.
+
+    draw() rebuilds a layer only when its `key` (everything that affects how
+    it looks: text, colors, frame size...) changes, then blends it in place.
+    """
+
+    def __init__(self):
+        self._layers = {}  # name -> (key, OverlayPatch or None)
+        self.rebuild_count = 0
+
+    def draw(self, frame, name, key, builder):
+        """Blend layer `name` into `frame`, calling builder() if `key` changed."""
+        cached = self._layers.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, builder())
+            self._layers[name] = cached
+            self.rebuild_count += 1
+        patch = cached[1]
+        if patch is not None:
+            patch.blend_into(frame)
+        return patch
+
+
+# --------------------------- LAYER BUILDERS ------------------------------- #
+def build_label_patch(frame_shape, text, font_scale, bg_alpha, text_alpha, text_color, thickness=2):
+    """Semi-transparent black box with text in the bottom-left corner."""
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    (text_width, text_height), baseline = cv2.getTextSize(text, font, font_scale, thickness)
+
+    # Position in bottom-left corner with some padding
+    x = 20
+    y = frame_shape[0] - 20
+    box = (x - 10, y - text_height - 10, x + text_width + 10, y + 10)
+    # Cover the box plus anything the text draws below its baseline
+    rect = (box[0], box[1], box[2] + 1, max(box[3], y + baseline + thickness) + 1)
+
+    def draw(canvas, ox, oy):
+        overlay = canvas.copy()
+        cv2.rectangle(
+            overlay, (box[0] - ox, box[1] - oy), (box[2] - ox, box[3] - oy), (0, 0, 0), -1
+        )
+        cv2.addWeighted(overlay, bg_alpha, canvas, 1 - bg_alpha, 0, canvas)
+        if text_alpha < 1.0:
+            text_overlay = canvas.copy()
+            cv2.putText(text_overlay, text, (x - ox, y - oy), font, font_scale, text_color, thickness)
+            cv2.addWeighted(text_overlay, text_alpha, canvas, 1 - text_alpha, 0, canvas)
+        else:
+            cv2.putText(canvas, text, (x - ox, y - oy), font, font_scale, text_color, thickness)
+
+    return OverlayPatch.render(frame_shape, rect, draw)
+
+
+def build_day_night_patch(frame_shape, mode):
+    """Opaque DAY (green) / NIGHT (red) badge in the top-right corner."""
+    mode_text = "DAY" if mode == "day" else "NIGHT"
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    dn_scale = 0.6
+    dn_thickness = 2
+    (mtw, mth), _ = cv2.getTextSize(mode_text, font, dn_scale, dn_thickness)
+    pad = 6
+    # Guard against unexpected empty dimensions
+    if mtw <= 0 or mth <= 0:
+        return None
+    x2 = max(0, frame_shape[1] - mtw - pad - 8)
+    y2 = pad + mth + 2
+    box = (x2 - pad, y2 - mth - pad, x2 + mtw + pad, y2 + pad // 2)
+    bg_color = (0, 120, 0) if mode == "day" else (0, 0, 160)
+    txt_color = (255, 255, 255)
+
+    def draw(canvas, ox, oy):
+        cv2.rectangle(
+            canvas, (box[0] - ox, box[1] - oy), (box[2] - ox, box[3] - oy), bg_color, -1
+        )
+        cv2.putText(
+            canvas, mode_text, (x2 - ox, y2 - oy), font, dn_scale,
+            txt_color, dn_thickness, cv2.LINE_AA,
+        )
+
+    return OverlayPatch.render(
+        frame_shape, (box[0], box[1], box[2] + 1, box[3] + 1), draw, antialiased=True
+    )
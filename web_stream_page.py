@@ -66,7 +66,10 @@ body {
         <strong>Stream Info:</strong><br>
         Resolution: 1280x720 | Quality: 85% | Frame Rate: Up to 20 FPS<br>
         Optimized for monitoring with reduced bandwidth usage<br>
-        <p>Direct stream URL: <a href="/stream0.mjpg">Pod Camera Stream</a></p>
+        <p>Direct stream URL: <a href="/stream0.mjpg">Pod Camera Stream</a> |
+            <a href="/stream0.mjpg?w=640&q=60&fps=2">Low bandwidth (640px, 2 FPS)</a> |
+            <a href="/snapshot.jpg" target="_blank">Snapshot</a> |
+            <a href="/replay.mjpg?from=-60s" target="_blank">Replay last minute</a></p>
         <p>
             <strong>White Balance:</strong>
             <a href="/wb/calibrate">Calibrate (full frame)</a> |
@@ -0,0 +1,443 @@
+# ---------------------- WEB STREAM PIPELINE HELPERS ----------------------- #
+"""
+Small building blocks MediaRelay in web_stream.py uses to run capture,
+processing and encoding on separate threads and hand frames between them.
+"""
+
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Condition, Event, Thread
+
+import numpy as np
+
+
+# ------------------------- DROP-OLDEST QUEUE ------------------------------ #
+class DropOldestQueue:
+    """
+    Bounded thread-safe queue that never blocks the producer.
+
+    put() always succeeds; if the queue is already full the oldest item is
+    discarded and counted as a drop. get() waits (up to a timeout) for an
+    item and returns None if nothing arrived.
+    """
+
+    def __init__(self, maxsize=2, name=""):
+        self.name = name
+        self.maxsize = max(1, int(maxsize))
+        self._items = deque()
+        self._condition = Condition()
+        self.put_count = 0  # Items offered by the producer
+        self.drop_count = 0  # Items thrown away because the consumer was behind
+
+    def put(self, item):
+        """Add an item, dropping the oldest one if full. Returns True if a drop happened."""
+        with self._condition:
+            dropped = False
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.drop_count += 1
+                dropped = True
+            self._items.append(item)
+            self.put_count += 1
+            self._condition.notify()
+            return dropped
+
+    def get(self, timeout=None):
+        """Remove and return the oldest item, or None after `timeout` seconds."""
+        with self._condition:
+            if not self._items:
+                self._condition.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def clear(self):
+        """Discard everything still waiting in the queue."""
+        with self._condition:
+            self._items.clear()
+
+    def qsize(self):
+        """Number of items currently waiting."""
+        with self._condition:
+            return len(self._items)
+
+    def stats(self):
+        """Depth and drop counters as a plain dict (JSON friendly)."""
+        with self._condition:
+            return {
+                "depth": len(self._items),
+                "maxsize": self.maxsize,
+                "puts": self.put_count,
+                "drops": self.drop_count,
+            }
+
+
+# -------------------------- RAW FRAME BUFFER ------------------------------ #
+class RawFrameBuffer:
+    """
+    Keeps an uncorrected copy of a camera frame ONLY when someone asked for it.
+
+    Copying every 1080p frame "just in case" costs about 6 MB of memory
+    traffic per frame. Instead, a reader (e.g. /wb/calibrate) calls request()
+    or wait_for(); the capture side calls offer() for every frame, which does
+    nothing unless a request is pending. Two preallocated buffers are used:
+    the capture side writes into the "back" buffer while readers use the
+    "front" one, and they swap when the copy is complete.
+    """
+
+    def __init__(self):
+        self._buffers = [None, None]
+        self._front = 0  # Index of the buffer readers use
+        self._front_frame_no = -1  # Which frame the front buffer holds
+        self._requested = False
+        self._condition = Condition()
+        self.copy_count = 0  # Frames actually copied
+        self.bytes_copied = 0  # Total bytes copied
+        self.offer_count = 0  # Frames offered by the capture side
+
+    def request(self):
+        """Ask for the next offered frame to be kept."""
+        with self._condition:
+            self._requested = True
+
+    def offer(self, frame, frame_no):
+        """Called for every raw frame; copies it only if a request is pending.
+        Returns True if the frame was kept.
+        """
+        self.offer_count += 1
+        if not self._requested or frame is None:
+            return False
+        back = 1 - self._front
+        buffer = self._buffers[back]
+        if buffer is None or buffer.shape != frame.shape or buffer.dtype != frame.dtype:
+            # (Re)allocate only when the frame size changes
+            buffer = np.empty_like(frame)
+            self._buffers[back] = buffer
+        np.copyto(buffer, frame)
+        with self._condition:
+            self._front = back
+            self._front_frame_no = frame_no
+            self._requested = False
+            self.copy_count += 1
+            self.bytes_copied += frame.nbytes
+            self._condition.notify_all()
+        return True
+
+    def read(self, fn):
+        """Call fn(frame) on the newest kept frame while it can't be overwritten.
+        Returns fn's result, or None if no frame has been kept yet.
+        """
+        with self._condition:
+            frame = self._buffers[self._front]
+            if frame is None or self._front_frame_no < 0:
+                return None
+            return fn(frame)
+
+    def wait_for(self, fn, timeout=1.0):
+        """Request a fresh frame, wait up to `timeout` seconds for it, then call fn(frame).
+        Returns None if no new frame arrived in time.
+        """
+        with self._condition:
+            start_no = self._front_frame_no
+            self._requested = True
+            self._condition.wait_for(lambda: self._front_frame_no != start_no, timeout)
+            if self._front_frame_no == start_no:
+                return None
+            return fn(self._buffers[self._front])
+
+    def stats(self):
+        """Counters as a plain dict (JSON friendly)."""
+        with self._condition:
+            return {
+                "offered": self.offer_count,
+                "copied": self.copy_count,
+                "bytes_copied": self.bytes_copied,
+            }
+
+
+# ----------------------------- FRAME POOL --------------------------------- #
+class FramePool:
+    """
+    Small ring of preallocated frames that are reused in rotation.
+
+    Instead of asking the memory allocator for a fresh 6 MB array for every
+    frame (and freeing it again a moment later), each stage writes into the
+    next buffer of its ring. The ring must be long enough that a buffer is
+    no longer being read (queued, published, encoded) when its turn comes
+    around again.
+    """
+
+    def __init__(self, count=3, name=""):
+        self.name = name
+        self._frames = [None] * max(1, int(count))
+        self._next = 0
+        self.alloc_count = 0  # Buffers (re)allocated because the shape changed
+
+    def next(self, shape, dtype=np.uint8):
+        """Return the next buffer in the ring with the given shape."""
+        index = self._next
+        self._next = (index + 1) % len(self._frames)
+        frame = self._frames[index]
+        if frame is None or frame.shape != tuple(shape) or frame.dtype != dtype:
+            frame = np.empty(shape, dtype)
+            self._frames[index] = frame
+            self.alloc_count += 1
+        return frame
+
+    def stats(self):
+        """Counters as a plain dict (JSON friendly)."""
+        return {"buffers": len(self._frames), "allocations": self.alloc_count}
+
+
+# ------------------------- ORDERED ENCODER POOL --------------------------- #
+class OrderedEncoderPool:
+    """
+    Encode consecutive frames on several threads, publish them in order.
+
+    One 1080p cv2.imencode() can take longer than a frame interval on a Pi.
+    OpenCV releases the GIL while it encodes, so several frames can be
+    encoded at once on different CPU cores. Encodes finish in any order, but
+    a publisher thread hands the results to `publish` strictly in the order
+    the frames were submitted, so viewers never see time jump backwards.
+
+    submit() waits while `workers` frames are already being encoded (the
+    same back-pressure as encoding inline, just `workers` frames deep).
+    """
+
+    def __init__(self, workers, encode, publish, name="encode"):
+        self.workers = max(1, int(workers))
+        self._encode = encode  # encode(frame) -> JPEG bytes (or None to skip)
+        self._publish = publish  # publish(frame, jpeg, timestamp)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=name)
+        self._slots = BoundedSemaphore(self.workers)
+        self._pending = deque()  # Futures in submission order
+        self._condition = Condition()
+        self._closed = False
+        self.submitted = 0
+        self.published = 0
+        self.failed = 0
+        self.reorder_waits = 0  # Finished early but had to wait for an older frame
+        self._publisher = Thread(target=self._publish_in_order, name=f"{name}-publish", daemon=True)
+        self._publisher.start()
+
+    def submit(self, frame, jpeg=None, timestamp=None):
+        """Queue a frame for encoding (`jpeg` = already encoded, only needs publishing in order)."""
+        self._slots.acquire()
+        if self._closed:
+            self._slots.release()
+            return
+        future = self._executor.submit(self._run, frame, jpeg, timestamp)
+        with self._condition:
+            self._pending.append(future)
+            self.submitted += 1
+            self._condition.notify()
+
+    def _run(self, frame, jpeg, timestamp):
+        try:
+            if jpeg is None and frame is not None:
+                jpeg = self._encode(frame)
+            return frame, jpeg, timestamp
+        finally:
+            self._slots.release()
+
+    def _publish_in_order(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return  # Closed and drained
+                future = self._pending[0]
+                if not future.done() and any(f.done() for f in self._pending):
+                    self.reorder_waits += 1
+            try:
+                result = future.result()
+            except Exception:
+                result = None
+            with self._condition:
+                self._pending.popleft()
+            if result is None:
+                self.failed += 1
+                continue
+            try:
+                self._publish(*result)
+                self.published += 1
+            except Exception:
+                self.failed += 1
+
+    def in_flight(self):
+        """Frames submitted but not yet published."""
+        with self._condition:
+            return len(self._pending)
+
+    def close(self):
+        """Finish the frames already submitted, then stop the threads."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._executor.shutdown(wait=True)
+        self._publisher.join(timeout=2.0)
+
+    def stats(self):
+        """Counters as a plain dict (JSON friendly)."""
+        return {
+            "workers": self.workers,
+            "in_flight": self.in_flight(),
+            "submitted": self.submitted,
+            "published": self.published,
+            "failed": self.failed,
+            "reorder_waits": self.reorder_waits,
+        }
+
+
+# ----------------------------- FRAME PACER -------------------------------- #
+class FramePacer:
+    """
+    Decides WHEN the capture loop takes its next frame.
+
+    Every frame has a deadline on the monotonic clock (it never jumps when
+    NTP adjusts the wall clock). wait() sleeps once until that deadline
+    instead of waking up every millisecond to check the time. Deadlines sit
+    on a fixed grid (start + n * interval), so small delays don't pile up
+    into a slower frame rate; if a whole interval is missed we skip ahead.
+
+    Jitter is how late a frame was taken compared with its deadline.
+    """
+
+    def __init__(self, frame_rate, history=120):
+        self.interval = 1.0 / max(0.1, float(frame_rate))
+        self._deadline = None
+        self._wake = Event()
+        self._jitter = deque(maxlen=history)  # Recent lateness values (seconds)
+        self.frame_count = 0
+        self.late_count = 0  # Frames taken more than half an interval late
+        self.skipped_count = 0  # Deadlines missed entirely (stage too slow)
+        self.early_count = 0  # Frames taken early because of wake()
+        self.drained_count = 0  # Stale camera buffers discarded with grab()
+
+    def reset(self):
+        """Start a new schedule with the first frame due right now."""
+        self._deadline = time.monotonic()
+        self._wake.clear()
+
+    def wake(self):
+        """Make wait() return now (e.g. the first viewer is waiting for a frame)."""
+        self._wake.set()
+
+    def wait(self):
+        """Sleep until the next frame is due (or wake() is called)."""
+        if self._deadline is None:
+            self.reset()
+        delay = self._deadline - time.monotonic()
+        if delay > 0:
+            self._wake.wait(delay)
+        self._wake.clear()
+
+    def frame_taken(self):
+        """Record that a frame was just taken and schedule the next deadline."""
+        now = time.monotonic()
+        lateness = now - self._deadline
+        self.frame_count += 1
+        if lateness < 0:
+            # Woken early: restart the grid from this frame
+            self.early_count += 1
+            self._deadline = now + self.interval
+            return
+        self._jitter.append(lateness)
+        if lateness > self.interval / 2:
+            self.late_count += 1
+        missed = int(lateness // self.interval)
+        self.skipped_count += missed
+        self._deadline += (missed + 1) * self.interval
+
+    def stats(self):
+        """Jitter and late-frame counters as a plain dict (JSON friendly)."""
+        jitter = sorted(self._jitter)
+        if jitter:
+            jitter_ms = {
+                "mean": round(1000.0 * sum(jitter) / len(jitter), 2),
+                "p95": round(1000.0 * jitter[int(0.95 * (len(jitter) - 1))], 2),
+                "max": round(1000.0 * jitter[-1], 2),
+            }
+        else:
+            jitter_ms = {"mean": 0.0, "p95": 0.0, "max": 0.0}
+        return {
+            "target_fps": round(1.0 / self.interval, 2),
+            "frames": self.frame_count,
+            "late": self.late_count,
+            "skipped_deadlines": self.skipped_count,
+            "woken_early": self.early_count,
+            "drained_buffers": self.drained_count,
+            "jitter_ms": jitter_ms,
+        }
+
+
+# --------------------------- PUBLISHED FRAME ------------------------------ #
+# One version of MediaRelay's "latest frame" slot. A new object is published
+# for every frame (never modified afterwards), so a client can hold on to it
+# while sending without any lock.
+#   seq       - increases by 1 for every published frame
+#   timestamp - wall-clock capture time (time.time())
+#   jpeg      - full-size JPEG (bytes / memoryview), None if nobody needed it
+#   part      - (multipart header, payload) ready for send_part(), or None
+#   rendered  - BGR pixels the JPEG was made from (for renditions), or None
+#   metadata  - small dict: frame size, day/night mode...
+PublishedFrame = namedtuple(
+    "PublishedFrame", ["seq", "timestamp", "jpeg", "part", "rendered", "metadata"]
+)
+
+
+# ---------------------------- CLIENT STATS -------------------------------- #
+class ClientStats:
+    """
+    Delivery counters for one connected viewer.
+
+    Each frame has a sequence number, so when a viewer is sent frame 12
+    right after frame 9 we know it skipped 2 frames (it was too slow to
+    take them while they were the newest). A viewer that had to skip frames
+    on its last delivery is "lagging"; `lag` is how old (seconds since
+    capture) the last frame was when it finished sending.
+    """
+
+    __slots__ = (
+        "kind", "address", "connected_at", "last_seq", "sent", "skipped", "lag", "lagging",
+    )
+
+    def __init__(self, kind, address):
+        self.kind = kind
+        self.address = address
+        self.connected_at = time.time()
+        self.last_seq = -1  # Sequence number of the last frame sent
+        self.sent = 0
+        self.skipped = 0
+        self.lag = 0.0
+        self.lagging = False
+
+    def delivered(self, seq, timestamp=None):
+        """Record that frame `seq` (captured at `timestamp`) was sent,
+        counting the frames jumped over."""
+        jumped = seq - self.last_seq - 1 if self.last_seq >= 0 else 0
+        if jumped > 0:
+            self.skipped += jumped
+        self.lagging = jumped > 0
+        if timestamp is not None:
+            self.lag = max(0.0, time.time() - timestamp)
+        self.last_seq = seq
+        self.sent += 1
+
+    def skip_to(self, seq):
+        """Move past frames on purpose (e.g. per-viewer FPS limit) without counting them."""
+        self.last_seq = max(self.last_seq, seq)
+
+    def as_dict(self):
+        """Counters as a plain dict (JSON friendly)."""
+        return {
+            "kind": self.kind,
+            "address": self.address,
+            "connected_s": round(time.time() - self.connected_at, 1),
+            "last_seq": self.last_seq,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "lag_ms": round(1000.0 * self.lag, 1),
+            "lagging": self.lagging,
+        }
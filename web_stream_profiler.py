@@ -0,0 +1,140 @@
+# ------------------------ WEB STREAM PROFILER ----------------------------- #
+"""
+On-demand sampling profiler behind /debug/profile: counts the call stacks
+of every thread for a few seconds (collapsed stacks or pstats output).
+"""
+
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_INTERVAL = 0.005  # Seconds between samples (200 per second)
+
+# Only one profile at a time: two samplers would just measure each other
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """Another /debug/profile request is already sampling."""
+
+
+def _frame_key(code):
+    """(file, first line, function) - the key pstats uses for a function."""
+    return code.co_filename, code.co_firstlineno, code.co_name
+
+
+class StackSampler:
+    """Count the call stacks of (some of) this process's threads."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, thread_filter=None):
+        self.interval = max(0.001, float(interval))
+        # Lower-case substrings; a thread is sampled if its name contains one
+        self.thread_filter = [f.lower() for f in thread_filter or [] if f]
+        self.stacks = Counter()  # (thread name, frame key, ...) root first -> samples
+        self.sample_count = 0
+        self.duration = 0.0
+
+    def _wanted(self, thread_name):
+        if not self.thread_filter:
+            return True
+        name = thread_name.lower()
+        return any(f in name for f in self.thread_filter)
+
+    def run(self, seconds):
+        """Sample for `seconds` (blocks the calling thread); returns self."""
+        me = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + seconds
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, f"thread-{ident}")
+                if ident == me or not self._wanted(name):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_key(frame.f_code))
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[tuple(reversed(stack))] += 1
+            self.sample_count += 1
+            time.sleep(self.interval)
+        self.duration = time.perf_counter() - started
+        return self
+
+    # ------------------------- OUTPUT FORMATS ----------------------------- #
+    def collapsed(self):
+        """Flamegraph input: "thread;func (file:line);... count" per stack."""
+        lines = []
+        for stack, count in self.stacks.most_common():
+            names = [stack[0].replace(";", ":").replace(" ", "_")]
+            names += [f"{func} ({os.path.basename(path)}:{line})" for path, line, func in stack[1:]]
+            lines.append(";".join(names) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def pstats_dump(self):
+        """
+        The samples as a marshal'd pstats file (pstats.Stats("file") reads it).
+        Call counts are sample counts; times are samples x interval.
+        """
+        tick = self.duration / max(1, self.sample_count)
+        # func -> [samples on stack, samples at top, own time, total time, callers]
+        stats = {}
+        for stack, count in self.stacks.items():
+            frames = stack[1:]  # Drop the thread name
+            seen = set()
+            for depth, func in enumerate(frames):
+                entry = stats.setdefault(func, [0, 0, 0.0, 0.0, {}])
+                if func not in seen:  # Recursion: count cumulative time once
+                    seen.add(func)
+                    entry[0] += count
+                    entry[3] += count * tick
+                if depth == len(frames) - 1:
+                    entry[1] += count
+                    entry[2] += count * tick
+                if depth > 0:
+                    caller = entry[4].setdefault(frames[depth - 1], [0, 0, 0.0, 0.0])
+                    caller[0] += count
+                    caller[1] += count
+                    caller[3] += count * tick
+        dump = {
+            func: (calls, calls, own, total, {c: tuple(v) for c, v in callers.items()})
+            for func, (calls, _, own, total, callers) in stats.items()
+        }
+        return marshal.dumps(dump)
+
+
+def sample_threads(seconds, interval=DEFAULT_INTERVAL, thread_filter=None):
+    """
+    Run one StackSampler for `seconds`. Raises ProfilerBusy if another
+    profile is already running.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    try:
+        return StackSampler(interval, thread_filter).run(seconds)
+    finally:
+        _profile_lock.release()
+
+
+def stage_deltas(before, after, seconds):
+    """
+    Per-stage timing between two PipelineMetrics.snapshot()["stages"] dicts:
+    {stage: {"count", "total_ms", "mean_ms", "busy_percent"}}.
+    """
+    result = {}
+    for stage, end in after.items():
+        start = before.get(stage, {"count": 0, "sum": 0.0})
+        count = end["count"] - start["count"]
+        total = end["sum"] - start["sum"]
+        result[stage] = {
+            "count": count,
+            "total_ms": round(1000.0 * total, 3),
+            "mean_ms": round(1000.0 * total / count, 3) if count else 0.0,
+            # Share of the profile's wall time spent in this stage
+            "busy_percent": round(100.0 * total / max(1e-6, seconds), 2),
+        }
+    return result
@@ -0,0 +1,108 @@
+# ----------------------- WEB STREAM RENDITIONS ---------------------------- #
+"""
+Shared cache of downscaled / re-compressed copies ("renditions") of the
+latest frame, so /stream0.mjpg?w=640&q=60 costs one encode per frame no
+matter how many viewers ask for it.
+"""
+
+from threading import Lock
+
+import cv2
+
+from web_stream_multipart import make_part
+
+
+class _RenditionEntry:
+    """One cached rendition; its lock makes other clients wait for the first encode."""
+
+    __slots__ = ("lock", "data", "part")
+
+    def __init__(self):
+        self.lock = Lock()
+        self.data = None
+        self.part = None  # (multipart header, memoryview of data), built with data
+
+
+class RenditionCache:
+    """
+    Cache of encoded renditions keyed by (size, quality, frame sequence).
+
+    Only the newest couple of frame sequences are kept, so the cache never
+    grows beyond `max_entries` JPEGs.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max(1, int(max_entries))
+        self._entries = {}  # (width, height, quality, seq) -> _RenditionEntry
+        self._lock = Lock()
+        self.encode_count = 0  # Resize+encode operations actually performed
+        self.hit_count = 0  # Requests served from an existing encode
+
+    @staticmethod
+    def output_size(frame_shape, width):
+        """Output (width, height) for a requested width, keeping aspect ratio.
+        Never upscales; width=None or 0 means full size.
+        """
+        src_h, src_w = frame_shape[:2]
+        if not width or width >= src_w:
+            return (src_w, src_h)
+        width = max(16, int(width))
+        height = max(2, int(round(src_h * width / float(src_w))))
+        return (width, height)
+
+    def get(self, seq, frame, width, quality):
+        """Return JPEG bytes for `frame` (sequence `seq`) at the given width/quality."""
+        return self._entry(seq, frame, width, quality).data
+
+    def get_part(self, seq, frame, width, quality, timestamp=None):
+        """Like get(), but returns the ready-to-send (part header, payload) pair.
+        `timestamp` (capture time) is stamped into the part header."""
+        return self._entry(seq, frame, width, quality, timestamp).part
+
+    def _entry(self, seq, frame, width, quality, timestamp=None):
+        """Find or build the cache entry for this rendition."""
+        out_w, out_h = self.output_size(frame.shape, width)
+        key = (out_w, out_h, int(quality), seq)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = _RenditionEntry()
+                self._entries[key] = entry
+                self._evict(seq)
+        with entry.lock:
+            if entry.data is None:
+                if (out_w, out_h) != (frame.shape[1], frame.shape[0]):
+                    # INTER_AREA gives the sharpest result when shrinking
+                    frame = cv2.resize(frame, (out_w, out_h), interpolation=cv2.INTER_AREA)
+                ok, buffer = cv2.imencode(
+                    ".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+                )
+                if not ok:
+                    raise RuntimeError("JPEG encode failed for rendition")
+                entry.data = buffer.tobytes()
+                entry.part = make_part(entry.data, seq, timestamp)
+                self.encode_count += 1
+            else:
+                self.hit_count += 1
+            return entry
+
+    def _evict(self, newest_seq):
+        """Drop renditions of old frames (caller holds self._lock)."""
+        stale = [k for k in self._entries if k[3] < newest_seq - 1]
+        for k in stale:
+            del self._entries[k]
+        # Still too many profiles at once: drop the oldest sequences first
+        while len(self._entries) > self.max_entries:
+            oldest = min(self._entries, key=lambda k: k[3])
+            del self._entries[oldest]
+
+    def stats(self):
+        """Counters as a plain dict (JSON friendly)."""
+        with self._lock:
+            profiles = sorted({(k[0], k[1], k[2]) for k in self._entries})
+            return {
+                "cached": len(self._entries),
+                "profiles": [f"{w}x{h}@q{q}" for (w, h, q) in profiles],
+                "encodes": self.encode_count,
+                "hits": self.hit_count,
+            }
@@ -0,0 +1,196 @@
+# ----------------------- WEB STREAM CAMERA WORKERS ------------------------ #
+"""
+Run each camera's pipeline in its own process (ENABLE_CAMERA_PROCESSES)
+and hand the encoded JPEGs to the web server through a shared-memory ring.
+"""
+
+import struct
+from multiprocessing import shared_memory
+
+# Ring header: latest sequence number, slot count, bytes per slot
+_RING_HEADER = struct.Struct("<QQQ")
+# Slot header: sequence number (0 while being written), timestamp, JPEG length
+_SLOT_HEADER = struct.Struct("<QdQ")
+
+
+class SharedFrameRing:
+    """
+    Ring of JPEG slots in shared memory: one writer (the camera worker
+    process), any number of readers (the web server).
+
+    Create it in the server with SharedFrameRing(slots=..., slot_bytes=...)
+    and open the same block in the worker with SharedFrameRing(name=...).
+    """
+
+    def __init__(self, name=None, slots=16, slot_bytes=1024 * 1024):
+        if name is None:
+            size = _RING_HEADER.size + slots * (_SLOT_HEADER.size + slot_bytes)
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+            _RING_HEADER.pack_into(self._shm.buf, 0, 0, slots, slot_bytes)
+            for slot in range(slots):
+                _SLOT_HEADER.pack_into(self._shm.buf, self._slot_offset(slot, slot_bytes), 0, 0.0, 0)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self._shm.name
+        _, self.slots, self.slot_bytes = _RING_HEADER.unpack_from(self._shm.buf, 0)
+        self.oversize = 0  # Frames too big for a slot (writer side)
+
+    @staticmethod
+    def _slot_offset(slot, slot_bytes):
+        return _RING_HEADER.size + slot * (_SLOT_HEADER.size + slot_bytes)
+
+    @property
+    def latest_seq(self):
+        """Sequence number of the newest complete frame (0 = none yet)."""
+        return _RING_HEADER.unpack_from(self._shm.buf, 0)[0]
+
+    def write(self, seq, timestamp, jpeg):
+        """Store frame `seq` (> 0, increasing). Returns False if it doesn't fit a slot."""
+        length = len(jpeg)
+        if length > self.slot_bytes:
+            self.oversize += 1
+            return False
+        buf = self._shm.buf
+        offset = self._slot_offset(seq % self.slots, self.slot_bytes)
+        data = offset + _SLOT_HEADER.size
+        _SLOT_HEADER.pack_into(buf, offset, 0, timestamp, length)  # "Being written"
+        buf[data:data + length] = jpeg
+        _SLOT_HEADER.pack_into(buf, offset, seq, timestamp, length)  # Complete
+        _RING_HEADER.pack_into(buf, 0, seq, self.slots, self.slot_bytes)
+        return True
+
+    def read_latest(self, after=0):
+        """
+        Return (seq, timestamp, jpeg) for the newest frame if it is newer
+        than `after`, else None. `jpeg` is a bytes copy, so viewers can keep
+        sending it after the worker reuses the slot.
+        """
+        seq = self.latest_seq
+        if seq <= after:
+            return None
+        buf = self._shm.buf
+        offset = self._slot_offset(seq % self.slots, self.slot_bytes)
+        slot_seq, timestamp, length = _SLOT_HEADER.unpack_from(buf, offset)
+        if slot_seq != seq:
+            return None  # Overwritten while we looked: the next frame will do
+        data = offset + _SLOT_HEADER.size
+        jpeg = bytes(buf[data:data + length])
+        if _SLOT_HEADER.unpack_from(buf, offset)[0] != seq:
+            return None  # The worker reused the slot during the copy
+        return seq, timestamp, jpeg
+
+    def stats(self):
+        """Ring size as a plain dict (JSON friendly)."""
+        return {
+            "name": self.name,
+            "slots": self.slots,
+            "slot_bytes": self.slot_bytes,
+            "latest_seq": self.latest_seq,
+        }
+
+    def close(self):
+        """Detach (and free, for the creator)."""
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # A viewer still holds a view into a slot; the OS frees it later
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+# --------------------------- WORKER PROCESS ------------------------------- #
+def camera_worker_main(relay_kwargs, camera_index, use_libcamera, ring_name, frame_event, conn,
+                       capture_factory=None):
+    """
+    Entry point of a camera worker process.
+
+    Runs a normal MediaRelay (camera, analysis, color, overlay, encode),
+    copies every encoded JPEG into the shared ring, sets `frame_event`,
+    and answers control requests on `conn` until told to stop.
+    `capture_factory` (tools/benchmarks) replaces the real camera.
+    """
+    import web_stream  # Imported here: web_stream imports this module
+
+    ring = SharedFrameRing(name=ring_name)
+    relay = web_stream.MediaRelay(**relay_kwargs)
+    relay.history = None  # The web server keeps the replay history
+
+    def publish():
+        published = relay.latest_frame
+        if published is not None and published.jpeg is not None:
+            if ring.write(published.seq, published.timestamp, published.jpeg):
+                frame_event.set()
+
+    relay.add_frame_listener(publish)
+    try:
+        if capture_factory is not None:
+            relay.cap = capture_factory()
+            relay.start_threads()
+        else:
+            relay.start_capture(camera_index=camera_index, use_libcamera=use_libcamera)
+    except Exception as e:
+        conn.send(("error", str(e)))
+        ring.close()
+        return
+    conn.send(("ok", None))
+
+    try:
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                break  # Web server went away
+            command, args = request[0], request[1:]
+            if command == "stop":
+                break
+            try:
+                conn.send(("ok", _run_command(relay, ring, command, args)))
+            except Exception as e:
+                conn.send(("error", str(e)))
+    finally:
+        relay.stop()
+        ring.close()
+
+
+def _run_command(relay, ring, command, args):
+    """Carry out one control request inside the worker."""
+    if command == "demand":
+        # The web server gained its first / lost its last consumer
+        if args[0]:
+            relay.add_consumer("worker")
+        elif relay.consumer_counts().get("worker"):
+            relay.remove_consumer("worker")
+        return None
+    if command == "wb":
+        mode, gains = args
+        if gains is not None:
+            relay._wb_gains = list(gains)
+        if mode is not None:
+            relay.wb_mode = mode
+        return relay.wb_mode, list(relay._wb_gains)
+    if command == "calibrate":
+        return relay.calibrate_from_last_frame(*args)
+    if command == "preview":
+        return relay.preview_calibration(*args)
+    if command == "stats":
+        stats = relay.pipeline_stats()
+        stats["ring_oversize_frames"] = ring.oversize
+        return stats
+    if command == "metrics":
+        return relay.metrics_snapshot()
+    raise ValueError(f"unknown worker command {command!r}")
+
+
+def wait_for_reply(conn, timeout):
+    """Next (status, value) reply from a worker, or raise RuntimeError after `timeout`."""
+    if not conn.poll(timeout):
+        raise RuntimeError("camera worker did not answer")
+    status, value = conn.recv()
+    if status != "ok":
+        raise RuntimeError(value)
+    return value